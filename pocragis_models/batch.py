@@ -0,0 +1,688 @@
+"""
+This module contains array (numpy) counterparts of the models' equations,
+for simulating PoCRA's soil-moisture model at many points at once
+or for embedding it, time-step by time-step, in other models.
+
+<PocraSMModelStepper> is the low-level stepping kernel. It binds the field
+and crop constants of one point or of an array of points once, and then
+advances a caller-provided state buffer in place, writing the
+water-components into caller-provided output arrays, without allocating
+anything per time-step.
+
+Usage:
+>>> stepper = PocraSMModelStepper.for_field_and_crop(field, crop)
+>>> state = stepper.new_state()            # [sm1_frac, sm2_frac]
+>>> out = np.empty(len(Water.components))  # in the order of Water.components
+>>> for rain, pet in ...:
+>>> 	stepper.step(state, rain, pet, out)
+
+<BatchSimulation> builds on it to simulate, like <PocraSMModelSimulation>,
+a whole batch of cells at once; the field-setup, radiation and et0 models
+have array counterparts here for it.
+
+Usage:
+>>> bs = BatchSimulation(
+>>> 	soil_texture=<array>, soil_depth_category=<array>, lulc_type=<array>, slope=<array>,
+>>> 	weathers={'rain': <[cells x steps] array>, 'et0': <[cells x steps] or [steps] array>},
+>>> 	crop='soyabean'
+>>> )
+>>> bs.run()
+>>> aet = bs.aet # [cells x steps] array
+"""
+
+import time
+
+import numpy as np
+
+from . import lookups
+from .models import Weather, Water
+from .simulate import PocraSMModelSimulation
+from .results import Results, get_crop_stage_labels
+
+
+
+def layer_thicknesses(soil_depth, root_depth):
+	"""Thicknesses of the two soil layers, as in <PocraSMModelSimulation>"""
+
+	thin_soil = soil_depth <= root_depth
+	return (
+		np.where(thin_soil, soil_depth - 0.05, root_depth),
+		np.where(thin_soil, 0.05, soil_depth - root_depth)
+	)
+
+
+
+class PocraSMModelStepper:
+	"""
+	In-place, allocation-free stepping of <Water.run_pocra_sm_model_for_time_step>.
+
+	The constants may be scalars (a single point) or arrays of
+	a common (broadcastable) shape of points, which can be widened
+	further by <shape>. <step> then takes:
+	1. state: array of shape (2, *points) holding sm1_frac and sm2_frac,
+		updated in place
+	2. rain, pet: scalars or arrays broadcastable to the points
+	3. out: array of shape (7, *points) (or any sequence of 7 arrays)
+		receiving the water-components in the order of <Water.components>
+	"""
+
+	def __init__(s,
+		layer_1_thickness, layer_2_thickness,
+		wp, fc, sat, smax, w1, w2, perc_factor,
+		depletion_factor,
+		dtype=float, shape=()
+	):
+		constants = [np.asarray(v, dtype=dtype) for v in [
+			layer_1_thickness, layer_2_thickness, wp, fc, sat, smax, w1, w2, perc_factor, depletion_factor
+		]]
+		s.shape = np.broadcast_shapes(shape, *[c.shape for c in constants])
+		s.dtype = np.dtype(dtype)
+
+		# constants derived once from the above (at their own shapes, so that
+		# points differing only along a widened axis, e.g. scenarios, share them)
+		l1, l2, wp, fc, sat, smax, w1, w2, perc_factor, depletion_factor = constants
+		derived = [
+			wp * (l1+l2), fc - wp, 1 - depletion_factor, fc * (1-depletion_factor) + depletion_factor * wp
+		]
+		(
+			s.l1, s.l2, s.wp, s.fc, s.sat, s.smax, s.w1, s.w2, s.perc_factor, s.depletion_factor,
+			s.wp_depth, s.fc_minus_wp, s.one_minus_depletion_factor, s.ks_upper_limit
+		) = (np.broadcast_to(c, s.shape) for c in constants + derived)
+
+		# scratch buffers
+		s.a, s.b, s.c = (np.empty(s.shape, dtype=s.dtype) for _ in range(3))
+		s.mask = np.empty(s.shape, dtype=bool)
+
+
+	@staticmethod
+	def for_field_and_crop(field, crop, dtype=float):
+		l1, l2 = layer_thicknesses(field.soil_depth, crop.root_depth)
+		return PocraSMModelStepper(
+			l1, l2,
+			field.wp, field.fc, field.sat, field.smax, field.w1, field.w2, field.perc_factor,
+			crop.depletion_factor,
+			dtype
+		)
+
+
+	def new_state(s, sm1_frac=None, sm2_frac=None):
+		"""State buffer; soil-moisture defaults to wilting-point as in <PocraSMModelSimulation>"""
+
+		state = np.empty((2,) + s.shape, dtype=s.dtype)
+		state[0] = s.wp if sm1_frac is None else sm1_frac
+		state[1] = s.wp if sm2_frac is None else sm2_frac
+		return state
+
+
+	def new_output(s):
+		return np.empty((len(Water.components),) + s.shape, dtype=s.dtype)
+
+
+	def step(s, state, rain, pet, out):
+
+		# (indexing with an Ellipsis keeps even single points as array-views)
+		sm1, sm2 = state[0, ...], state[1, ...]
+		pri_runoff, infil, aet, sec_runoff, gw_rech, avail_sm, pet_out = (
+			out[i, ...] if isinstance(out, np.ndarray) else out[i] for i in range(7)
+		)
+		a, b, c, m = s.a, s.b, s.c, s.mask
+		l1, l2, perc_factor = s.l1, s.l2, s.perc_factor
+
+		# prev_avail_sm -> a
+		np.multiply(sm1, l1, out=a); np.multiply(sm2, l2, out=b); a += b; a -= s.wp_depth; a *= 1000
+
+		####### pri_runoff #######
+		# s_swat -> b
+		np.multiply(s.w2, a, out=b); np.subtract(s.w1, b, out=b); np.exp(b, out=b)
+		b += a; np.divide(a, b, out=b); np.subtract(1, b, out=b); b *= s.smax
+		# ia_swat -> c
+		np.multiply(b, 0.2, out=c)
+		np.less_equal(rain, c, out=m)
+		np.subtract(rain, c, out=c); np.square(c, out=c)
+		np.multiply(b, 0.8, out=pri_runoff); pri_runoff += rain
+		np.divide(c, pri_runoff, out=pri_runoff)
+		np.copyto(pri_runoff, 0, where=m)
+
+		####### infil #######
+		np.subtract(rain, pri_runoff, out=infil)
+
+		####### aet #######
+		# ks -> a
+		np.subtract(sm1, s.wp, out=a); a /= s.fc_minus_wp; a /= s.one_minus_depletion_factor
+		np.greater(sm1, s.ks_upper_limit, out=m); np.copyto(a, 1, where=m)
+		np.less(sm1, s.wp, out=m); np.copyto(a, 0, where=m)
+		np.multiply(a, pet, out=aet)
+
+		# sm1_before -> a
+		np.subtract(infil, aet, out=b); b /= 1000
+		np.multiply(sm1, l1, out=a); a += b; a /= l1
+		# r_to_second_layer -> b
+		np.subtract(a, s.fc, out=b); b *= l1; b *= perc_factor
+		np.subtract(s.sat, sm2, out=c); c *= l2
+		np.minimum(c, b, out=b)
+		np.less(a, s.fc, out=m); np.copyto(b, 0, where=m)
+		np.greater_equal(sm2, s.sat, out=m); np.copyto(b, 0, where=m)
+		# sm2_before -> c
+		np.multiply(sm2, l2, out=c); c += b; c /= l2
+
+		####### sec_runoff #######
+		# candidate_new_sm1_frac -> a
+		a *= l1; a -= b; a /= l1
+		np.subtract(a, s.sat, out=sec_runoff); sec_runoff *= l1; sec_runoff *= 1000
+		np.maximum(sec_runoff, 0, out=sec_runoff)
+		np.minimum(a, s.sat, out=sm1)
+
+		####### gw_rech #######
+		np.subtract(c, s.fc, out=gw_rech); gw_rech *= l2; gw_rech *= perc_factor; gw_rech *= 1000
+		np.maximum(gw_rech, 0, out=gw_rech)
+		np.divide(gw_rech, 1000, out=b)
+		c *= l2; c -= b; c /= l2
+		np.minimum(c, s.sat, out=sm2)
+
+		####### avail_sm #######
+		np.multiply(sm1, l1, out=a); np.multiply(sm2, l2, out=b); a += b; a -= s.wp_depth
+		np.multiply(a, 1000, out=avail_sm)
+
+		np.copyto(pet_out, pet)
+
+
+
+def field_properties(soil_texture, soil_depth_category, lulc_type):
+	"""
+	Per-cell arrays of the properties that <Field> looks up from the
+	soil-texture, soil-depth-category and lulc-type (arrays of names) of the cells
+	"""
+
+	textures, texture_idx = np.unique(np.char.lower(np.asarray(soil_texture, dtype=str)), return_inverse=True)
+	depths, depth_idx = np.unique(np.char.lower(np.asarray(soil_depth_category, dtype=str)), return_inverse=True)
+	lulcs, lulc_idx = np.unique(np.char.lower(np.asarray(lulc_type, dtype=str)), return_inverse=True)
+	texture_idx = texture_idx.reshape(np.shape(soil_texture))
+	depth_idx = depth_idx.reshape(np.shape(soil_depth_category))
+	lulc_idx = lulc_idx.reshape(np.shape(lulc_type))
+
+	soils = [lookups.dict_soil_properties[t] for t in textures]
+	properties = {p: np.array([soil[p] for soil in soils])[texture_idx] for p in ['wp', 'fc', 'sat', 'ksat']}
+	properties['cn_val'] = np.array([
+		[lookups.dict_lulc_hsg_curveno[lookups.dict_lulc[lulc]][soil['hsg']] for soil in soils]
+			for lulc in lulcs
+	], dtype=float)[lulc_idx, texture_idx]
+	properties['soil_depth'] = np.array([
+		lookups.dict_soil_depth_category_to_value[d] for d in depths
+	])[depth_idx]
+
+	return properties
+
+
+def field_setup(wp, fc, sat, soil_depth, cn_val, slope, ksat, num_daily_phases):
+	"""Array counterpart of <Field.pocra_sm_model_field_setup>"""
+
+	# some utility variables
+	sat_minus_wp_depth = (sat-wp) * soil_depth * 1000
+	fc_minus_wp_depth = (fc-wp) * soil_depth * 1000
+	sat_minus_fc_depth = (sat-fc) * soil_depth * 1000
+
+	# smax
+	cn3 = cn_val * np.exp( 0.00673 * (100-cn_val) )
+	cn_val = np.where(slope > 5.0, ( (
+		((cn3 - cn_val) / 3) * ( 1 - 2 * np.exp(-13.86*slope*0.01) )
+	) + cn_val ), cn_val)
+	cn1_s = ( cn_val -
+		20 * (100-cn_val) / ( 100-cn_val + np.exp(2.533 - 0.0636*(100-cn_val)) )
+	)
+	cn3_s = cn_val * np.exp(0.00673*(100-cn_val))
+	smax = 25.4 * (1000/cn1_s - 10)
+	if np.any(smax == 0):
+		raise Exception('smax is zero')
+
+	# w2
+	s3 = 25.4 * (1000/cn3_s - 10)
+	w2 = ((
+		np.log(fc_minus_wp_depth/(1-s3/smax) - fc_minus_wp_depth)
+		- np.log (sat_minus_wp_depth/(1-2.54/smax) - sat_minus_wp_depth)
+	) / (sat_minus_fc_depth) )
+
+	# w1
+	w1 = (
+		np.log(fc_minus_wp_depth/(1- s3/smax) - fc_minus_wp_depth)
+		+ w2 * fc_minus_wp_depth
+	)
+
+	# perc_factor
+	TT_perc = sat_minus_fc_depth/ksat
+	perc_factor = 1 - np.exp(-24 / num_daily_phases / TT_perc)
+
+	return {
+		'smax': smax,
+		'w1': w1,
+		'w2': w2,
+		'perc_factor': perc_factor
+	}
+
+
+def daily_radiation(latitude, day_of_year):
+	"""Array counterpart of <Weather.get_pocra_daily_radiation>"""
+
+	doy_in_radians = ((2*np.pi)/365) * day_of_year
+	d_r = 1 + 0.033 * np.cos(doy_in_radians)
+	phi = latitude * (np.pi/180)
+	delta = 0.409 * np.sin(doy_in_radians - 1.39)
+	omega_s = np.arccos(-np.tan(phi) * np.tan(delta))
+
+	return (24*60/np.pi) * Weather.G_sc * d_r * (
+		omega_s*np.sin(phi)*np.sin(delta)
+		+ np.cos(phi)*np.sin(omega_s)*np.cos(delta)
+	)
+
+
+def daily_et0(temp_min, temp_avg, temp_max, r_a):
+	"""Array counterpart of <Weather.get_pocra_daily_et0>"""
+	return 0.0023 * (temp_avg + 17.28) * ((temp_max-temp_min)**0.5) * r_a * 0.408
+
+
+def hourly_radiation(latitude, longitude, day_of_year, hour):
+	"""Array counterpart of <Weather.get_pocra_hourly_radiation>"""
+
+	doy_in_radians = ((2*np.pi)/365) * day_of_year
+	d_r = 1 + 0.033 * np.cos(doy_in_radians)
+	phi = latitude * (np.pi/180)
+	delta = 0.409 * np.sin(doy_in_radians - 1.39)
+	omega_s = np.arccos(-np.tan(phi) * np.tan(delta))
+	b = (2*np.pi/364) * (day_of_year-81)
+	S_c = (0.1645 * np.sin(2*b)) - (0.1255 * np.cos(b)) - (0.025 * np.sin(b))
+	t = hour - 0.5
+	omega = (np.pi/12) * ((t + 0.06667 * (277.5 - (360-longitude)) + S_c) - 12)
+	omega_2 = omega + np.pi/24 * Weather.t1
+	omega_1 = omega - np.pi/24 * Weather.t1
+
+	return np.where(np.abs(omega) > omega_s, 0, (
+		(60*12/np.pi) * Weather.G_sc * d_r * (
+			(omega_2-omega_1) * np.sin(phi) * np.sin(delta) + (
+				np.cos(phi) * np.cos(delta)
+				* (np.sin(omega_2)-np.sin(omega_1))
+			)
+		)
+	))
+
+
+def hourly_et0(temp_daily_max, temp_daily_min, temp_hourly_avg, rh_hourly_avg, wind_hourly_avg, elevation, r_a):
+	"""Array counterpart of <Weather.get_pocra_hourly_et0>"""
+
+	e_0_T_hr = 0.6108 * np.exp(17.27*temp_hourly_avg/(temp_hourly_avg+237.3))
+	e_a = e_0_T_hr * rh_hourly_avg/100
+
+	R_s = Weather.k_Rs * (temp_daily_max-temp_daily_min)**0.5 * r_a
+	R_ns = (1-Weather.alpha) * R_s
+	temp_avg_k = temp_hourly_avg + 273.15
+	R_so = (0.75 + 2*(10**(-5))*elevation) * r_a
+	with np.errstate(divide='ignore', invalid='ignore'):
+		R_nl = Weather.sigma * (temp_avg_k**4) * (0.34 - 0.14*((e_a)**0.5)) * np.where(
+			R_so == 0, (1.35*0.5 - 0.35), (1.35*R_s/R_so - 0.35)
+		)
+	R_n = R_ns - R_nl
+	G_hr = np.where(r_a == 0, 0.5 * R_n, 0.1 * R_n)
+	P = 101.3*((293-0.0065*elevation)/293)**5.26
+	gamma = 0.665 * 10**(-3) * P
+	cap_delta = 4098 * (0.6108* np.exp((17.27*temp_hourly_avg)/(temp_hourly_avg+237.3))) / (temp_hourly_avg+237.3)**2
+
+	return (
+		(0.408 * cap_delta * (R_n-G_hr) + gamma*(37/temp_avg_k)*wind_hourly_avg*(e_0_T_hr-e_a))
+		/ (cap_delta + gamma*(1+0.34*wind_hourly_avg))
+	)
+
+
+
+class BatchSimulation:
+	"""
+	Simulates PoCRA's soil-moisture model, like <PocraSMModelSimulation>,
+	for a whole batch of cells at once, time-step by time-step,
+	with every time-step being a few vectorized operations over all the cells.
+
+	The inputs mirror those of <PocraSMModelSimulation>, except that
+	per-cell inputs are arrays (of any common, broadcastable shape of cells):
+	1. soil_texture, soil_depth_category, lulc_type, slope: per-cell values;
+		or <field>: a <dict> of per-cell arrays of 'wp', 'fc', 'sat', 'ksat',
+		'cn_val', 'soil_depth' and 'slope'
+	2. weathers: a <dict> of weather-parameters (as named in <Weather>)
+		to [cells x steps] arrays or to [steps] arrays shared by all cells;
+		'rain' is required, and 'et0', if absent, is computed from the others
+	3. latitude, longitude, elevation: per-cell values
+	4. crop: a crop name or an array of them (one per cell)
+		rabi_crop: optionally, a rabi crop (of <lookups.dict_rabi_crop>) or an array of them,
+		with '' for cells without one; see below
+		crop_properties: optionally, a <dict> of per-cell values overriding the crop's
+		'root_depth' and 'depletion_factor', and of a 'kc_factor' scaling its kc
+	5. pet: [cells x steps] or [steps] array
+	6. model_state_at_start: <dict> with 'sm1_frac' and 'sm2_frac' (per-cell values)
+		and 'day_of_year' and 'hour_of_day' (common to all cells)
+	7. sowing_date_offset, sowing_threshold: per-cell values
+	8. start_date: as for <PocraSMModelSimulation>
+	The supported step_units are 'DAY' and 'HOUR'.
+
+	With <scenarios>, the weathers (and pet) have a leading axis of weather
+	realisations: they are [scenarios x cells x steps] arrays, or [scenarios x steps]
+	arrays shared by all the cells. The per-cell inputs are broadcast across the
+	scenarios without being copied, et0 is computed once per realisation (and per
+	cell only where it depends on the cell, e.g. its latitude), and the cells' shape
+	becomes [scenarios x cells].
+
+	With a <rabi_crop>, every cell is simulated over both seasons in the same pass:
+	the kharif <crop> until its crop-end, followed directly (from the state it leaves)
+	by a rabi phase, over the next <rabi_season_length> days (cut short at the end of
+	the rain-year), with the rabi crop's seasonal pet spread evenly over <rabi_season_length>
+	days (so that a phase cut short gets only its days' share of it).
+	The rabi phase keeps the kharif crop's layers and depletion_factor,
+	and is skipped for <lookups.long_kharif_crops> and when <pet> is given.
+
+	After <run>ning, <results> maps each of <Water.components>
+	to a [cells x steps] array, also accessible as attributes (e.g. <aet>);
+	it is a <results.Results>, which also aggregates them by day, month and crop-stage.
+	Alternatively, a <step_reducer> can be given, which is called after every
+	time-step with its index and its [components x cells] output (to be reduced
+	as the simulation goes), in which case the full results are not kept.
+
+	With a <telemetry.Telemetry>, the run reports its progress to it: the time-steps
+	done, the step throughput (cell-steps per second), and the cells that fail
+	(whose state becomes non-finite, e.g. from invalid soil properties), which
+	are otherwise simulated on (as nan) without affecting the other cells.
+
+	With <dtype> np.float32, the time-stepping (its state, rain and pet) and the
+	results are in single precision, halving their memory and bandwidth; the
+	field-setup and et0 are still computed in double precision.
+	(<pocragis_models.precision> reports the resulting deviations.)
+	"""
+
+	def __init__(s,
+		# field-related attributes
+		soil_texture=None, soil_depth_category=None, lulc_type=None, slope=None, field=None,
+		step_unit='DAY',
+		# weather-related attributes
+		weathers=None, latitude=None, elevation=None, longitude=None,
+		# crop
+		crop=None, rabi_crop=None, rabi_season_length=None, crop_properties=None,
+		# attribute determined by crop+weather
+		pet=None,
+		# attributes setting the starting state for the simulation
+		model_state_at_start=None, sowing_date_offset=None, sowing_threshold=None,
+		start_date=None,
+		scenarios=False, step_reducer=None, dtype=float, telemetry=None
+	):
+
+		if step_unit not in ['DAY', 'HOUR']:
+			raise ValueError(f'step_unit {step_unit} is not supported in batch-simulation')
+		s.step_unit = step_unit
+
+		if field is None:
+			field = dict(field_properties(soil_texture, soil_depth_category, lulc_type), slope=slope)
+		s.field = {p: np.asarray(v, dtype=float) for p, v in field.items()}
+
+		s.weathers = {p: np.asarray(v, dtype=float) for p, v in weathers.items()}
+		s.simulation_length = s.weathers['rain'].shape[-1]
+		s.latitude, s.longitude, s.elevation = (
+			None if v is None else np.asarray(v, dtype=float) for v in [latitude, longitude, elevation]
+		)
+
+		s.crop = np.asarray(crop, dtype=str)
+		s.rabi_crop = None if rabi_crop is None else np.asarray(rabi_crop, dtype=str)
+		s.rabi_season_length = rabi_season_length or lookups.DEFAULT_RABI_SEASON_LENGTH
+		s.crop_properties = {p: np.asarray(v, dtype=float) for p, v in (crop_properties or {}).items()}
+		s.pet = None if pet is None else np.asarray(pet, dtype=float)
+
+		s.model_state = {'sm1_frac': None, 'sm2_frac': None, 'day_of_year': 152, 'hour_of_day': 1}
+		s.model_state.update(model_state_at_start or {})
+		s.sowing_date_offset = sowing_date_offset
+		s.start_date = start_date
+		s.sowing_threshold = np.asarray(
+			lookups.DEFAULT_SOWING_THRESHOLD if sowing_threshold is None else sowing_threshold, dtype=float
+		)
+		s.step_reducer = step_reducer
+		s.dtype = np.dtype(dtype)
+		s.telemetry = telemetry
+
+		if scenarios:
+			# realisations shared by all the cells get (length-1) cell-axes
+			num_cell_axes = len(np.broadcast_shapes(
+				*[v.shape for v in s.field.values()], *[v.shape for v in s.crop_properties.values()],
+				*[np.shape(v) for v in [s.latitude, s.longitude, s.elevation, s.sowing_date_offset] if v is not None],
+				s.crop.shape
+			))
+			def with_cell_axes(v):
+				return v.reshape(v.shape[:1] + (1,)*num_cell_axes + v.shape[1:]) if v.ndim == 2 else v
+			s.weathers = {p: with_cell_axes(v) for p, v in s.weathers.items()}
+			s.pet = None if s.pet is None else with_cell_axes(s.pet)
+
+		s.cells_shape = np.broadcast_shapes(
+			*[v.shape for v in s.field.values()], *[v.shape for v in s.crop_properties.values()],
+			*[v.shape[:-1] for v in s.weathers.values()],
+			*[np.shape(v) for v in [s.latitude, s.longitude, s.elevation, s.sowing_date_offset] if v is not None],
+			*[np.shape(s.model_state[p]) for p in ['sm1_frac', 'sm2_frac'] if s.model_state[p] is not None],
+			s.crop.shape, () if s.rabi_crop is None else s.rabi_crop.shape, s.sowing_threshold.shape, () if s.pet is None else s.pet.shape[:-1]
+		)
+
+		s.results = None
+
+
+	def __getattr__(s, name):
+		if name in Water.components and s.__dict__.get('results') is not None:
+			return s.results[name]
+		raise AttributeError(name)
+
+
+	def time_major(s, a):
+		"""[cells x steps] (or [steps]) array as a contiguous [steps x cells] array"""
+		return np.ascontiguousarray(np.moveaxis(a, -1, 0).reshape(
+			(a.shape[-1],) + (1,)*(len(s.cells_shape) - a.ndim + 1) + a.shape[:-1]
+		))
+
+
+	def get_et0(s):
+		"""[cells x steps] (or [steps]) array of et0"""
+
+		w = s.weathers
+		if 'et0' in w:
+			return w['et0']
+
+		day_of_year = s.day_of_year
+		latitude = s.latitude[..., None] if s.latitude is not None else None
+		if s.step_unit == 'DAY':
+			r_a = daily_radiation(latitude, day_of_year)
+			if 'r_a' in w:
+				r_a = np.where(w['r_a'] != 0, w['r_a'], r_a)
+			s.r_a = r_a
+			return daily_et0(w['temp_daily_min'], w['temp_daily_avg'], w['temp_daily_max'], r_a)
+		else:
+			r_a = hourly_radiation(latitude, s.longitude[..., None], day_of_year, s.hour_of_day)
+			if 'r_a' in w:
+				r_a = np.where(w['r_a'] != 0, w['r_a'], r_a)
+			s.r_a = r_a
+			return hourly_et0(
+				w['temp_daily_max'], w['temp_daily_min'], w['temp_hourly_avg'],
+				w['rh_hourly_avg'], w['wind_hourly_avg'], s.elevation[..., None], r_a
+			)
+
+
+	def computation_before_iteration(s):
+
+		f = s.field
+		s.field_setup = field_setup(
+			f['wp'], f['fc'], f['sat'], f['soil_depth'], f['cn_val'], f['slope'], f['ksat'],
+			1 if s.step_unit == 'DAY' else 24
+		)
+
+		# per-crop properties, indexed by per-cell crop-index
+		crop_names, crop_index = np.unique(s.crop, return_inverse=True)
+		s.crop_index = np.broadcast_to(crop_index.reshape(s.crop.shape), s.cells_shape)
+		crop_properties = [lookups.dict_of_properties_for_crop_and_croplike[c] for c in crop_names]
+		kc_length = np.array([len(cp['kc']) for cp in crop_properties])
+		kc_table = np.zeros((len(crop_names), kc_length.max()))
+		for i, cp in enumerate(crop_properties):
+			kc_table[i, :kc_length[i]] = cp['kc']
+		s.kc_table, s.kc_length = kc_table, kc_length
+		s.depletion_factor = np.array([cp['depletion_factor'] for cp in crop_properties])[s.crop_index]
+		s.root_depth = np.array([cp['root_depth'] for cp in crop_properties])[s.crop_index]
+		is_pseudo_crop = np.array([cp['is_pseudo_crop'] for cp in crop_properties])[s.crop_index]
+		if 'depletion_factor' in s.crop_properties:
+			s.depletion_factor = np.broadcast_to(s.crop_properties['depletion_factor'], s.cells_shape)
+		if 'root_depth' in s.crop_properties:
+			s.root_depth = np.broadcast_to(s.crop_properties['root_depth'], s.cells_shape)
+
+		s.layer_1_thickness, s.layer_2_thickness = layer_thicknesses(f['soil_depth'], s.root_depth)
+
+		# time of every time-step
+		psmm = PocraSMModelSimulation
+		times = [
+			psmm.get_time_of_step(s.step_unit, s.model_state, i, s.start_date)
+				for i in range(s.simulation_length)
+		]
+		s.day_of_year = np.array([t[0] for t in times])
+		s.hour_of_day = np.array([t[1] for t in times]) if s.step_unit == 'HOUR' else None
+		s.day_of_rain_year_idx = day_of_rain_year_idx = np.array([
+			psmm.get_day_of_rain_year_idx(s.day_of_year[i]) if s.start_date is None
+			else psmm.get_day_of_rain_year_idx_of_date(psmm.get_date_of_step(s.step_unit, s.start_date, i))
+				for i in range(s.simulation_length)
+		])
+
+		# sowing_date_offset
+		if s.sowing_date_offset is not None:
+			sowing_date_offset = np.broadcast_to(np.asarray(s.sowing_date_offset, dtype=int), s.cells_shape)
+		elif s.pet is not None:
+			sowing_date_offset = np.broadcast_to(np.argmax(s.pet != 0, axis=-1), s.cells_shape)
+		else:
+			rain = s.weathers['rain']
+			if s.step_unit == 'DAY':
+				daily_rain = rain[..., :365]
+			else:
+				# summed hour by hour, in the same order as <PocraSMModelSimulation>
+				num_days = min(365, rain.shape[-1] // 24)
+				daily_rain = 0
+				for j in range(24):
+					daily_rain = daily_rain + rain[..., j::24][..., :num_days]
+			reached = np.cumsum(daily_rain, axis=-1) >= s.sowing_threshold[..., None]
+			# cells where the threshold is never reached are never sown
+			sowing_date_offset = np.where(
+				reached.any(axis=-1), np.argmax(reached, axis=-1), s.simulation_length + kc_length.max()
+			)
+			sowing_date_offset = np.broadcast_to(np.where(is_pseudo_crop, 0, sowing_date_offset), s.cells_shape)
+		s.sowing_date_offset = sowing_date_offset
+		s.crop_end_index = np.minimum(s.sowing_date_offset + kc_length[s.crop_index], 364)
+
+		# pet timeline, [steps x cells]
+		if s.pet is None:
+			day_of_crop_idx = (
+				day_of_rain_year_idx.reshape((-1,) + (1,)*len(s.cells_shape)) - s.sowing_date_offset
+			)
+			is_crop_day = (day_of_crop_idx >= 0) & (day_of_crop_idx < kc_length[s.crop_index])
+			s.kc = np.where(
+				is_crop_day, kc_table[s.crop_index, np.clip(day_of_crop_idx, 0, kc_table.shape[1]-1)], 0
+			)
+			if 'kc_factor' in s.crop_properties:
+				s.kc = s.kc * s.crop_properties['kc_factor']
+			s.et0 = s.get_et0()
+			s.pet_time_major = s.kc * s.time_major(s.et0)
+
+			# rabi phase, following the kharif crop's end
+			if s.rabi_crop is not None:
+				rabi_names, rabi_index = np.unique(s.rabi_crop, return_inverse=True)
+				rabi_seasonal_pet = np.array([
+					lookups.dict_rabi_crop[c] if c else 0 for c in rabi_names
+				])[rabi_index.reshape(s.rabi_crop.shape)]
+				is_long_kharif = np.isin(crop_names, lookups.long_kharif_crops)[s.crop_index]
+				rabi_start = s.sowing_date_offset + kc_length[s.crop_index]
+				rain_year_length = 365 if s.start_date is None else psmm.get_rain_year_length(
+					s.start_date.year if (s.start_date.month, s.start_date.day) >= (6, 1) else s.start_date.year - 1
+				)
+				s.rabi_length = np.where(
+					is_long_kharif | (rabi_seasonal_pet == 0), 0,
+					np.clip(rain_year_length - rabi_start, 0, s.rabi_season_length)
+				)
+				day_of_rabi_idx = day_of_crop_idx - kc_length[s.crop_index]
+				is_rabi_day = (day_of_rabi_idx >= 0) & (day_of_rabi_idx < s.rabi_length)
+				s.rabi_pet = np.where(
+					is_rabi_day,
+					rabi_seasonal_pet / s.rabi_season_length / (1 if s.step_unit == 'DAY' else 24), 0
+				)
+				s.pet_time_major = s.pet_time_major + s.rabi_pet
+		else:
+			s.pet_time_major = s.time_major(s.pet)
+		s.pet_time_major = s.pet_time_major.astype(s.dtype, copy=False)
+		s.rain_time_major = s.time_major(s.weathers['rain']).astype(s.dtype, copy=False)
+
+
+	def iterate(s):
+
+		f, fs = s.field, s.field_setup
+		stepper = PocraSMModelStepper(
+			s.layer_1_thickness, s.layer_2_thickness,
+			f['wp'], f['fc'], f['sat'], fs['smax'], fs['w1'], fs['w2'], fs['perc_factor'],
+			s.depletion_factor,
+			dtype=s.dtype, shape=s.cells_shape
+		)
+		state = stepper.new_state(s.model_state['sm1_frac'], s.model_state['sm2_frac'])
+		if s.telemetry is not None:
+			s.telemetry.start(int(np.prod(s.cells_shape)), s.simulation_length, step_unit=s.step_unit)
+			s.failed = np.zeros(s.cells_shape, dtype=bool)
+
+		if s.step_reducer is not None:
+			out = stepper.new_output()
+			for i in range(s.simulation_length):
+				stepper.step(state, s.rain_time_major[i], s.pet_time_major[i], out)
+				s.step_reducer(i, out)
+				if s.telemetry is not None:
+					s.report_progress(i, state)
+			s.model_state = {'sm1_frac': state[0], 'sm2_frac': state[1]}
+			return
+
+		# time-major, so that every time-step writes contiguous blocks
+		s.output = np.empty((len(Water.components), s.simulation_length) + s.cells_shape, dtype=s.dtype)
+		for i in range(s.simulation_length):
+			stepper.step(state, s.rain_time_major[i], s.pet_time_major[i], s.output[:, i])
+			if s.telemetry is not None:
+				s.report_progress(i, state)
+
+		s.model_state = {'sm1_frac': state[0], 'sm2_frac': state[1]}
+		s.results = Results(
+			{c: np.moveaxis(s.output[k], 0, -1) for k, c in enumerate(Water.components)},
+			s.step_unit, s.day_of_year, s.hour_of_day, s.start_date, crop_stages=s.get_crop_stages
+		)
+
+
+	def get_crop_stages(s):
+		"""[cells x steps] crop-stages of the time-steps, and their number (see <get_crop_stage_labels>)"""
+
+		day_of_crop_idx = (
+			s.day_of_rain_year_idx.reshape((-1,) + (1,)*len(s.cells_shape)) - s.sowing_date_offset
+		)
+		labels, num_stages = get_crop_stage_labels(s.kc_table, s.kc_length, s.crop_index, day_of_crop_idx)
+		return np.moveaxis(labels, 0, -1), num_stages
+
+
+	def report_progress(s, i, state):
+		"""Reports the progress after time-step <i> to the <telemetry>, when due, with the cells newly failed"""
+
+		t = s.telemetry
+		last = i == s.simulation_length - 1
+		if not (last or t.is_due()):
+			return
+
+		failed = ~np.isfinite(state).all(axis=0)
+		for cell in np.argwhere(failed & ~s.failed):
+			cell = tuple(cell.tolist())
+			t.failed(
+				cell, {p: np.broadcast_to(v, s.cells_shape)[cell].item() for p, v in s.field.items()},
+				f'non-finite state at time-step {i}'
+			)
+		s.failed |= failed
+
+		num_cells = int(np.prod(s.cells_shape))
+		run_time = time.time() - t.start_time
+		t.progress(
+			(i + 1) / s.simulation_length, force=last,
+			steps_done=i + 1, step_throughput=(i + 1) * num_cells / run_time, num_failed=int(s.failed.sum())
+		)
+		if last:
+			t.end(steps_done=i + 1)
+
+
+	def run(s):
+		s.computation_before_iteration()
+		s.iterate()
+		return s.results
@@ -0,0 +1,186 @@
+"""
+This module calibrates parameters of PoCRA's soil-moisture model
+(e.g. curve-numbers and depletion-factors) against observations,
+such as gauged runoff or soil-moisture sensor data.
+
+Every iteration of the optimiser evaluates its whole population of candidate
+parameter-sets as one <BatchSimulation>, each candidate being a cell. What does
+not depend on the parameters being calibrated (the et0 and kc timelines, and
+the sowing date) is computed once per site and reused by every evaluation.
+Calibrations of several sites can be run in a pool of processes.
+
+Usage:
+>>> calibration = Calibration(
+>>> 	field=Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3),
+>>> 	crop='soyabean', weathers={'rain': [...], 'et0': [...]},
+>>> 	observations={'sec_runoff': [...]}, # nan where not observed
+>>> 	parameters={'cn_val': (60, 95), 'depletion_factor': (0.2, 0.7)},
+>>> 	loss='nse'
+>>> )
+>>> best, best_loss = calibration.optimise(population_size=40, num_iterations=100)
+>>> results = calibrate_sites([calibration_1, calibration_2, ...], num_workers=4)
+"""
+
+import os
+import multiprocessing
+
+import numpy as np
+
+from .models import Water
+from .batch import BatchSimulation
+
+
+
+def rmse(simulated, observed):
+	"""Root-mean-square error of [population x steps] simulated series, over the observed (non-nan) steps"""
+	observed = np.asarray(observed, dtype=float)
+	mask = ~np.isnan(observed)
+	return np.sqrt(np.mean((simulated[..., mask] - observed[mask])**2, axis=-1))
+
+
+def nse(simulated, observed):
+	"""1 - Nash–Sutcliffe efficiency (so that 0 is a perfect fit), over the observed (non-nan) steps"""
+	observed = np.asarray(observed, dtype=float)
+	mask = ~np.isnan(observed)
+	observed = observed[mask]
+	return (
+		np.sum((simulated[..., mask] - observed)**2, axis=-1)
+		/ np.sum((observed - observed.mean())**2)
+	)
+
+
+loss_functions = {'rmse': rmse, 'nse': nse}
+
+
+
+class Calibration:
+	"""
+	Calibration of a site's parameters against its observations.
+
+	<field> is a <Field> (or a <dict> of the field parameters 'wp', 'fc', 'sat',
+	'ksat', 'cn_val', 'soil_depth' and 'slope') giving the values of the
+	parameters not being calibrated.
+	<observations> maps components (of <Water.components>) to their observed
+	[steps] series, with nan where not observed.
+	<parameters> maps the parameters to calibrate to their (low, high) bounds;
+	they can be any of the field parameters and 'depletion_factor', 'root_depth'
+	and 'kc_factor' (see <BatchSimulation>'s <crop_properties>).
+	<loss> is a name of <loss_functions> or a function like them; the losses of
+	the components are summed, weighted by <weights> if given.
+	Any other keyword-arguments are passed on to the <BatchSimulation>s.
+	"""
+
+	field_params = ['wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth', 'slope']
+	crop_params = ['depletion_factor', 'root_depth', 'kc_factor']
+
+	def __init__(s, field, crop, weathers, observations, parameters,
+		loss='nse', weights=None, step_unit='DAY',
+		**simulation_kwargs
+	):
+		s.field = {
+			p: float(field[p] if isinstance(field, dict) else getattr(field, p)) for p in s.field_params
+		}
+		s.crop = crop
+		s.weathers = weathers
+		s.observations = {c: np.asarray(v, dtype=float) for c, v in observations.items()}
+		if any(c not in Water.components for c in s.observations):
+			raise ValueError(f'observations should be of components among {Water.components}')
+		s.parameters = parameters
+		if any(p not in s.field_params + s.crop_params for p in s.parameters):
+			raise ValueError(f'parameters should be among {s.field_params + s.crop_params}')
+		s.loss = loss_functions[loss] if isinstance(loss, str) else loss
+		s.weights = weights or {}
+		s.step_unit = step_unit
+		s.simulation_kwargs = simulation_kwargs
+
+		s.pet = None
+		s.sowing_date_offset = None
+		s.history = []
+
+
+	def prepare(s):
+		"""Computes the parameter-independent pet timeline and sowing date, once"""
+
+		if s.pet is not None:
+			return
+		if 'pet' in s.simulation_kwargs:
+			s.pet = np.asarray(s.simulation_kwargs.pop('pet'), dtype=float)
+			s.sowing_date_offset = s.simulation_kwargs.pop('sowing_date_offset', None)
+			return
+		bs = BatchSimulation(
+			field=s.field, weathers=s.weathers, crop=s.crop, step_unit=s.step_unit,
+			sowing_date_offset=s.simulation_kwargs.pop('sowing_date_offset', None), **s.simulation_kwargs
+		)
+		bs.computation_before_iteration()
+		s.pet = bs.pet_time_major[:, 0] if bs.pet_time_major.ndim > 1 else bs.pet_time_major
+		s.sowing_date_offset = int(bs.sowing_date_offset)
+		for p in ['sowing_threshold', 'latitude', 'longitude', 'elevation']:
+			s.simulation_kwargs.pop(p, None)
+
+
+	def evaluate(s, population):
+		"""Losses of a population, a <dict> of per-candidate arrays of the <parameters>"""
+
+		s.prepare()
+		population = {p: np.asarray(v, dtype=float) for p, v in population.items()}
+		pet = s.pet
+		if 'kc_factor' in population:
+			pet = population['kc_factor'][:, None] * pet
+
+		bs = BatchSimulation(
+			field={p: population.get(p, s.field[p]) for p in s.field_params},
+			weathers={'rain': s.weathers['rain']}, crop=s.crop, step_unit=s.step_unit,
+			pet=pet, sowing_date_offset=s.sowing_date_offset,
+			crop_properties={p: population[p] for p in ['depletion_factor', 'root_depth'] if p in population},
+			**s.simulation_kwargs
+		)
+		with np.errstate(all='ignore'):
+			bs.run()
+			losses = sum(
+				s.weights.get(c, 1) * s.loss(np.atleast_2d(bs.results[c]), observed)
+					for c, observed in s.observations.items()
+			)
+		# candidates that are not physically valid (e.g. with fc >= sat) never win
+		return np.where(np.isnan(losses), np.inf, losses)
+
+
+	def optimise(s, population_size=40, num_iterations=100, mutation=0.7, crossover=0.9, seed=None):
+		"""
+		Minimises the loss by differential evolution (rand/1/bin) within the parameters' bounds.
+		Returns the best parameter-set found and its loss.
+		"""
+
+		rng = np.random.default_rng(seed)
+		names = list(s.parameters)
+		low, high = (np.array([s.parameters[p][k] for p in names], dtype=float) for k in [0, 1])
+
+		population = low + rng.random((population_size, len(names))) * (high - low)
+		losses = s.evaluate(dict(zip(names, population.T)))
+		for _ in range(num_iterations):
+			choices = np.array([rng.choice(population_size - 1, 3, replace=False) for _ in range(population_size)])
+			choices += choices >= np.arange(population_size)[:, None] # never the candidate itself
+			a, b, c = (population[choices[:, k]] for k in range(3))
+			crossed = rng.random(population.shape) < crossover
+			crossed[np.arange(population_size), rng.integers(len(names), size=population_size)] = True
+			trials = np.clip(np.where(crossed, a + mutation * (b - c), population), low, high)
+
+			trial_losses = s.evaluate(dict(zip(names, trials.T)))
+			improved = trial_losses <= losses
+			population[improved], losses[improved] = trials[improved], trial_losses[improved]
+			s.history.append(losses.min())
+
+		best = np.argmin(losses)
+		return dict(zip(names, population[best].tolist())), float(losses[best])
+
+
+
+def _optimise(args):
+	calibration, optimise_kwargs = args
+	return calibration.optimise(**optimise_kwargs)
+
+
+def calibrate_sites(calibrations, num_workers=None, **optimise_kwargs):
+	"""Runs the <optimise> of several sites' <Calibration>s in a pool of processes, returning their results in order"""
+
+	with multiprocessing.Pool(num_workers or os.cpu_count()) as pool:
+		return pool.map(_optimise, [(calibration, optimise_kwargs) for calibration in calibrations])
@@ -0,0 +1,146 @@
+"""
+This module is the command-line entry point of the package, for running
+a simulation (of a field) or a batch (of cells) from input files.
+
+It is meant to start fast, e.g. for short-lived per-farm jobs: at the start,
+only the standard library's argparse and csv are imported; a command imports
+what it needs when it runs, so that a single simulation never loads numpy,
+and only a batch does (and its <ResultStore> and <Telemetry>, only if asked for).
+
+Usage:
+$ python -m pocragis_models simulate --weathers weathers.csv --soil-texture clayey \
+	--soil-depth-category 'deep to very deep (> 50 cm)' --lulc-type kharif --slope 3 --crop soyabean \
+	--output results.csv
+$ python -m pocragis_models batch --cells cells.csv --weathers weathers.npz --output results.npz \
+	--telemetry run.jsonl
+
+Weathers are read from a csv-file with a column per weather-parameter (as named
+in <Weather>; other columns, like a date, are ignored) and a row per time-step,
+or, for a batch, also from a .npz file of [cells x steps] (or [steps]) arrays.
+The cells of a batch are read from a csv-file with a row per cell and the columns
+soil_texture, soil_depth_category, lulc_type, slope and crop (or wp, fc, sat,
+ksat, cn_val, soil_depth and slope instead of the first three), and optionally
+cell_id, latitude, longitude and elevation.
+"""
+
+import csv
+import argparse
+
+
+field_params = ['wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth', 'slope']
+
+
+def read_weathers_csv(path):
+	"""The columns of a weathers csv-file that are weather-parameters, as a <dict> of <list>s"""
+
+	from .models import Weather
+	params = Weather.__init__.__code__.co_varnames[1:Weather.__init__.__code__.co_argcount]
+	with open(path, newline='') as f:
+		rows = list(csv.DictReader(f))
+	return {p: [float(r[p]) for r in rows] for p in params if rows and p in rows[0] and rows[0][p] != ''}
+
+
+def run_simulation(args):
+
+	from .simulate import PocraSMModelSimulation, SimulationIO
+	from .models import Water
+
+	psmm = PocraSMModelSimulation(
+		soil_texture=args.soil_texture, soil_depth_category=args.soil_depth_category,
+		lulc_type=args.lulc_type, slope=args.slope, step_unit=args.step_unit,
+		weathers=read_weathers_csv(args.weathers),
+		latitude=args.latitude, longitude=args.longitude, elevation=args.elevation,
+		crop=args.crop
+	)
+	psmm.run()
+	SimulationIO.output_water_components_to_csv(psmm, args.components or Water.components, args.output)
+
+
+def run_batch(args):
+
+	import numpy as np
+	from .models import Water
+	from .batch import BatchSimulation
+
+	with open(args.cells, newline='') as f:
+		cells = list(csv.DictReader(f))
+	columns = cells[0].keys() if cells else []
+	if all(p in columns for p in field_params):
+		field_kwargs = {'field': {p: np.array([float(c[p]) for c in cells]) for p in field_params}}
+	else:
+		field_kwargs = {
+			p: np.array([c[p] for c in cells]) for p in ['soil_texture', 'soil_depth_category', 'lulc_type']
+		}
+		field_kwargs['slope'] = np.array([float(c['slope']) for c in cells])
+	location_kwargs = {
+		p: np.array([float(c[p]) for c in cells]) for p in ['latitude', 'longitude', 'elevation'] if p in columns
+	}
+
+	if args.weathers.endswith('.npz'):
+		with np.load(args.weathers) as npz:
+			weathers = {p: npz[p] for p in npz.files}
+	else:
+		weathers = read_weathers_csv(args.weathers)
+
+	telemetry = None
+	if args.telemetry:
+		from .telemetry import Telemetry
+		telemetry = Telemetry(args.telemetry)
+
+	bs = BatchSimulation(
+		**field_kwargs, step_unit=args.step_unit, weathers=weathers, **location_kwargs,
+		crop=np.array([c['crop'] for c in cells]), dtype=np.dtype(args.dtype), telemetry=telemetry
+	)
+	with np.errstate(all='ignore'):
+		bs.run()
+	components = args.components or Water.components
+
+	if args.store:
+		from .store import ResultStore
+		cell_ids = [int(c['cell_id']) for c in cells] if 'cell_id' in columns else list(range(len(cells)))
+		store = ResultStore.create(
+			args.store, cell_ids, bs.simulation_length, components=components, step_unit=args.step_unit,
+			crop=cells[0]['crop'] if len({c['crop'] for c in cells}) == 1 else None, dtype=bs.dtype
+		)
+		store.write_cells(cell_ids, {c: bs.results[c] for c in components})
+		store.flush()
+	if args.output:
+		np.savez(args.output, **{c: bs.results[c] for c in components})
+
+
+def main(argv=None):
+
+	parser = argparse.ArgumentParser(prog='pocragis_models', description="Runs PoCRA's soil-moisture model")
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	simulate = commands.add_parser('simulate', help='simulate a field')
+	simulate.add_argument('--weathers', required=True, help='csv-file of the weathers')
+	simulate.add_argument('--soil-texture', required=True)
+	simulate.add_argument('--soil-depth-category', required=True)
+	simulate.add_argument('--lulc-type', required=True)
+	simulate.add_argument('--slope', type=float, required=True)
+	simulate.add_argument('--crop', required=True)
+	simulate.add_argument('--latitude', type=float)
+	simulate.add_argument('--longitude', type=float)
+	simulate.add_argument('--elevation', type=float)
+	simulate.add_argument('--output', default='results.csv', help='csv-file of the results')
+	simulate.add_argument('--step-unit', default='DAY', choices=['DAY', 'HOUR', 'SPREAD_DAILY_ET0_USING_HOURLY', 'ADAPTIVE'])
+	simulate.set_defaults(run=run_simulation)
+
+	batch = commands.add_parser('batch', help='simulate a batch of cells')
+	batch.add_argument('--cells', required=True, help='csv-file of the cells')
+	batch.add_argument('--weathers', required=True, help='.npz or csv-file of the weathers')
+	batch.add_argument('--output', help='.npz file of the [cells x steps] results')
+	batch.add_argument('--store', help='directory of a <ResultStore> of the results')
+	batch.add_argument('--telemetry', help='JSON-lines file of the telemetry')
+	batch.add_argument('--dtype', default='float64', choices=['float64', 'float32'])
+	batch.add_argument('--step-unit', default='DAY', choices=['DAY', 'HOUR'])
+	batch.set_defaults(run=run_batch)
+
+	for command in [simulate, batch]:
+		command.add_argument('--components', nargs='+', help='components of the results (all by default)')
+
+	args = parser.parse_args(argv)
+	if args.command == 'batch' and not (args.output or args.store):
+		parser.error('batch needs --output and/or --store')
+	args.run(args)
@@ -0,0 +1,189 @@
+"""
+This module contains the input and output of drainage-networks' runs as arrays,
+so that large runs never hold their runoffs or transients in Python lists.
+
+Runoffs are [streams x steps] arrays of runoff_per_area_in_watershed.
+They can be read from the wide csv-files of test/example_drainage_input.csv
+(a row per stream, with a column per time-step, named '1', '2', ...),
+converted once to a .npy file, and then iterated over in chunks of time-steps,
+of which only the current chunk is read from the (memory-mapped) file.
+
+Runoffs are [streams x steps] throughout: those of <Drainage.run> and of
+<routing.DrainageNetwork.run> alike (whose routed arrays are [streams x steps] too).
+Transients are written to a sink, a time-step at a time, as rows: so a sink's
+files are a [steps x streams] array per field of <Drainage.Stream.Transient>
+(to be transposed, as <np.load(...).T>, to the runoffs' orientation).
+<NpyTransientSink> appends to a .npy file per field, and <CsvTransientSink>
+to a csv-file per field (with a column per stream).
+
+Usage:
+>>> convert_runoffs_csv_to_npy('drainage_input.csv', 'runoffs.npy')
+>>> runoffs = np.load('runoffs.npy', mmap_mode='r')
+>>> with NpyTransientSink('transients', len(drainage.connected_streams), fields=['volume_out']) as sink:
+>>> 	drainage.run(iterate_chunks(runoffs, 1000), sink=sink, keep_transients=False)
+>>> np.load('transients/volume_out.npy') # [steps x streams] array
+"""
+
+import os
+import csv
+
+import numpy as np
+
+from .routing import transient_fields
+
+
+def get_step_columns(header):
+	"""Indices of the time-step columns ('1', '2', ...) of a drainage-input csv-file's header"""
+
+	columns = []
+	while str(len(columns) + 1) in header:
+		columns.append(header.index(str(len(columns) + 1)))
+	return columns
+
+
+def read_runoffs(path):
+	"""Returns the stream_ids and the [streams x steps] runoffs of a drainage-input csv-file"""
+
+	with open(path, newline='') as f:
+		reader = csv.reader(f)
+		header = next(reader)
+		columns = get_step_columns(header)
+		stream_ids = []; runoffs = []
+		for row in reader:
+			stream_ids.append(row[header.index('stream_id')])
+			runoffs.append(np.array([row[k] for k in columns], dtype=float))
+	return stream_ids, np.array(runoffs).reshape(len(runoffs), len(columns))
+
+
+def convert_runoffs_csv_to_npy(csv_path, npy_path, dtype=float):
+	"""Writes the [streams x steps] runoffs of a drainage-input csv-file to a .npy file, a row at a time"""
+
+	with open(csv_path, newline='') as f:
+		reader = csv.reader(f)
+		columns = get_step_columns(next(reader))
+		num_streams = sum(1 for _ in reader)
+
+	runoffs = np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype, shape=(num_streams, len(columns)))
+	with open(csv_path, newline='') as f:
+		reader = csv.reader(f)
+		next(reader)
+		for j, row in enumerate(reader):
+			runoffs[j] = [row[k] for k in columns]
+	runoffs.flush()
+	del runoffs
+
+
+def iterate_chunks(runoffs, chunk_size):
+	"""Iterates over [streams x steps] runoffs in [streams x chunk_size] chunks of consecutive time-steps"""
+
+	for start in range(0, runoffs.shape[1], chunk_size):
+		yield np.asarray(runoffs[:, start:start+chunk_size])
+
+
+
+class TransientSink:
+	"""
+	Base of the sinks of transients.
+
+	<write> takes a time-step's transients: either a <list> (per stream) of
+	<Drainage.Stream.Transient>s, or a <dict> of per-stream arrays of their fields
+	(as returned by <DrainageNetwork.step>).
+	"""
+
+	def __init__(s, num_streams, fields=transient_fields, dtype=float):
+		s.num_streams = num_streams
+		s.fields = list(fields)
+		s.dtype = np.dtype(dtype)
+		s.num_steps = 0
+
+
+	def get_values(s, transients):
+
+		if isinstance(transients, dict):
+			return {f: np.asarray(transients[f], dtype=s.dtype) for f in s.fields}
+		return {f: np.array([getattr(t, f) for t in transients], dtype=s.dtype) for f in s.fields}
+
+
+	def write(s, transients):
+
+		for f, values in s.get_values(transients).items():
+			s.write_field(f, values)
+		s.num_steps += 1
+
+
+	def __enter__(s):
+		return s
+
+
+	def __exit__(s, *exc_info):
+		s.close()
+
+
+
+class NpyTransientSink(TransientSink):
+	"""
+	Writes transients to a [steps x streams] .npy file per field, <directory>/<field>.npy
+	(<num_streams> can also be the shape of a time-step's values, e.g. [scenarios x streams]).
+	The files' headers are written with room for any shape, and get their number
+	of rows (time-steps) on <close>.
+	"""
+
+	header_length = 128
+
+	def __init__(s, directory, num_streams, fields=transient_fields, dtype=float):
+		super().__init__(num_streams, fields, dtype)
+		s.directory = directory
+		os.makedirs(directory, exist_ok=True)
+		s.files = {f: open(os.path.join(directory, f + '.npy'), 'wb') for f in s.fields}
+		for file in s.files.values():
+			file.write(s.get_header(0))
+
+
+	def get_header(s, num_steps):
+		"""Header of a version 1.0 .npy file, padded to <header_length> bytes"""
+
+		step_shape = (s.num_streams,) if isinstance(s.num_streams, int) else tuple(int(n) for n in s.num_streams)
+		header = repr({'descr': s.dtype.str, 'fortran_order': False, 'shape': (num_steps,) + step_shape})
+		header = header.ljust(s.header_length - 10 - 1) + '\n'
+		return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+	def write_field(s, field, values):
+		s.files[field].write(values.tobytes())
+
+
+	def close(s):
+
+		for file in s.files.values():
+			if file.closed:
+				continue
+			file.seek(0)
+			file.write(s.get_header(s.num_steps))
+			file.close()
+
+
+
+class CsvTransientSink(TransientSink):
+	"""
+	Writes transients to a csv-file per field, <directory>/<field>.csv,
+	with a row per time-step and a column per stream (headed by its <stream_ids>).
+	"""
+
+	def __init__(s, directory, stream_ids, fields=transient_fields, dtype=float):
+		super().__init__(len(stream_ids), fields, dtype)
+		s.directory = directory
+		os.makedirs(directory, exist_ok=True)
+		s.files = {f: open(os.path.join(directory, f + '.csv'), 'w', newline='') for f in s.fields}
+		s.writers = {f: csv.writer(file) for f, file in s.files.items()}
+		for writer in s.writers.values():
+			writer.writerow(['time_step'] + list(stream_ids))
+
+
+	def write_field(s, field, values):
+		s.writers[field].writerow([s.num_steps] + values.tolist())
+
+
+	def close(s):
+
+		for file in s.files.values():
+			file.close()
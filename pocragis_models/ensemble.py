@@ -0,0 +1,125 @@
+"""
+This module runs ensembles of PoCRA's soil-moisture model, for uncertainty
+bands on its outputs arising from its point-estimate parameters: the soil
+properties of <lookups.dict_SoilProperties_in_soil_properties_order>, the
+curve-number and the crop's root-depth and kc curve.
+
+All the members of an ensemble are simulated as one <BatchSimulation>,
+with the field-setup evaluated per member. Rather than keeping the members'
+full series, percentiles across the members are computed as it goes:
+of every time-step's components, and of their totals over the simulation.
+
+Usage:
+>>> es = EnsembleSimulation(
+>>> 	field=Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3),
+>>> 	crop='soyabean', weathers={'rain': [...], 'et0': [...]},
+>>> 	perturbations={'wp': 0.1, 'fc': 0.1, 'cn_val': 0.05, 'kc': 0.15},
+>>> 	num_members=500
+>>> )
+>>> es.run()
+>>> es.step_percentiles['gw_rech'] # [percentiles x steps] array
+>>> es.total_percentiles['deficit'] # [percentiles] array
+"""
+
+import numpy as np
+
+from . import lookups
+from .models import Water
+from .batch import BatchSimulation
+
+
+
+class EnsembleSimulation:
+	"""
+	Ensemble of simulations of a field and crop, with perturbed parameters.
+
+	<perturbations> maps any of 'wp', 'fc', 'sat', 'ksat', 'cn_val',
+	'root_depth' and 'kc' to either:
+	1. a number f: the members' values are the point-estimate scaled by
+		factors drawn uniformly from [1-f, 1+f]
+	2. a distribution: a callable <(rng, num_members)> returning the members' values
+		(for 'kc', the factors scaling the crop's kc curve)
+	Members whose perturbed soil properties are not ordered (wp < fc < sat)
+	have them redrawn, truncating their distributions to the ordered ones.
+
+	<components> are any of <Water.components> and 'deficit' (pet - aet).
+	Any other keyword-arguments are passed on to the <BatchSimulation>.
+	"""
+
+	field_params = ['wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth', 'slope']
+
+	def __init__(s, field, crop, weathers,
+		perturbations=None, num_members=100, percentiles=(5, 25, 50, 75, 95),
+		components=('gw_rech', 'deficit'), seed=None,
+		**simulation_kwargs
+	):
+		s.field = field
+		s.crop = crop
+		s.weathers = weathers
+		s.perturbations = perturbations or {}
+		s.num_members = num_members
+		s.percentiles = np.asarray(percentiles, dtype=float)
+		s.components = list(components)
+		s.rng = np.random.default_rng(seed)
+		s.simulation_kwargs = simulation_kwargs
+
+		s.members = None
+		s.step_percentiles = None
+		s.total_percentiles = None
+
+
+	def draw(s, param, point_estimate):
+
+		perturbation = s.perturbations.get(param)
+		if perturbation is None:
+			return np.full(s.num_members, float(point_estimate))
+		if callable(perturbation):
+			return np.asarray(perturbation(s.rng, s.num_members), dtype=float)
+		return point_estimate * s.rng.uniform(1 - perturbation, 1 + perturbation, s.num_members)
+
+
+	def generate_members(s):
+
+		members = {p: s.draw(p, getattr(s.field, p)) for p in s.field_params}
+		for _ in range(100):
+			unordered = ~((members['wp'] < members['fc']) & (members['fc'] < members['sat']))
+			if not unordered.any():
+				break
+			for p in ['wp', 'fc', 'sat']:
+				members[p][unordered] = s.draw(p, getattr(s.field, p))[unordered]
+		else:
+			raise ValueError('The perturbations of wp, fc and sat are too wide to keep them ordered')
+		members['root_depth'] = s.draw(
+			'root_depth', lookups.dict_of_properties_for_crop_and_croplike[s.crop]['root_depth']
+		)
+		members['kc_factor'] = s.draw('kc', 1)
+		s.members = members
+		return members
+
+
+	def run(s):
+
+		members = s.members or s.generate_members()
+		num_steps = np.shape(s.weathers['rain'])[-1]
+		index = {c: k for k, c in enumerate(Water.components)}
+
+		step_percentiles = {c: np.empty((len(s.percentiles), num_steps)) for c in s.components}
+		totals = {c: np.zeros(s.num_members) for c in s.components}
+
+		def reduce_step(i, out):
+			for c in s.components:
+				value = out[index['pet']] - out[index['aet']] if c == 'deficit' else out[index[c]]
+				step_percentiles[c][:, i] = np.percentile(value, s.percentiles)
+				totals[c] += value
+
+		BatchSimulation(
+			field={p: members[p] for p in s.field_params},
+			weathers=s.weathers, crop=s.crop,
+			crop_properties={'root_depth': members['root_depth'], 'kc_factor': members['kc_factor']},
+			step_reducer=reduce_step,
+			**s.simulation_kwargs
+		).run()
+
+		s.step_percentiles = step_percentiles
+		s.total_percentiles = {c: np.percentile(totals[c], s.percentiles) for c in s.components}
+		return s.step_percentiles, s.total_percentiles
@@ -0,0 +1,208 @@
+"""
+This module re-runs a simulation after a change of its inputs (e.g. the crop,
+the sowing date, or a corrected rain on one day), recomputing only what
+depends on the changed inputs.
+
+The derived quantities of <PocraSMModelSimulation> depend on its inputs as:
+1. field setup (smax, w1, w2, perc_factor): on the field only
+2. layer-thicknesses: on the field's soil_depth and the crop's root_depth
+3. sowing_date_offset (unless given): on the crop and the rain of the first year
+4. r_a and et0 of a time-step: on the weather of that time-step only (not the rain)
+5. kc timeline: on the crop and the sowing_date_offset
+6. pet of a time-step: on its kc and et0
+7. water-balance from a time-step on: on the field, the layers and the crop's
+	depletion_factor, the state at that time-step, and the rain and pet from it on
+So a change of the crop recomputes the layers, sowing and kc timeline (but no et0),
+a change of a day's temperature recomputes only that day's et0, and the
+water-balance is resumed from the first time-step whose rain or pet changed.
+The state before every <checkpoint_interval>-th time-step is kept as a checkpoint,
+so the water-balance is resumed from the nearest checkpoint before the change
+(from the start, if the field, layers or depletion_factor changed).
+
+Only step_units 'DAY' and 'HOUR' are resumed from checkpoints; with the others,
+whose time-steps depend on the whole day, the water-balance is recomputed from
+the start after any change.
+
+Usage:
+>>> ipsmm = IncrementalPocraSMModelSimulation(<input-parameters of PocraSMModelSimulation>, checkpoint_interval=30)
+>>> ipsmm.run()
+>>> ipsmm.set_weather(200, rain=12.5)
+>>> ipsmm.set_crop('cotton')
+>>> ipsmm.run() # recomputes only what the changes affect
+>>> ipsmm.aet, ipsmm.resumed_from_step
+"""
+
+from .models import Field, Crop
+from .simulate import PocraSMModelSimulation, _identical
+
+
+
+class IncrementalPocraSMModelSimulation:
+	"""
+	A <PocraSMModelSimulation> (<psmm>, made from <simulation_kwargs>) that is
+	re-<run> incrementally after changes by <set_field>, <set_crop>,
+	<set_sowing_date_offset> and <set_weather>. Its results are accessible
+	as those of <psmm> (e.g. <aet>), and are the same as those of
+	a <PocraSMModelSimulation> run afresh with the changed inputs.
+	"""
+
+	def __init__(s, checkpoint_interval=30, **simulation_kwargs):
+		s.psmm = psmm = PocraSMModelSimulation(**simulation_kwargs)
+		s.checkpoint_interval = checkpoint_interval
+		s.resumable = psmm.step_unit in ['DAY', 'HOUR']
+
+		# the inputs, as given, that the derived quantities are recomputed from
+		s.given_model_state = simulation_kwargs.get('model_state_at_start')
+		s.given_sowing_date_offset = psmm.sowing_date_offset
+		s.given_pet = psmm.pet
+		s.given_r_a_et0 = [(w.r_a is not None, w.et0 is not None) for w in psmm.weathers]
+
+		s.checkpoints = {}
+		s.pet_timeline = None
+		s.resumed_from_step = None
+
+		# what is to be recomputed: everything, at first
+		s.num_valid_steps = 0
+		s.stale = {'layers', 'sowing', 'kc'}
+		s.stale_et0 = set(range(psmm.simulation_length))
+
+
+	def __getattr__(s, name):
+		if name == 'psmm':
+			raise AttributeError(name)
+		return getattr(s.psmm, name)
+
+
+	def set_field(s, field=None, **field_kwargs):
+		"""Changes the field, to a <Field> or to one made from <field_kwargs> (as for <Field>)"""
+
+		p = s.psmm
+		p.field = field or Field(**field_kwargs, num_daily_phases=1 if p.step_unit == 'DAY' else 24)
+		s.stale.add('layers')
+
+
+	def set_crop(s, crop):
+
+		s.psmm.crop = Crop(crop) if isinstance(crop, str) else crop
+		s.stale.update(['layers', 'sowing', 'kc'])
+
+
+	def set_sowing_date_offset(s, sowing_date_offset):
+		"""Changes the sowing_date_offset (to be detected as for <PocraSMModelSimulation>, if None)"""
+
+		s.given_sowing_date_offset = sowing_date_offset
+		s.stale.add('sowing')
+
+
+	def set_weather(s, i, **params):
+		"""Changes weather-parameters (e.g. rain) of the i-th time-step"""
+
+		w = s.psmm.weathers[i]
+		given_r_a, given_et0 = s.given_r_a_et0[i]
+		for param, value in params.items():
+			setattr(w, param, value)
+		if 'rain' in params:
+			s.num_valid_steps = min(s.num_valid_steps, i)
+			if s.given_sowing_date_offset is None:
+				s.stale.add('sowing')
+		if set(params) - {'rain'}:
+			s.given_r_a_et0[i] = (given_r_a or 'r_a' in params, given_et0 or 'et0' in params)
+			s.stale_et0.add(i)
+
+
+	def reset_et0(s):
+		"""Unsets the (derived) r_a and et0 of the time-steps whose weather changed, to be recomputed"""
+
+		for i in s.stale_et0:
+			w = s.psmm.weathers[i]
+			given_r_a, given_et0 = s.given_r_a_et0[i]
+			w.r_a = w.r_a if given_r_a else None
+			w.et0 = w.et0 if given_et0 else None
+
+
+	def update_pet(s):
+		"""Recomputes the pet of the time-steps whose kc or et0 may have changed, returning the first changed time-step"""
+
+		p = s.psmm
+		n = p.simulation_length
+		if s.given_pet is not None:
+			pet = s.given_pet
+		else:
+			s.reset_et0()
+			steps = range(n) if 'kc' in s.stale else sorted(s.stale_et0)
+			pet = list(s.pet_timeline) if s.pet_timeline is not None else [None]*n
+			for i in steps:
+				pet[i] = p.get_pet_of_step(i)
+
+		first_changed = n
+		if s.pet_timeline is None:
+			first_changed = 0
+		else:
+			for i in range(n):
+				if not _identical(pet[i], s.pet_timeline[i]):
+					first_changed = i
+					break
+		s.pet_timeline = pet
+		s.stale.discard('kc')
+		s.stale_et0 = set()
+		return first_changed
+
+
+	def run(s):
+		"""Recomputes what the changes since the last run affect, returning the time-step the water-balance was resumed from"""
+
+		p = s.psmm
+		n = p.simulation_length
+		resume = s.num_valid_steps
+
+		if 'layers' in s.stale:
+			p.set_layer_thicknesses()
+			resume = 0
+			s.stale.discard('layers')
+
+		if 'sowing' in s.stale:
+			p.pet = s.given_pet
+			sowing_date_offset = s.given_sowing_date_offset
+			if sowing_date_offset is None:
+				sowing_date_offset = p.detect_sowing_date_offset()
+			if sowing_date_offset != p.sowing_date_offset:
+				p.sowing_date_offset = sowing_date_offset
+				s.stale.add('kc')
+			s.stale.discard('sowing')
+
+		if 'kc' in s.stale or s.stale_et0:
+			if s.resumable:
+				resume = min(resume, s.update_pet())
+			else:
+				s.reset_et0()
+				s.stale.discard('kc')
+				s.stale_et0 = set()
+				resume = 0
+		if not s.resumable and resume < n:
+			resume = 0
+
+		if resume < n:
+			# (the state at the start, as <PocraSMModelSimulation> sets it, for a change of the field)
+			s.checkpoints[0] = s.given_model_state or {
+				'sm1_frac': p.field.wp, 'sm2_frac': p.field.wp, 'day_of_year': 152, 'hour_of_day': 1
+			}
+			start = max(k for k in s.checkpoints if k <= resume)
+			for k in [k for k in s.checkpoints if k > start]:
+				del s.checkpoints[k]
+			p.model_state = s.checkpoints[start]
+
+			rain = [w.rain for w in p.weathers]
+			if s.resumable:
+				p.iterate_water_balance(rain, s.pet_timeline, start, s.checkpoints, s.checkpoint_interval)
+			else:
+				p.pet = s.given_pet
+				p.computation_before_iteration()
+				p.iterate()
+			p.pet = [w.pet for w in p.waters]
+			p.computation_after_iteration()
+			p._direct_param_access = {}
+			resume = start
+
+		s.num_valid_steps = n
+		s.resumed_from_step = resume
+		return resume
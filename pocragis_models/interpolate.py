@@ -0,0 +1,231 @@
+"""
+This module interpolates the weather observed at rain-gauge (weather)
+stations onto the cells of a region, so that every cell can be simulated
+with weather of its own rather than with a single regional series.
+
+Two methods are supported:
+1. 'nearest': every cell takes the weather of its nearest station
+2. 'idw': every cell takes the inverse-distance-weighted mean of the weather
+	of its <num_neighbours> nearest stations
+
+The neighbours of the cells are found once, using a grid-based spatial index
+over the stations, and are stored as a pair of [cells x neighbours] matrices
+(station indices and weights). These are then reused for every weather
+variable and every year that is interpolated, each interpolation being
+a handful of vectorized multiply-adds over [cells x time-steps] matrices.
+
+Usage:
+>>> from pocragis_models.interpolate import WeatherInterpolation
+>>> wi = WeatherInterpolation(station_lats, station_lons, cell_lats, cell_lons)
+>>> cell_rain = wi.interpolate(station_rain) # [stations x steps] -> [cells x steps]
+>>> psmm = PocraSMModelSimulation(
+>>> 	..., weathers=wi.weathers_for_cell(j, {'rain': station_rain, ...}), ...
+>>> )
+"""
+
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_IN_KM = 6371.0
+
+
+
+class StationIndex:
+	"""
+	Grid-based spatial index over the locations of weather stations,
+	answering k-nearest-station queries for many points at once.
+
+	Locations are projected (in km) on an equirectangular plane centred at
+	the mean latitude of the stations, which is accurate enough at the
+	scale of a district or a basin. Stations are bucketed into square grid
+	buckets of side <bucket_size> km; a query point only looks at stations
+	in the buckets around its own bucket.
+	"""
+
+	def __init__(s, latitudes, longitudes, bucket_size=None):
+
+		s.latitudes = np.asarray(latitudes, dtype=float)
+		s.longitudes = np.asarray(longitudes, dtype=float)
+		s.num_stations = len(s.latitudes)
+		if s.num_stations == 0:
+			raise ValueError('At least one station is required')
+
+		s.cos_of_mean_latitude = math.cos(math.radians(s.latitudes.mean()))
+		s.x, s.y = s.project(s.latitudes, s.longitudes)
+
+		s.x_min, s.y_min = s.x.min(), s.y.min()
+		extent = max(s.x.max() - s.x_min, s.y.max() - s.y_min)
+		# by default, aim at about one station per bucket
+		# (or a single bucket of 1 km, for a single location)
+		s.bucket_size = bucket_size or (extent / math.sqrt(s.num_stations) if extent > 0 else 1.0)
+		# (from the stations' own buckets, so that the farthest station has a bucket,
+		# even when the extent is an exact multiple of the bucket_size)
+		bucket_x, bucket_y = s.get_buckets(s.x, s.y)
+		s.nx = int(bucket_x.max()) + 1
+		s.ny = int(bucket_y.max()) + 1
+
+		# stations sorted by bucket-id (= by*nx + bx), with start offsets per bucket
+		bucket_ids = bucket_y * s.nx + bucket_x
+		s.order = np.argsort(bucket_ids, kind='stable')
+		counts = np.bincount(bucket_ids, minlength=s.nx*s.ny)
+		s.bucket_start = np.concatenate(([0], np.cumsum(counts)))
+		# summed-area table of station counts, for O(1) counts over windows of buckets
+		s.count_table = np.zeros((s.ny+1, s.nx+1), dtype=np.int64)
+		s.count_table[1:, 1:] = counts.reshape(s.ny, s.nx).cumsum(0).cumsum(1)
+
+
+	def project(s, latitudes, longitudes):
+		x = EARTH_RADIUS_IN_KM * np.radians(np.asarray(longitudes, dtype=float)) * s.cos_of_mean_latitude
+		y = EARTH_RADIUS_IN_KM * np.radians(np.asarray(latitudes, dtype=float))
+		return x, y
+
+
+	def get_buckets(s, x, y):
+		return (
+			np.floor((x - s.x_min) / s.bucket_size).astype(np.int64),
+			np.floor((y - s.y_min) / s.bucket_size).astype(np.int64)
+		)
+
+
+	def count_in_window(s, bx, by, r):
+		"""Number of stations in buckets within <r> buckets (in each axis) of bucket (bx, by)"""
+		x0, x1 = min(max(bx-r, 0), s.nx), min(max(bx+r+1, 0), s.nx)
+		y0, y1 = min(max(by-r, 0), s.ny), min(max(by+r+1, 0), s.ny)
+		t = s.count_table
+		return t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0]
+
+
+	def stations_in_window(s, bx, by, r):
+		x0, x1 = max(bx-r, 0), min(bx+r+1, s.nx)
+		y0, y1 = max(by-r, 0), min(by+r+1, s.ny)
+		if x0 >= x1 or y0 >= y1:
+			return np.empty(0, dtype=np.int64)
+		return np.concatenate([
+			s.order[s.bucket_start[row*s.nx + x0] : s.bucket_start[row*s.nx + x1]]
+				for row in range(y0, y1)
+		])
+
+
+	def query(s, latitudes, longitudes, k=1):
+		"""
+		Returns two [points x k] matrices: the distances (in km) to the <k> nearest
+		stations of every point and the indices of those stations,
+		both ordered from the nearest to the farthest.
+		"""
+
+		k = min(k, s.num_stations)
+		x, y = s.project(latitudes, longitudes)
+		x, y = np.atleast_1d(x), np.atleast_1d(y)
+		distances = np.empty((len(x), k))
+		indices = np.empty((len(x), k), dtype=np.int64)
+
+		bucket_x, bucket_y = s.get_buckets(x, y)
+		query_buckets, inverse = np.unique(
+			np.stack((bucket_x, bucket_y), axis=1), axis=0, return_inverse=True
+		)
+		points_by_bucket = np.argsort(inverse.ravel(), kind='stable')
+		bucket_bounds = np.concatenate(([0], np.cumsum(np.bincount(inverse.ravel()))))
+
+		for b, (bx, by) in enumerate(query_buckets):
+			points = points_by_bucket[bucket_bounds[b]:bucket_bounds[b+1]]
+			# grow the window till it holds k stations; then every one of the
+			# k nearest stations of any point in this bucket is certainly
+			# within the wider window of <reach> buckets
+			# (starting from the first window that reaches the grid, for points outside it)
+			r = max(0, -bx, bx - (s.nx-1), -by, by - (s.ny-1))
+			while s.count_in_window(bx, by, r) < k:
+				r += 1
+			reach = math.ceil((r+1) * math.sqrt(2))
+			candidates = s.stations_in_window(bx, by, reach)
+
+			d = np.hypot(
+				x[points, None] - s.x[None, candidates],
+				y[points, None] - s.y[None, candidates]
+			)
+			if len(candidates) > k:
+				nearest = np.argpartition(d, k-1, axis=1)[:, :k]
+				d = np.take_along_axis(d, nearest, axis=1)
+			else:
+				nearest = np.broadcast_to(np.arange(len(candidates)), d.shape)
+			by_distance = np.argsort(d, axis=1, kind='stable')
+			distances[points] = np.take_along_axis(d, by_distance, axis=1)
+			indices[points] = candidates[np.take_along_axis(nearest, by_distance, axis=1)]
+
+		return distances, indices
+
+
+
+class WeatherInterpolation:
+	"""
+	Interpolates station weather onto cells.
+	The neighbouring stations of each cell and their weights are determined
+	once (in the constructor) and reused for all variables and years.
+	"""
+
+	def __init__(s,
+		station_latitudes, station_longitudes, cell_latitudes, cell_longitudes,
+		method='idw', num_neighbours=4, power=2, bucket_size=None
+	):
+
+		if method not in ['nearest', 'idw']:
+			raise ValueError(f'Unknown interpolation method: {method}')
+
+		s.method = method
+		s.station_index = StationIndex(station_latitudes, station_longitudes, bucket_size)
+		s.cell_latitudes = np.atleast_1d(np.asarray(cell_latitudes, dtype=float))
+		s.cell_longitudes = np.atleast_1d(np.asarray(cell_longitudes, dtype=float))
+		s.num_cells = len(s.cell_latitudes)
+
+		distances, s.neighbours = s.station_index.query(
+			s.cell_latitudes, s.cell_longitudes, 1 if method == 'nearest' else num_neighbours
+		)
+		if method == 'nearest':
+			s.weights = np.ones(distances.shape)
+		else:
+			at_station = distances[:, 0] == 0
+			with np.errstate(divide='ignore'):
+				inverse_distances = 1 / distances**power
+			# a cell lying exactly on a station takes that station's weather
+			inverse_distances[at_station] = 0
+			inverse_distances[at_station, 0] = 1
+			s.weights = inverse_distances / inverse_distances.sum(axis=1, keepdims=True)
+
+
+	def interpolate(s, station_values, out=None):
+		"""
+		<station_values> is an array whose first axis runs over stations,
+		e.g. [stations x time-steps]. Returns the corresponding array over cells,
+		e.g. [cells x time-steps], written into <out> if it is given.
+		"""
+
+		station_values = np.asarray(station_values, dtype=float)
+		weights_shape = s.weights.shape[:1] + (1,) * (station_values.ndim-1)
+		if out is None:
+			out = np.empty((s.num_cells,) + station_values.shape[1:])
+		np.multiply(s.weights[:, 0].reshape(weights_shape), station_values[s.neighbours[:, 0]], out=out)
+		for j in range(1, s.neighbours.shape[1]):
+			out += s.weights[:, j].reshape(weights_shape) * station_values[s.neighbours[:, j]]
+		return out
+
+
+	def interpolate_weathers(s, station_weathers):
+		"""
+		<station_weathers> is a <dict> of weather-parameters (as named in <Weather>)
+		to [stations x time-steps] arrays. Returns the <dict> of [cells x time-steps] arrays.
+		"""
+		return {param: s.interpolate(values) for param, values in station_weathers.items()}
+
+
+	def weathers_for_cell(s, cell, station_weathers):
+		"""
+		Returns the weather of a single cell in the form of a <dict> of <list>s
+		that <PocraSMModelSimulation> accepts as its <weathers>.
+		"""
+		return {
+			param: np.tensordot(
+				s.weights[cell], np.asarray(values, dtype=float)[s.neighbours[cell]], axes=1
+			).tolist()
+				for param, values in station_weathers.items()
+		}
@@ -1,6 +1,8 @@
 
 DEFAULT_AVAIL_SM = 0
 DEFAULT_SOWING_THRESHOLD = 50
+DEFAULT_RABI_SEASON_LENGTH = 120
+DEFAULT_ADAPTIVE_RAIN_THRESHOLD = 5
 
 ########	Lookup Dictionaries Start	########
 
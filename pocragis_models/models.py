@@ -46,6 +46,7 @@ See this class' documentation to know its API.
 """
 
 import math
+from collections import namedtuple
 
 from . import lookups
 
@@ -60,34 +61,42 @@ class Field:
 	3. Terrain slope
 	which are assumed to be static for the purpose of
 	PoCRA's soil-moisture model.
+
+	The soil properties (wp, fc, sat, ksat), curve-number and soil-depth
+	are looked up from the soil-texture, lulc-type and soil-depth-category,
+	unless they are given directly, in which case the given values are used.
 	"""
-	
-	def __init__(s, soil_texture, soil_depth_category, lulc_type, slope, num_daily_phases):
+
+	def __init__(s, soil_texture=None, soil_depth_category=None, lulc_type=None, slope=None, num_daily_phases=1,
+		wp=None, fc=None, sat=None, ksat=None, cn_val=None, soil_depth=None
+	):
 		"""
 		Set basic field properties
 		Set derived field parameters required in the model
 		"""
 
-		s.soil_texture = soil_texture.lower()
-		s.soil_depth_category = soil_depth_category.lower()
-		s.lulc_type = lulc_type.lower()
+		s.soil_texture = soil_texture.lower() if soil_texture is not None else None
+		s.soil_depth_category = soil_depth_category.lower() if soil_depth_category is not None else None
+		s.lulc_type = lulc_type.lower() if lulc_type is not None else None
 		s.slope = slope
 
 
 		#### Set parameters actually required in soil-moisture model. ####
-		
-		# Derived from lookups
-		soil_texture_properties = lookups.dict_soil_properties[s.soil_texture]
-		s.wp = soil_texture_properties['wp']
-		s.fc = soil_texture_properties['fc']
-		s.sat = soil_texture_properties['sat']
-		s.ksat = soil_texture_properties['ksat']
-		
-		s.cn_val = lookups.dict_lulc_hsg_curveno[
+
+		# Derived from lookups, unless given
+		soil_texture_properties = lookups.dict_soil_properties.get(s.soil_texture, {})
+		s.wp = wp if wp is not None else soil_texture_properties['wp']
+		s.fc = fc if fc is not None else soil_texture_properties['fc']
+		s.sat = sat if sat is not None else soil_texture_properties['sat']
+		s.ksat = ksat if ksat is not None else soil_texture_properties['ksat']
+
+		s.cn_val = cn_val if cn_val is not None else lookups.dict_lulc_hsg_curveno[
 			lookups.dict_lulc[s.lulc_type]
 		][soil_texture_properties['hsg']]
-		
-		s.soil_depth = lookups.dict_soil_depth_category_to_value[s.soil_depth_category]
+
+		s.soil_depth = (soil_depth if soil_depth is not None
+			else lookups.dict_soil_depth_category_to_value[s.soil_depth_category]
+		)
 
 		# Derived by calculation
 		field_setup = Field.pocra_sm_model_field_setup(
@@ -318,6 +327,9 @@ class Water:
 	that simulates PoCRA's soil-moisture model for a single daily time-step.
 	"""
 
+	# names of the water-components, in the order of the constructor's parameters
+	components = ('pri_runoff', 'infil', 'aet', 'sec_runoff', 'gw_rech', 'avail_sm', 'pet')
+
 	def __init__(self,
 		pri_runoff=None, infil=None, aet=None, sec_runoff=None,
 		gw_rech=None, avail_sm=None, pet=None
@@ -470,6 +482,39 @@ class Drainage:
 				s.potential_evaporation = potential_evaporation
 
 
+			def __setattr__(s, name, value):
+				# (a change of any value makes the compiled record stale)
+				super().__setattr__(name, value)
+				s.__dict__.pop('_compiled', None)
+
+
+			@property
+			def compiled(s):
+				"""The compiled record (see <compile>) of the channel's current values, recompiled after any change"""
+				if '_compiled' not in s.__dict__:
+					s.__dict__['_compiled'] = s.compile()
+				return s.__dict__['_compiled']
+
+
+			Compiled = namedtuple('Compiled', [
+				'watershed_area', 'length', 'width_bottom', 'fraction_deep_aquifer', 'zch', 'mannigs',
+				'half_width_bottom_zch', 'half_width_bottom_zch_squared', 'sqrt_one_plus_zch_squared',
+				'sqrt_channel_slope', 'bank_flow_return_fraction', 'conductivity_per_length',
+				'evaporation_per_width'
+			])
+			Compiled.__qualname__ = 'Drainage.Stream.Channel.Compiled' # (for pickling)
+
+
+			def compile(s):
+				"""Frozen record of the channel's values, with the per-step constants derived from them"""
+				return Drainage.Stream.Channel.Compiled(
+					s.watershed_area, s.length, s.width_bottom, s.fraction_deep_aquifer, s.zch, s.mannigs,
+					s.width_bottom/2 * s.zch, (s.width_bottom/2 * s.zch)**2, math.sqrt(1 + s.zch**2),
+					s.channel_slope**(1/2), 1 - math.exp(-s.bank_flow_recession), s.hydraulic_conductivity * s.length,
+					s.evaporation_coefficient * s.potential_evaporation * s.length
+				)
+
+
 		class Transient:
 			"""Holds dynamic properties (i.e. which change over time)"""
 
@@ -515,6 +560,8 @@ class Drainage:
 		def __init__(s, channel, transients=None):
 			s.channel = channel
 			s.transients = transients or []
+			# transients of the stream when inactive (no runoff, storage or inflow), by the zeros' reprs
+			s.zero_transients = {}
 
 
 		@staticmethod
@@ -527,23 +574,43 @@ class Drainage:
 			time_step_duration,
 		):
 
-			swat_runoff = runoff_per_area_in_watershed * watershed_area # * 10 ??
+			return Drainage.Stream.run_compiled_stream_model_for_time_step(
+				runoff_per_area_in_watershed, storage_prev_timestep, volume_in,
+				Drainage.Stream.Channel(
+					watershed_area, length, width_bottom, channel_slope, fraction_deep_aquifer,
+					zch, hydraulic_conductivity, evaporation_coefficient,
+					mannigs, bank_flow_recession, potential_evaporation
+				).compile(),
+				time_step_duration
+			)
+
+
+		@staticmethod
+		def run_compiled_stream_model_for_time_step(
+			runoff_per_area_in_watershed, storage_prev_timestep, volume_in,
+			c, time_step_duration
+		):
+			"""<run_stream_model_for_time_step> with the channel's values given by its compiled record <c>"""
+
+			swat_runoff = runoff_per_area_in_watershed * c.watershed_area # * 10 ??
 
 			total_volume_stored = swat_runoff + storage_prev_timestep + volume_in
 
-			cross_section = total_volume_stored / length *1000
+			cross_section = total_volume_stored / c.length *1000
 
-			depth_water_level = math.sqrt((cross_section / zch) + (width_bottom/2 * zch)**2) - width_bottom/2 * zch
+			depth_water_level = math.sqrt((cross_section / c.zch) + c.half_width_bottom_zch_squared) - c.half_width_bottom_zch
 
-			width_water_level = width_bottom + 2 * zch * depth_water_level
+			width_water_level = c.width_bottom + 2 * c.zch * depth_water_level
 
-			wetted_perimeter = width_bottom + 2 * depth_water_level * math.sqrt(1 + zch**2)
+			wetted_perimeter = c.width_bottom + 2 * depth_water_level * c.sqrt_one_plus_zch_squared
 
 			hydraulic_radius = cross_section / wetted_perimeter
 
-			discharge = cross_section * (hydraulic_radius**(2/3)) * (channel_slope**(1/2)) / mannigs
+			hydraulic_radius_power = hydraulic_radius**(2/3)
+
+			discharge = cross_section * hydraulic_radius_power * c.sqrt_channel_slope / c.mannigs
 
-			velocity = (hydraulic_radius**(2/3)) * (channel_slope**(1/2)) / mannigs
+			velocity = hydraulic_radius_power * c.sqrt_channel_slope / c.mannigs
 
 			if discharge > 0:
 				travel_time = total_volume_stored / discharge
@@ -553,17 +620,17 @@ class Drainage:
 			storage_coeffecient = min(    (2 * time_step_duration) / (2*travel_time + time_step_duration)    ,    1    )
 
 			transmission_loss = min(
-				hydraulic_conductivity * length * wetted_perimeter * (travel_time/3600),
+				c.conductivity_per_length * wetted_perimeter * (travel_time/3600),
 				total_volume_stored
 			)
 
-			bankin = transmission_loss * ( 1- fraction_deep_aquifer )
+			bankin = transmission_loss * ( 1- c.fraction_deep_aquifer )
 
-			return_flow_from_bank = bankin * ( 1 - math.exp( -bank_flow_recession))
+			return_flow_from_bank = bankin * c.bank_flow_return_fraction
 
 			fraction_time_step = min(    travel_time / time_step_duration  ,  1    )
 
-			evaporation_loss = evaporation_coefficient * potential_evaporation * length * width_water_level * fraction_time_step
+			evaporation_loss = c.evaporation_per_width * width_water_level * fraction_time_step
 
 			total_loss = transmission_loss + evaporation_loss
 
@@ -594,26 +661,67 @@ class Drainage:
 	
 	def __init__(s, connected_streams):
 		s.connected_streams = connected_streams
+		for cs in connected_streams:
+			cs.compiled_channel = cs.channel.compiled
 
 
 	def compute_drainage_model_transients_for_latest_time_step(s):
 		
 		for cs in s.connected_streams:
+			# (after a change of the channel, or of a value of it, its transients when inactive change too)
+			if cs.channel.compiled is not cs.compiled_channel:
+				cs.compiled_channel = cs.channel.compiled
+				cs.zero_transients = {}
 			volume_in = sum(css.transients[-1].volume_out for css in cs.sources)
-			
-			ch = cs.channel
+			runoff_per_area_in_watershed = cs.next_runoff_per_area_in_watershed
+			storage_prev_timestep = cs.transients[-1].volume_stored_end_timestep
+
+			# the transient of an inactive stream (without runoff, storage or inflow)
+			# depends on its channel alone; so it is computed once and then shared
+			if runoff_per_area_in_watershed == 0 and storage_prev_timestep == 0 and volume_in == 0:
+				key = (repr(runoff_per_area_in_watershed), repr(storage_prev_timestep), repr(volume_in))
+				if key in cs.zero_transients:
+					cs.new_transient = cs.zero_transients[key]
+					continue
+			else:
+				key = None
 
-			cs.new_transient = Drainage.Stream.run_stream_model_for_time_step (
-				
-				cs.next_runoff_per_area_in_watershed, ch.watershed_area,
-				cs.transients[-1].volume_stored_end_timestep, volume_in,
-				
-				ch.length, ch.width_bottom,	ch.channel_slope, ch.fraction_deep_aquifer,
-				ch.zch, ch.hydraulic_conductivity, ch.evaporation_coefficient,
-				ch.mannigs, ch.bank_flow_recession, ch.potential_evaporation,
-				
-				Drainage.Time_step_duration
+			cs.new_transient = Drainage.Stream.run_compiled_stream_model_for_time_step(
+				runoff_per_area_in_watershed, storage_prev_timestep, volume_in,
+				cs.compiled_channel, Drainage.Time_step_duration
 			)
+			if key is not None:
+				cs.zero_transients[key] = cs.new_transient
 
 		for cs in s.connected_streams:
 			cs.transients.append(cs.new_transient)
+
+
+	def step(s, runoffs_per_area_in_watershed):
+		"""Computes a time-step's transients, given the streams' runoff (in the order of <connected_streams>)"""
+
+		for cs, runoff_per_area_in_watershed in zip(s.connected_streams, runoffs_per_area_in_watershed):
+			cs.next_runoff_per_area_in_watershed = runoff_per_area_in_watershed
+		s.compute_drainage_model_transients_for_latest_time_step()
+
+
+	def run(s, runoffs, sink=None, keep_transients=True):
+		"""
+		Computes the transients of the time-steps of <runoffs>: a [streams x steps] array
+		(a numpy-array or a <list> of <list>s) of runoff_per_area_in_watershed,
+		or an iterator of such arrays of consecutive time-steps (chunks).
+		Every time-step's transients are written to the <sink>, if any
+		(see <drainage_io>); unless <keep_transients>, the streams keep
+		only their latest transient (all the model needs).
+		"""
+
+		chunks = runoffs if iter(runoffs) is runoffs else [runoffs]
+		for chunk in chunks:
+			num_steps = chunk.shape[1] if hasattr(chunk, 'shape') else len(chunk[0]) if len(chunk) > 0 else 0
+			for i in range(num_steps):
+				s.step(chunk[:, i].tolist() if hasattr(chunk, 'shape') else [r[i] for r in chunk])
+				if sink is not None:
+					sink.write([cs.transients[-1] for cs in s.connected_streams])
+				if not keep_transients:
+					for cs in s.connected_streams:
+						del cs.transients[:-1]
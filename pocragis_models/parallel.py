@@ -0,0 +1,306 @@
+"""
+This module runs <PocraSMModelSimulation>s of many cells in a pool of
+worker processes without pickling their weather for every task.
+
+The weather and field-parameter arrays of all the cells (and the arrays
+receiving the results) are placed once in named shared-memory blocks
+(or memory-mapped files). Every worker attaches to them by name when it
+starts, viewing them zero-copy as numpy arrays, and is then sent only
+ranges of cell-indices as tasks.
+
+Usage:
+>>> from pocragis_models.parallel import ParallelPocraSMModelSimulation
+>>> ppsmm = ParallelPocraSMModelSimulation(
+>>> 	cell_arrays={'wp': ..., 'fc': ..., 'sat': ..., 'ksat': ..., 'cn_val': ..., 'soil_depth': ..., 'slope': ...},
+>>> 	weathers={'rain': <[cells x steps] array>, 'et0': <[cells x steps] or [steps] array>},
+>>> 	crop='soyabean', step_unit='DAY'
+>>> )
+>>> ppsmm.run()
+>>> aet = ppsmm.results['aet'] # [cells x steps] array
+"""
+
+import os
+import time
+import uuid
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .models import Field, Water
+from .simulate import PocraSMModelSimulation
+from .store import ResultStore
+
+
+
+class SharedArrays:
+	"""
+	A set of named numpy arrays backed by shared memory or,
+	if a <directory> is given, by memory-mapped files in that directory.
+
+	The <spec> of a <SharedArrays> is a small picklable <dict> from which
+	any other process can <attach> to the same arrays without copying them.
+	The process that created the arrays should <unlink> them when done.
+	"""
+
+	def __init__(s, spec, arrays, blocks=None):
+		s.spec = spec
+		s.arrays = arrays
+		s.blocks = blocks or []
+
+
+	@staticmethod
+	def create(arrays, directory=None):
+		"""
+		<arrays> maps names to either numpy arrays (which are copied in)
+		or to (shape, dtype) pairs (which are allocated zero-filled).
+		"""
+
+		spec = {}; views = {}; blocks = []
+		prefix = uuid.uuid4().hex[:12]
+		for name, a in arrays.items():
+			if isinstance(a, tuple):
+				shape, dtype = a
+				a = None
+			else:
+				a = np.asarray(a)
+				shape, dtype = a.shape, a.dtype
+			dtype = np.dtype(dtype)
+			size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+
+			if directory is None:
+				block = shared_memory.SharedMemory(create=True, size=size)
+				blocks.append(block)
+				view = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+				if a is None:
+					view.fill(0)
+				spec[name] = ('shm', block.name, shape, dtype.str)
+			else:
+				path = os.path.join(directory, f'{prefix}_{name}.npy')
+				view = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+				spec[name] = ('file', path, shape, dtype.str)
+			if a is not None:
+				view[...] = a
+			views[name] = view
+
+		return SharedArrays(spec, views, blocks)
+
+
+	@staticmethod
+	def attach(spec):
+
+		views = {}; blocks = []
+		for name, (kind, location, shape, dtype) in spec.items():
+			if kind == 'shm':
+				try:
+					block = shared_memory.SharedMemory(name=location, track=False)
+				except TypeError:
+					# python < 3.13 always tracks the block, but with the resource-tracker
+					# of the creating process, which is shared by its pool's workers
+					block = shared_memory.SharedMemory(name=location)
+				blocks.append(block)
+				views[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+			else:
+				views[name] = np.load(location, mmap_mode='r+')
+
+		return SharedArrays(spec, views, blocks)
+
+
+	def __getitem__(s, name):
+		return s.arrays[name]
+
+
+	def __contains__(s, name):
+		return name in s.arrays
+
+
+	def keys(s):
+		return s.arrays.keys()
+
+
+	def close(s):
+		s.arrays = {}
+		for block in s.blocks:
+			block.close()
+
+
+	def unlink(s):
+		paths = [location for kind, location, _, _ in s.spec.values() if kind == 'file']
+		blocks = s.blocks
+		s.close()
+		for block in blocks:
+			block.unlink()
+		for path in paths:
+			os.remove(path)
+
+
+
+# state of a worker process, set once by <_attach_worker>
+_worker = {}
+
+
+def _attach_worker(cell_arrays_spec, weathers_spec, results_spec, crop, step_unit, simulation_kwargs, store_directory=None):
+	_worker['cell_arrays'] = SharedArrays.attach(cell_arrays_spec)
+	_worker['weathers'] = SharedArrays.attach(weathers_spec)
+	_worker['results'] = SharedArrays.attach(results_spec) if store_directory is None else None
+	_worker['store'] = ResultStore(store_directory, mode='r+') if store_directory is not None else None
+	_worker['crop'] = crop
+	_worker['step_unit'] = step_unit
+	_worker['simulation_kwargs'] = simulation_kwargs
+
+
+def _run_cells(cell_range):
+
+	ca, wthrs, results, store = _worker['cell_arrays'], _worker['weathers'], _worker['results'], _worker['store']
+	step_unit = _worker['step_unit']
+	if store is not None:
+		num_steps = max(wthrs[p].shape[-1] for p in wthrs.keys())
+		results = {c: np.empty((cell_range[1] - cell_range[0], num_steps)) for c in store.components}
+
+	start_time = time.perf_counter()
+	failures = []
+	failed = np.zeros(cell_range[1] - cell_range[0], dtype=bool)
+	for cell in range(*cell_range):
+		row = cell - cell_range[0] if store is not None else cell
+		try:
+			psmm = PocraSMModelSimulation(
+				field=Field(
+					slope=float(ca['slope'][cell]), num_daily_phases=1 if step_unit=='DAY' else 24,
+					**{p: float(ca[p][cell]) for p in ['wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth']}
+				),
+				step_unit=step_unit,
+				weathers={
+					param: (wthrs[param][cell] if wthrs[param].ndim == 2 else wthrs[param]).tolist()
+						for param in wthrs.keys()
+				},
+				**{p: float(ca[p][cell]) for p in ['latitude', 'longitude', 'elevation'] if p in ca},
+				crop=_worker['crop'][int(ca['crop_index'][cell])] if 'crop_index' in ca else _worker['crop'],
+				**_worker['simulation_kwargs']
+			)
+			psmm.run()
+		except Exception as e:
+			# a failed cell is skipped (with nan results), and reported with its inputs
+			failures.append((
+				int(ca['cell_id'][cell]) if 'cell_id' in ca else cell,
+				{p: ca[p][cell].item() for p in ca.keys()}, repr(e)
+			))
+			failed[cell - cell_range[0]] = True
+			for c in results.keys():
+				results[c][row] = np.nan
+			continue
+		for c in results.keys():
+			results[c][row] = getattr(psmm, c)
+
+	if store is not None:
+		cells = np.arange(*cell_range)
+		store.write_cells(ca['cell_id'][cells] if 'cell_id' in ca else cells, results, written=~failed)
+	return cell_range, os.getpid(), time.perf_counter() - start_time, failures
+
+
+
+class ParallelPocraSMModelSimulation:
+	"""
+	Simulates PoCRA's soil-moisture model for many cells in a pool of processes.
+
+	<cell_arrays> holds per-cell arrays of the field parameters
+	'wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth' and 'slope',
+	and optionally of 'latitude', 'longitude', 'elevation', 'crop_index' and 'cell_id'.
+	If 'crop_index' is given, <crop> should be the <list> of crops it indexes into;
+	otherwise <crop> is the single crop of all cells.
+	<weathers> holds, per weather-parameter, a [cells x steps] array
+	or a [steps] array shared by all the cells.
+	Either of them can be a <SharedArrays> already, in which case it is used as is;
+	otherwise the arrays are copied into shared memory for the duration of <run>.
+	With a <store> (a <store.ResultStore> opened for writing), the workers write the
+	results of their cells into it, under their 'cell_id's (or indices), rather
+	than into <results>; the store's components are then the ones simulated.
+
+	Cells whose simulation fails are skipped (their results are nan) and recorded
+	in <failed_cells>, as (cell_id or index, inputs, error).
+	With a <telemetry.Telemetry>, the run reports its progress to it: the cells done,
+	the cells per second (overall and per worker process), the step throughput
+	(cell-steps per second), the queue depth (tasks not yet done), and the failed cells.
+
+	Any other keyword-arguments are passed on to every <PocraSMModelSimulation>.
+	"""
+
+	def __init__(s,
+		cell_arrays, weathers, crop, step_unit='DAY',
+		num_workers=None, cells_per_task=64, components=Water.components, directory=None, store=None,
+		telemetry=None,
+		**simulation_kwargs
+	):
+		s.cell_arrays = cell_arrays
+		s.weathers = weathers
+		s.crop = crop
+		s.step_unit = step_unit
+		s.num_workers = num_workers or os.cpu_count()
+		s.cells_per_task = cells_per_task
+		s.components = list(components)
+		s.directory = directory
+		s.store = store
+		s.telemetry = telemetry
+		s.simulation_kwargs = simulation_kwargs
+		s.results = None
+		s.failed_cells = []
+
+
+	def run(s):
+
+		owned = []
+		def shared(arrays):
+			if isinstance(arrays, SharedArrays):
+				return arrays
+			owned.append(SharedArrays.create(arrays, s.directory))
+			return owned[-1]
+
+		try:
+			cell_arrays = shared(s.cell_arrays)
+			weathers = shared(s.weathers)
+			num_cells = len(cell_arrays['wp'])
+			num_steps = max(weathers[p].shape[-1] for p in weathers.keys())
+			results = shared({} if s.store else {c: ((num_cells, num_steps), float) for c in s.components})
+
+			tasks = [
+				(start, min(start + s.cells_per_task, num_cells))
+					for start in range(0, num_cells, s.cells_per_task)
+			]
+			with multiprocessing.Pool(
+				s.num_workers, initializer=_attach_worker, initargs=(
+					cell_arrays.spec, weathers.spec, results.spec,
+					s.crop, s.step_unit, s.simulation_kwargs, s.store and s.store.directory
+				)
+			) as pool:
+				s.failed_cells = []
+				if s.telemetry is not None:
+					s.telemetry.start(num_cells, num_steps, num_tasks=len(tasks), num_workers=s.num_workers)
+				cells_done = 0; worker_cells = {}; worker_time = {}
+				for k, (cell_range, pid, elapsed, failures) in enumerate(pool.imap_unordered(_run_cells, tasks)):
+					cells_done += cell_range[1] - cell_range[0]
+					s.failed_cells.extend(failures)
+					if s.telemetry is None:
+						continue
+					for cell, inputs, error in failures:
+						s.telemetry.failed(cell, inputs, error)
+					worker_cells[pid] = worker_cells.get(pid, 0) + cell_range[1] - cell_range[0]
+					worker_time[pid] = worker_time.get(pid, 0) + elapsed
+					run_time = time.time() - s.telemetry.start_time
+					s.telemetry.progress(
+						cells_done / num_cells, force=(k == len(tasks) - 1),
+						cells_done=cells_done, cells_per_second=cells_done / run_time,
+						cells_per_second_per_worker={p: worker_cells[p] / worker_time[p] for p in worker_cells},
+						step_throughput=cells_done * num_steps / run_time,
+						queue_depth=len(tasks) - k - 1, num_failed=len(s.failed_cells)
+					)
+				if s.telemetry is not None:
+					s.telemetry.end(cells_done=cells_done)
+
+			if s.store:
+				s.store.flush()
+			else:
+				s.results = {c: np.array(results[c]) for c in s.components}
+		finally:
+			for arrays in owned:
+				arrays.unlink()
+
+		return s.results
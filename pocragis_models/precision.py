@@ -0,0 +1,122 @@
+"""
+This module compares single-precision (float32) batch-simulation against
+double-precision (float64), to decide per component whether the halved
+memory and bandwidth of <BatchSimulation>'s float32 mode is acceptable.
+
+The comparison runs the reference runs: the hourly weathers of the
+test/*_example_output.csv files (one cell per file), simulated hourly and,
+aggregated to days, daily, for a few fields and crops. For every component
+it reports the maximum deviation of any time-step and the maximum deviation
+of a seasonal total (kharif: June-October, rabi: November-February,
+summer: March-May), absolute and relative to the float64 total
+(totals under 1 mm count as 1 mm, so that near-zero totals, e.g. of
+recharge in summer, do not inflate the relative deviation).
+
+Usage:
+$ python -m pocragis_models.precision
+>>> from pocragis_models.precision import compare_precision
+>>> report = compare_precision() # {(step_unit, component): {...}}
+"""
+
+import os
+import csv
+import glob
+import argparse
+
+import numpy as np
+
+from .models import Water
+from .batch import BatchSimulation
+
+
+REFERENCE_RUNS_PATTERN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', '*_example_output.csv')
+
+# (soil_texture, soil_depth_category, lulc_type, slope, crop) of the reference runs
+REFERENCE_FIELDS_AND_CROPS = [
+	('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3, 'soyabean'),
+	('sandy loam', 'shallow (10 to 25 cm)', 'kharif', 6, 'bajri'),
+	('loamy', 'moderately deep (25 to 50 cm)', 'kharif', 1, 'cotton'),
+]
+
+SEASONS = {'kharif': [6, 7, 8, 9, 10], 'rabi': [11, 12, 1, 2], 'summer': [3, 4, 5]}
+
+
+def read_reference_runs(pattern=REFERENCE_RUNS_PATTERN):
+	"""Returns the rain and et0 of the reference runs as [files x hours] arrays, and the month of every hour"""
+
+	rain = []; et0 = []; months = None
+	for path in sorted(glob.glob(pattern)):
+		with open(path, newline='') as f:
+			rows = list(csv.DictReader(f))
+		rain.append([float(r['rain']) for r in rows])
+		et0.append([float(r['et0']) for r in rows])
+		months = np.array([int(r['date-time'][5:7]) for r in rows])
+	return np.array(rain), np.array(et0), months
+
+
+def compare_precision(pattern=REFERENCE_RUNS_PATTERN, fields_and_crops=REFERENCE_FIELDS_AND_CROPS, dtype=np.float32):
+	"""
+	Returns, per (step_unit, component), the maximum absolute deviation of a time-step
+	('max_step_deviation') and of a seasonal total ('max_seasonal_total_deviation'),
+	and the latter relative to the float64 total ('max_seasonal_total_relative_deviation').
+	"""
+
+	hourly_rain, hourly_et0, hourly_months = read_reference_runs(pattern)
+	num_days = hourly_rain.shape[-1] // 24
+	daily = lambda a: a[..., :num_days*24].reshape(a.shape[:-1] + (num_days, 24)).sum(axis=-1)
+	runs = {
+		'HOUR': (hourly_rain, hourly_et0, hourly_months),
+		'DAY': (daily(hourly_rain), daily(hourly_et0), hourly_months[:num_days*24:24]),
+	}
+
+	report = {}
+	for step_unit, (rain, et0, months) in runs.items():
+		deviations = {c: {
+			'max_step_deviation': 0.0, 'max_seasonal_total_deviation': 0.0, 'max_seasonal_total_relative_deviation': 0.0
+		} for c in Water.components}
+		for soil_texture, soil_depth_category, lulc_type, slope, crop in fields_and_crops:
+			results = {}
+			for precision in [np.float64, dtype]:
+				bs = BatchSimulation(
+					soil_texture=soil_texture, soil_depth_category=soil_depth_category, lulc_type=lulc_type,
+					slope=slope, step_unit=step_unit, weathers={'rain': rain, 'et0': et0}, crop=crop,
+					dtype=precision
+				)
+				results[precision] = bs.run()
+
+			for c in Water.components:
+				double, single = results[np.float64][c], results[dtype][c].astype(np.float64)
+				d = deviations[c]
+				d['max_step_deviation'] = max(d['max_step_deviation'], float(np.abs(single - double).max()))
+				for season_months in SEASONS.values():
+					in_season = np.isin(months, season_months)
+					double_total, single_total = double[:, in_season].sum(axis=-1), single[:, in_season].sum(axis=-1)
+					deviation = np.abs(single_total - double_total)
+					d['max_seasonal_total_deviation'] = max(d['max_seasonal_total_deviation'], float(deviation.max()))
+					relative = deviation / np.maximum(np.abs(double_total), 1)
+					d['max_seasonal_total_relative_deviation'] = max(
+						d['max_seasonal_total_relative_deviation'], float(relative.max())
+					)
+		report.update({(step_unit, c): d for c, d in deviations.items()})
+
+	return report
+
+
+
+def main(argv=None):
+
+	parser = argparse.ArgumentParser(description='Report deviations of float32 batch-simulation from float64 on the reference runs')
+	parser.add_argument('--pattern', default=REFERENCE_RUNS_PATTERN, help='glob of the reference-run csv-files')
+	args = parser.parse_args(argv)
+
+	report = compare_precision(args.pattern)
+	print(f'{"step_unit":<10}{"component":<12}{"max step dev.":>16}{"max seasonal dev.":>20}{"relative":>12}')
+	for (step_unit, c), d in report.items():
+		print(
+			f'{step_unit:<10}{c:<12}{d["max_step_deviation"]:>16.3g}'
+			f'{d["max_seasonal_total_deviation"]:>20.3g}{d["max_seasonal_total_relative_deviation"]:>12.2e}'
+		)
+
+
+if __name__ == '__main__':
+	main()
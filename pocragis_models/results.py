@@ -0,0 +1,201 @@
+"""
+This module aggregates the results of a simulation over time, without copying them:
+hourly results by day, and any results by calendar-month or by stage of the crop.
+
+The results are the [cells x steps] (or [steps]) arrays of the water-components
+(of <BatchSimulation> or <PocraSMModelSimulation>), which stay as they are:
+1. hourly results, from 12am of the first day, are viewed as [cells x days x 24]
+	arrays by a reshape, so that a day's total is a sum over the last axis
+2. months are runs of consecutive time-steps (by day_of_year, or by date
+	if there is a start_date), so that each month's total is one slice
+	of a single <np.add.reduceat> over the time-steps
+3. crop-stages are the runs of constant kc of the crop's kc-curve, which
+	can differ from cell to cell (by sowing date or crop), so each stage's
+	total is a sum over the time-steps masked (by <where>) to the stage
+Fluxes are summed, and the states (avail_sm) are averaged.
+
+Usage:
+>>> bs.run()
+>>> bs.results['aet'] # [cells x steps] array, as before
+>>> bs.results.hourly_by_day('aet') # [cells x days x 24] view
+>>> bs.results.daily('aet') # [cells x days] array
+>>> months, monthly_aet = bs.results.monthly('aet') # [cells x len(months)] array
+>>> bs.results.by_crop_stage('aet') # [cells x len(bs.results.crop_stage_names)] array
+"""
+
+import numpy as np
+
+
+month_starts = np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30]) # day_of_year - 1, of a 365-day year
+
+
+def get_runs(labels):
+	"""Starts of the runs of equal consecutive <labels>, and their labels"""
+
+	labels = np.asarray(labels)
+	starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+	return starts, labels[starts]
+
+
+def reduce_runs(values, starts, how='sum'):
+	"""Totals (or means) of <values> over runs of time-steps (along the last axis) beginning at <starts>"""
+
+	totals = np.add.reduceat(values, starts, axis=-1)
+	if how == 'mean':
+		totals = totals / np.diff(np.append(starts, values.shape[-1]))
+	return totals
+
+
+def get_kc_stages(kc_table, kc_length):
+	"""
+	Stage (1, 2, ...) of every day of the [crops x days] kc-curves of <kc_table>:
+	the runs of constant kc. Also returns the largest number of stages of a crop.
+	"""
+
+	kc_table = np.asarray(kc_table).reshape(-1, np.shape(kc_table)[-1])
+	stages = np.ones(kc_table.shape, dtype=np.int16)
+	stages[:, 1:] += np.cumsum(kc_table[:, 1:] != kc_table[:, :-1], axis=-1, dtype=np.int16)
+	kc_length = np.asarray(kc_length).reshape(-1)
+	return stages, int(stages[np.arange(len(kc_length)), kc_length - 1].max())
+
+
+def get_crop_stage_labels(kc_table, kc_length, crop_index, day_of_crop_idx):
+	"""
+	Crop-stage of every time-step, from its <day_of_crop_idx> (by day of the rain-year,
+	minus sowing_date_offset) and <crop_index> in the [crops x days] <kc_table>:
+	0 before sowing, the kc-stage (see <get_kc_stages>) while the crop stands,
+	and one past the last stage after harvest. Also returns the number of stages.
+	"""
+
+	stages, num_stages = get_kc_stages(kc_table, kc_length)
+	day_of_crop_idx = np.asarray(day_of_crop_idx)
+	crop_index = np.asarray(crop_index)
+	crop_length = np.asarray(kc_length).reshape(-1)[crop_index]
+	return np.where(
+		day_of_crop_idx < 0, 0,
+		np.where(
+			day_of_crop_idx >= crop_length, num_stages + 1,
+			stages[crop_index, np.clip(day_of_crop_idx, 0, stages.shape[1] - 1)]
+		)
+	).astype(np.int16), num_stages
+
+
+
+class Results(dict):
+	"""
+	The results of a simulation, as a <dict> of [cells x steps] arrays of the components
+	(from <arrays>, of arrays or of lists), with their aggregations over time.
+
+	The time-steps are described by <step_unit>, <day_of_year>, <hour_of_day>
+	(for hourly steps) and, if the simulation follows the calendar, <start_date>.
+	<crop_stages> are the labels of the crop-stages of the time-steps
+	(see <get_crop_stage_labels>), [steps] or [cells x steps], and <num_crop_stages>
+	their number; <crop_stages> can also be a function returning both,
+	which is called only when they are first needed.
+	"""
+
+	means = ('avail_sm',)
+
+	def __init__(s, arrays, step_unit='DAY', day_of_year=None, hour_of_day=None, start_date=None,
+		crop_stages=None, num_crop_stages=None
+	):
+		super().__init__({c: np.asarray(values) for c, values in arrays.items()})
+		s.step_unit = step_unit
+		s.day_of_year = None if day_of_year is None else np.asarray(day_of_year)
+		s.hour_of_day = None if hour_of_day is None or step_unit == 'DAY' else np.asarray(hour_of_day)
+		s.start_date = start_date
+		s._crop_stages = crop_stages
+		s._num_crop_stages = num_crop_stages
+		s._months = None
+
+
+	def get_how(s, component, how):
+		return how or ('mean' if component in s.means else 'sum')
+
+
+	def hourly_by_day(s, component):
+		"""[cells x days x 24] view of the hourly results of <component> (of whole days only)"""
+
+		if s.hour_of_day is None:
+			raise ValueError(f'results of step_unit {s.step_unit!r} are not hourly')
+		if len(s.hour_of_day) and s.hour_of_day[0] != 1:
+			raise ValueError('hourly results should start at 12am to be viewed by day')
+		values = s[component]
+		num_days = values.shape[-1] // 24
+		return values[..., :num_days*24].reshape(values.shape[:-1] + (num_days, 24))
+
+
+	def daily(s, component, how=None):
+		"""[cells x days] totals (means for avail_sm, or by <how>: 'sum' or 'mean') of <component>"""
+
+		if s.hour_of_day is None:
+			return s[component]
+		by_day = s.hourly_by_day(component)
+		return by_day.mean(axis=-1) if s.get_how(component, how) == 'mean' else by_day.sum(axis=-1)
+
+
+	@property
+	def months(s):
+		"""Calendar-month (1 to 12) of every time-step"""
+
+		if s._months is None:
+			if s.start_date is not None:
+				num_steps = next(iter(s.values())).shape[-1] if s else 0
+				days = np.arange(num_steps) // (1 if s.hour_of_day is None else 24)
+				dates = np.datetime64(s.start_date, 'D') + days
+				s._months = (dates.astype('datetime64[M]').astype(int) % 12) + 1
+			elif s.day_of_year is not None:
+				s._months = np.searchsorted(month_starts, (s.day_of_year - 1) % 365, side='right')
+			else:
+				raise ValueError('results need a day_of_year or a start_date to be grouped by month')
+		return s._months
+
+
+	def monthly(s, component, how=None):
+		"""
+		Months (1 to 12) of the runs of time-steps in the same month, and the
+		[cells x months] totals (means for avail_sm, or by <how>) of <component> over them
+		"""
+
+		starts, months = get_runs(s.months)
+		return months, reduce_runs(s[component], starts, s.get_how(component, how))
+
+
+	@property
+	def crop_stages(s):
+
+		if callable(s._crop_stages):
+			s._crop_stages, s._num_crop_stages = s._crop_stages()
+		if s._crop_stages is None:
+			raise ValueError('results have no crop-stages')
+		return s._crop_stages
+
+
+	@property
+	def crop_stage_names(s):
+
+		s.crop_stages
+		return ['before sowing'] + [f'stage {k}' for k in range(1, s._num_crop_stages + 1)] + ['after harvest']
+
+
+	def by_crop_stage(s, component, how=None):
+		"""
+		[cells x crop-stages] totals (means for avail_sm, or by <how>) of <component>
+		over the time-steps in each crop-stage (of <crop_stage_names>), nan for a cell's
+		stages without time-steps
+		"""
+
+		values = s[component]
+		labels = s.crop_stages
+		names = s.crop_stage_names
+		how = s.get_how(component, how)
+
+		totals = np.empty(np.broadcast_shapes(values.shape, labels.shape)[:-1] + (len(names),), dtype=values.dtype)
+		for k in range(len(names)):
+			in_stage = labels == k
+			np.sum(values, axis=-1, where=in_stage, out=totals[..., k])
+			counts = in_stage.sum(axis=-1)
+			if how == 'mean':
+				np.divide(totals[..., k], counts, out=totals[..., k], where=counts > 0)
+			np.copyto(totals[..., k], np.nan, where=counts == 0)
+		return totals
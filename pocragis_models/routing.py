@@ -0,0 +1,411 @@
+"""
+This module contains the array (numpy) counterpart of <Drainage>,
+routing all the streams of a drainage-network at once, time-step by time-step.
+
+The channels are compiled, as by <Drainage.Stream.Channel.compile>, into
+a column (array over the streams) per value of the compiled record, and the
+network into arrays of its edges (source-stream -> destination-stream).
+Only the active streams (those with runoff, storage or inflow) are run at
+every time-step; the others get their zero transient, computed once.
+Results agree with <Drainage>'s to rounding (numpy's power can differ
+from the math-library's in the last bit).
+
+Optionally (with <max_substeps> above 1), a time-step is routed in as many
+sub-steps as its travel-times need: when the shortest travel-time of the
+network's active streams (at the previous time-step) is shorter than the
+time-step, its storage_coeffecient and fraction_time_step would be clipped at 1;
+so the time-step is split into n = ceil(time-step / shortest travel-time)
+sub-steps (at most <max_substeps>), across which all its per-step quantities
+are split evenly: the runoff, the evaporation (evaporation_per_width) and the
+transmission loss (conductivity_per_length); storage_coeffecient and
+fraction_time_step follow from the sub-step's duration, and the return flow
+from the bank, a fraction (bank_flow_return_fraction) of the sub-step's
+(scaled) transmission loss, is scaled with it. So the routed volumes change
+little as n grows (e.g. a network's outflow by under 0.1% from 8 to 16
+sub-steps, see test/test_drainage.py). Dry periods, with no active streams, stay single (and trivial)
+steps, so that runtime follows the hydrological activity.
+
+Large networks can be partitioned into subtrees of streams (<DrainageNetwork.partition>),
+and routed concurrently in a pool of processes (<DrainageNetwork.run_partitioned>).
+As water only flows downstream, a subtree does not depend on what is downstream
+of it: it is routed over all the time-steps at once, and only the series of its
+outlet's outflows is passed on, as inflows of the partition it drains into.
+Partitions are routed in waves: first those with no partition upstream, then those
+whose upstream partitions are all routed, and so on. Without sub-steps, results
+agree with those of the whole network to rounding; with them, every partition
+takes its own sub-steps, and its inflows enter in the first sub-step of a time-step.
+
+Usage:
+>>> network = DrainageNetwork.from_drainage(drainage)
+>>> routed = network.run(runoffs) # runoffs: [streams x steps] array of runoff_per_area_in_watershed, as for Drainage.run
+>>> routed['volume_out'] # [streams x steps] array
+>>> routed = network.run_partitioned(runoffs, partition_size=10000, num_workers=8)
+>>> scenarios = DrainageNetwork.from_drainage(drainage, num_scenarios=20)
+>>> routed = scenarios.run(scenario_runoffs) # [scenarios x streams x steps] arrays
+"""
+
+import os
+import math
+import multiprocessing
+
+import numpy as np
+
+from .models import Drainage
+
+
+transient_fields = Drainage.Stream.Transient.__init__.__code__.co_varnames[1:Drainage.Stream.Transient.__init__.__code__.co_argcount]
+
+
+def compile_channels(channels):
+	"""Columns (arrays over the channels) of the channels' compiled records"""
+
+	compiled = [ch.compile() for ch in channels]
+	return {
+		f: np.array([getattr(c, f) for c in compiled], dtype=float)
+			for f in Drainage.Stream.Channel.Compiled._fields
+	}
+
+
+def route_time_step(c, runoff_per_area_in_watershed, storage_prev_timestep, volume_in, time_step_duration):
+	"""
+	Array counterpart of <Drainage.Stream.run_compiled_stream_model_for_time_step>,
+	with <c> holding the compiled channels' columns.
+	Returns a <dict> of the transient's fields.
+	"""
+
+	swat_runoff = runoff_per_area_in_watershed * c['watershed_area']
+	total_volume_stored = swat_runoff + storage_prev_timestep + volume_in
+	cross_section = total_volume_stored / c['length'] * 1000
+	depth_water_level = np.sqrt((cross_section / c['zch']) + c['half_width_bottom_zch_squared']) - c['half_width_bottom_zch']
+	width_water_level = c['width_bottom'] + 2 * c['zch'] * depth_water_level
+	wetted_perimeter = c['width_bottom'] + 2 * depth_water_level * c['sqrt_one_plus_zch_squared']
+	hydraulic_radius = cross_section / wetted_perimeter
+	hydraulic_radius_power = hydraulic_radius**(2/3)
+	discharge = cross_section * hydraulic_radius_power * c['sqrt_channel_slope'] / c['mannigs']
+	velocity = hydraulic_radius_power * c['sqrt_channel_slope'] / c['mannigs']
+	with np.errstate(divide='ignore', invalid='ignore'):
+		travel_time = np.where(discharge > 0, total_volume_stored / discharge, 0)
+	storage_coeffecient = np.minimum((2 * time_step_duration) / (2*travel_time + time_step_duration), 1)
+	transmission_loss = np.minimum(
+		c['conductivity_per_length'] * wetted_perimeter * (travel_time/3600), total_volume_stored
+	)
+	bankin = transmission_loss * (1 - c['fraction_deep_aquifer'])
+	return_flow_from_bank = bankin * c['bank_flow_return_fraction']
+	fraction_time_step = np.minimum(travel_time / time_step_duration, 1)
+	evaporation_loss = c['evaporation_per_width'] * width_water_level * fraction_time_step
+	total_loss = transmission_loss + evaporation_loss
+	volume_after_loss = np.maximum(total_volume_stored - total_loss, 0)
+	volume_out = volume_after_loss * storage_coeffecient
+	volume_stored_end_timestep = volume_after_loss - volume_out + return_flow_from_bank
+
+	runoff_per_area_in_watershed = runoff_per_area_in_watershed + np.zeros_like(swat_runoff)
+	volume_in = volume_in + np.zeros_like(swat_runoff)
+	return {f: v for f, v in locals().items() if f in transient_fields}
+
+
+
+def _run_partition(args):
+	network, runoffs, inflows, fields = args
+	routed = network.run(runoffs, fields, inflows)
+	return routed, network.storage, network.volume_out, network.travel_time
+
+
+
+class DrainageNetwork:
+	"""
+	A drainage-network of streams, routed with arrays.
+
+	<channels> is a <list> of <Drainage.Stream.Channel>s (or their compiled columns,
+	as by <compile_channels>), and <sources> a <list> (per stream) of the <list>
+	of indices of its source-streams.
+	<storage> and <volume_out> are the streams' volume_stored_end_timestep
+	and volume_out at the start (zero by default).
+
+	With <num_scenarios>, the network routes that many scenarios (e.g. of
+	interventions or rainfall) at once, sharing its channels and topology:
+	its states, and the runoffs and transients of its time-steps, are then
+	[scenarios x streams] arrays (and the runoffs of <run>, [scenarios x streams x steps]).
+	Sub-steps are common to the scenarios.
+
+	A sub-stepped time-step's transient has the sums over its sub-steps of
+	the <flux_fields>, and the last sub-step's values of the other fields.
+	"""
+
+	flux_fields = [
+		'runoff_per_area_in_watershed', 'swat_runoff', 'volume_in', 'transmission_loss', 'bankin',
+		'return_flow_from_bank', 'evaporation_loss', 'total_loss', 'volume_out'
+	]
+
+	def __init__(s, channels, sources, storage=None, volume_out=None, time_step_duration=Drainage.Time_step_duration,
+		max_substeps=1, num_scenarios=None
+	):
+		s.num_streams = len(sources)
+		s.num_scenarios = num_scenarios
+		s.shape = (s.num_streams,) if num_scenarios is None else (num_scenarios, s.num_streams)
+		s.channel_columns = channels if isinstance(channels, dict) else compile_channels(channels)
+		s.sources = [list(ss) for ss in sources]
+		# edges, grouped by destination in the order of its sources (the order they are summed in)
+		s.edge_sources = np.array([i for ss in s.sources for i in ss], dtype=int)
+		s.edge_destinations = np.array([d for d, ss in enumerate(s.sources) for _ in ss], dtype=int)
+		# (and in the flattened states, scenario after scenario)
+		s.flat_edge_destinations = (
+			np.arange(1 if num_scenarios is None else num_scenarios)[:, None] * s.num_streams + s.edge_destinations
+		).ravel()
+		s.time_step_duration = time_step_duration
+		s.max_substeps = max_substeps
+
+		s.storage = np.zeros(s.shape) if storage is None else np.broadcast_to(np.asarray(storage, dtype=float), s.shape).copy()
+		s.volume_out = np.zeros(s.shape) if volume_out is None else np.broadcast_to(np.asarray(volume_out, dtype=float), s.shape).copy()
+
+		s.travel_time = np.zeros(s.shape)
+		s.num_substeps = []
+
+		# (without storage, the transient depends on no duration, so it is that of sub-steps too)
+		zeros = np.zeros(s.num_streams)
+		s.zero_transient = {
+			f: np.broadcast_to(v, s.shape)
+				for f, v in route_time_step(s.channel_columns, zeros, zeros, zeros, time_step_duration).items()
+		}
+
+
+	@staticmethod
+	def from_drainage(drainage, num_scenarios=None):
+		"""Network of a <Drainage>, starting (in every scenario) from its streams' latest transients"""
+
+		index = {id(cs): i for i, cs in enumerate(drainage.connected_streams)}
+		return DrainageNetwork(
+			[cs.channel for cs in drainage.connected_streams],
+			[[index[id(css)] for css in cs.sources] for cs in drainage.connected_streams],
+			storage=[cs.transients[-1].volume_stored_end_timestep for cs in drainage.connected_streams],
+			volume_out=[cs.transients[-1].volume_out for cs in drainage.connected_streams],
+			num_scenarios=num_scenarios
+		)
+
+
+	def get_volume_in(s, volume_out):
+		return np.bincount(
+			s.flat_edge_destinations, weights=volume_out[..., s.edge_sources].ravel(), minlength=volume_out.size
+		).reshape(s.shape)
+
+
+	def get_num_substeps(s):
+
+		if s.max_substeps <= 1:
+			return 1
+		travel_times = s.travel_time[s.travel_time > 0]
+		if len(travel_times) == 0:
+			return 1
+		return int(min(math.ceil(s.time_step_duration / travel_times.min()), s.max_substeps))
+
+
+	def route(s, runoff, channel_columns, time_step_duration, inflow=None):
+		"""Routes the active streams over a (sub-)step"""
+
+		volume_in = s.get_volume_in(s.volume_out)
+		if inflow is not None:
+			volume_in = volume_in + inflow
+		active = np.nonzero((runoff != 0) | (s.storage != 0) | (volume_in != 0)) # (of the scenarios and of the streams)
+
+		if len(active[-1]) == runoff.size:
+			transient = route_time_step(channel_columns, runoff, s.storage, volume_in, time_step_duration)
+		else:
+			transient = {f: v.copy() for f, v in s.zero_transient.items()}
+			if len(active[-1]) > 0:
+				active_transient = route_time_step(
+					{f: v[active[-1]] for f, v in channel_columns.items()},
+					runoff[active], s.storage[active], volume_in[active], time_step_duration
+				)
+				for f, v in active_transient.items():
+					transient[f][active] = v
+
+		s.storage = transient['volume_stored_end_timestep']
+		s.volume_out = transient['volume_out']
+		s.travel_time = transient['travel_time']
+		return transient
+
+
+	def step(s, runoff_per_area_in_watershed, inflow=None):
+		"""
+		Routes a time-step, given the streams' runoff, returning its transient's fields as arrays.
+		<inflow> is an optional volume_in of the streams from outside the network
+		(e.g. from upstream partitions), entering in the first sub-step.
+		"""
+
+		runoff = np.broadcast_to(np.asarray(runoff_per_area_in_watershed, dtype=float), s.shape)
+		n = s.get_num_substeps()
+		s.num_substeps.append(n)
+		if n == 1:
+			return s.route(runoff, s.channel_columns, s.time_step_duration, inflow)
+
+		channel_columns = dict(s.channel_columns,
+			conductivity_per_length=s.channel_columns['conductivity_per_length'] / n,
+			evaporation_per_width=s.channel_columns['evaporation_per_width'] / n
+		)
+		runoff = runoff / n
+		transient = s.route(runoff, channel_columns, s.time_step_duration / n, inflow)
+		sums = {f: transient[f].copy() for f in s.flux_fields}
+		for _ in range(n-1):
+			transient = s.route(runoff, channel_columns, s.time_step_duration / n)
+			for f in s.flux_fields:
+				sums[f] += transient[f]
+		return dict(transient, **sums)
+
+
+	def run(s, runoffs, fields=('volume_out', 'volume_stored_end_timestep'), inflows=None, sink=None):
+		"""
+		Routes [streams x steps] runoffs (with scenarios, [scenarios x streams x steps]),
+		as for <Drainage.run>: an array (or a <list> of <list>s), or an iterator of such
+		arrays of consecutive time-steps (chunks); and optional <inflows> (see <step>),
+		an array of the same shape as the runoffs (of all the time-steps).
+		Returns [streams x steps] (with scenarios, [scenarios x streams x steps]) arrays
+		of the transient's <fields>.
+		Every time-step's transient is also written to the <sink>, if any (see <drainage_io>).
+		"""
+
+		chunks = runoffs if iter(runoffs) is runoffs else [runoffs]
+		routed = {f: [] for f in fields}
+		i = 0
+		for chunk in chunks:
+			# (a time-step's runoffs, contiguous)
+			chunk = np.ascontiguousarray(np.moveaxis(np.asarray(chunk, dtype=float), -1, 0))
+			chunk_routed = {f: np.empty(s.shape + (len(chunk),)) for f in fields}
+			for k in range(len(chunk)):
+				transient = s.step(chunk[k], None if inflows is None else inflows[..., i])
+				for f in fields:
+					chunk_routed[f][..., k] = transient[f]
+				if sink is not None:
+					sink.write(transient)
+				i += 1
+			for f in fields:
+				routed[f].append(chunk_routed[f])
+		return {f: np.concatenate(routed[f], axis=-1) if routed[f] else np.empty(s.shape + (0,)) for f in fields}
+
+
+	def get_destinations(s):
+		"""Index of every stream's destination-stream (-1 for outlets)"""
+
+		destinations = np.full(s.num_streams, -1)
+		destinations[s.edge_sources] = s.edge_destinations
+		return destinations
+
+
+	def subnetwork(s, streams):
+		"""
+		Network of the given <streams> (indices), in their current state.
+		Their sources outside of <streams> are dropped; their outflows are then to be given as inflows.
+		"""
+
+		streams = np.asarray(streams, dtype=int)
+		local = {int(g): i for i, g in enumerate(streams)}
+		return DrainageNetwork(
+			{f: v[streams] for f, v in s.channel_columns.items()},
+			[[local[i] for i in s.sources[g] if i in local] for g in streams],
+			storage=s.storage[..., streams], volume_out=s.volume_out[..., streams],
+			time_step_duration=s.time_step_duration, max_substeps=s.max_substeps, num_scenarios=s.num_scenarios
+		)
+
+
+	def partition(s, partition_size):
+		"""
+		Partitions the network into subtrees of about <partition_size> streams.
+		Going downstream, a stream whose upstream streams not yet partitioned number
+		<partition_size> or more closes a partition (as do the outlets).
+		Returns the partitions (<list>s of stream indices, each ending with its outlet-stream),
+		in an order where every partition comes after the partitions upstream of it.
+		"""
+
+		destinations = s.get_destinations()
+		# streams in post-order (sources before destinations), from every outlet
+		order = []
+		stack = [(o, False) for o in np.flatnonzero(destinations < 0)[::-1]]
+		while stack:
+			i, visited = stack.pop()
+			if visited:
+				order.append(i)
+			else:
+				stack.append((i, True))
+				stack.extend((j, False) for j in reversed(s.sources[i]))
+
+		pending = [[] for _ in range(s.num_streams)] # upstream streams not yet partitioned, per stream
+		partitions = []
+		for i in order:
+			# (extending the largest of the sources' lists, so that no stream is copied often)
+			upstream = sorted((pending[ss] for ss in s.sources[i]), key=len, reverse=True)
+			streams = upstream[0] if upstream else []
+			for ss in upstream[1:]:
+				streams.extend(ss)
+			streams.append(i)
+			for ss in s.sources[i]:
+				pending[ss] = None
+			if len(streams) >= partition_size or destinations[i] < 0:
+				partitions.append(streams)
+				pending[i] = []
+			else:
+				pending[i] = streams
+		return partitions
+
+
+	def run_partitioned(s, runoffs, fields=('volume_out', 'volume_stored_end_timestep'),
+		partition_size=10000, num_workers=None
+	):
+		"""
+		<run>, with the network partitioned (see <partition>) and the partitions
+		routed concurrently in a pool of processes (the <runoffs> being an array).
+		A partition is routed over all the time-steps once all the partitions upstream
+		of it are; their outlets' volume_out series are then its inflows.
+		"""
+
+		runoffs = np.asarray(runoffs, dtype=float)
+		num_steps = runoffs.shape[-1]
+		partitions = s.partition(partition_size)
+		outlets = [streams[-1] for streams in partitions]
+		# (sorted, the partitions' columns are gathered and scattered in order)
+		partitions = [np.sort(streams) for streams in partitions]
+		destinations = s.get_destinations()
+		partition_of = np.empty(s.num_streams, dtype=int)
+		position = np.empty(s.num_streams, dtype=int) # within its partition
+		for k, streams in enumerate(partitions):
+			partition_of[streams] = k
+			position[streams] = np.arange(len(streams))
+		initial_volume_out = s.volume_out.copy()
+
+		# a partition's level is 1 + the highest level of the partitions upstream of it
+		levels = [0] * len(partitions)
+		for k, outlet in enumerate(outlets):
+			d = destinations[outlet]
+			if d >= 0:
+				levels[partition_of[d]] = max(levels[partition_of[d]], levels[k] + 1)
+
+		inflows = {}
+		routed = {f: np.empty(s.shape + (num_steps,)) for f in fields}
+		pool = multiprocessing.Pool(num_workers or os.cpu_count()) if len(partitions) > 1 and num_workers != 1 else None
+		try:
+			for level in range(max(levels) + 1):
+				ks = [k for k in range(len(partitions)) if levels[k] == level]
+				tasks = [(
+					s.subnetwork(partitions[k]), runoffs[..., partitions[k], :], inflows.pop(k, None),
+					list(set(fields) | {'volume_out'})
+				) for k in ks]
+				results = pool.map(_run_partition, tasks) if pool else list(map(_run_partition, tasks))
+
+				for k, (partition_routed, storage, volume_out, travel_time) in zip(ks, results):
+					streams = partitions[k]
+					for f in fields:
+						routed[f][..., streams, :] = partition_routed[f]
+					s.storage[..., streams] = storage
+					s.volume_out[..., streams] = volume_out
+					s.travel_time[..., streams] = travel_time
+
+					# the outlet's outflow of a time-step enters its destination in the next one
+					d = destinations[outlets[k]]
+					if d >= 0:
+						downstream = partition_of[d]
+						if downstream not in inflows:
+							inflows[downstream] = np.zeros(s.shape[:-1] + (len(partitions[downstream]), num_steps))
+						inflows[downstream][..., position[d], 0] += initial_volume_out[..., outlets[k]]
+						inflows[downstream][..., position[d], 1:] += partition_routed['volume_out'][..., position[outlets[k]], :-1]
+		finally:
+			if pool:
+				pool.close()
+				pool.join()
+		return routed
@@ -0,0 +1,193 @@
+"""
+This module performs global sensitivity analyses of PoCRA's soil-moisture model:
+which of the field's, crop's and weather's parameters drive the variance of
+its outputs (e.g. of the total groundwater recharge).
+
+Samples of the parameters are drawn following a Morris (elementary effects)
+or a Saltelli (Sobol' indices) design, and are evaluated chunk by chunk,
+each chunk as one <BatchSimulation> with a sample per cell. Every sample only
+keeps its scalar targets (totals of components over the simulation),
+accumulated as the simulation goes, so that memory is bounded by the chunk size.
+
+Usage:
+>>> sa = SensitivityAnalysis(
+>>> 	field=Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3),
+>>> 	crop='soyabean', weathers={'rain': [...], 'et0': [...]},
+>>> 	parameters={'cn_val': (60, 95), 'ksat': (5, 50), 'kc_factor': (0.8, 1.2), 'rain_factor': (0.8, 1.2)},
+>>> 	targets=['gw_rech']
+>>> )
+>>> sa.morris(num_trajectories=50)['gw_rech']['mu_star']
+>>> sa.sobol(num_samples=1024)['gw_rech']['ST']
+"""
+
+import numpy as np
+
+from .models import Water
+from .batch import BatchSimulation
+
+
+
+class SensitivityAnalysis:
+	"""
+	Sensitivity of targets to parameters varying within their (low, high) bounds.
+
+	<parameters> can be any of:
+	1. field parameters: 'wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth', 'slope'
+		(the bounds should keep wp < fc < sat; other samples evaluate to nan)
+	2. crop parameters: 'depletion_factor', 'root_depth', and 'kc_factor' scaling the kc curve
+	3. weather parameters: 'rain_factor' and 'et0_factor' scaling the rain and et0
+	<field> (a <Field>) gives the values of the field parameters not varied.
+	<targets> are totals over the simulation of components among
+	<Water.components> and 'deficit' (pet - aet).
+	Any other keyword-arguments are passed on to the <BatchSimulation>s;
+	with a given <pet>, kc_factor and et0_factor cannot be varied.
+	"""
+
+	field_params = ['wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth', 'slope']
+	crop_params = ['depletion_factor', 'root_depth', 'kc_factor']
+	weather_params = ['rain_factor', 'et0_factor']
+
+	def __init__(s, field, crop, weathers, parameters,
+		targets=('gw_rech',), chunk_size=1000, step_unit='DAY',
+		**simulation_kwargs
+	):
+		s.field = {p: float(getattr(field, p)) for p in s.field_params}
+		s.crop = crop
+		s.weathers = {p: np.asarray(v, dtype=float) for p, v in weathers.items()}
+		s.parameters = parameters
+		s.names = list(parameters)
+		if any(p not in s.field_params + s.crop_params + s.weather_params for p in s.names):
+			raise ValueError(f'parameters should be among {s.field_params + s.crop_params + s.weather_params}')
+		if 'pet' in simulation_kwargs and any(p in s.names for p in ['kc_factor', 'et0_factor']):
+			raise ValueError('kc_factor and et0_factor cannot be varied with a given pet')
+		s.low, s.high = (np.array([parameters[p][k] for p in s.names], dtype=float) for k in [0, 1])
+		s.targets = list(targets)
+		s.chunk_size = chunk_size
+		s.step_unit = step_unit
+		s.simulation_kwargs = simulation_kwargs
+
+
+	def prepare(s):
+		"""Computes the (parameter-independent) et0, once (unless et0 or pet is given)"""
+
+		if 'et0' in s.weathers or 'pet' in s.simulation_kwargs:
+			return
+		bs = BatchSimulation(
+			field=s.field, weathers=s.weathers, crop=s.crop, step_unit=s.step_unit, **s.simulation_kwargs
+		)
+		bs.computation_before_iteration()
+		s.weathers = {'rain': s.weathers['rain'], 'et0': bs.et0}
+		for p in ['latitude', 'longitude', 'elevation']:
+			s.simulation_kwargs.pop(p, None)
+
+
+	def evaluate_chunk(s, values):
+
+		index = {c: k for k, c in enumerate(Water.components)}
+		num_samples = len(next(iter(values.values())))
+		totals = {t: np.zeros(num_samples) for t in s.targets}
+
+		def reduce_step(i, out):
+			for t in s.targets:
+				totals[t] += out[index['pet']] - out[index['aet']] if t == 'deficit' else out[index[t]]
+
+		weathers = dict(s.weathers)
+		for p, w in [('rain_factor', 'rain'), ('et0_factor', 'et0')]:
+			if p in values:
+				weathers[w] = values[p][:, None] * weathers[w]
+
+		with np.errstate(all='ignore'):
+			BatchSimulation(
+				field={p: values.get(p, np.full(num_samples, s.field[p])) for p in s.field_params},
+				weathers=weathers, crop=s.crop, step_unit=s.step_unit,
+				crop_properties={p: values[p] for p in s.crop_params if p in values},
+				step_reducer=reduce_step,
+				**s.simulation_kwargs
+			).run()
+		return totals
+
+
+	def evaluate(s, unit_samples):
+		"""Targets of [samples x parameters] samples, given in the unit hypercube"""
+
+		s.prepare()
+		samples = s.low + unit_samples * (s.high - s.low)
+		totals = {t: np.empty(len(samples)) for t in s.targets}
+		for start in range(0, len(samples), s.chunk_size):
+			chunk = samples[start:start+s.chunk_size]
+			chunk_totals = s.evaluate_chunk(dict(zip(s.names, chunk.T)))
+			for t in s.targets:
+				totals[t][start:start+len(chunk)] = chunk_totals[t]
+		return totals
+
+
+	@staticmethod
+	def morris_design(num_params, num_trajectories, num_levels, rng):
+		"""
+		[trajectories x (params+1) x params] one-at-a-time trajectories over a grid of <num_levels> levels,
+		each moving every parameter once by delta (up if possible, otherwise down)
+		"""
+
+		delta = num_levels / (2 * (num_levels - 1))
+		design = np.empty((num_trajectories, num_params + 1, num_params))
+		for r in range(num_trajectories):
+			x = rng.integers(num_levels, size=num_params) / (num_levels - 1)
+			design[r, 0] = x
+			for k, j in enumerate(rng.permutation(num_params)):
+				x[j] = x[j] + delta if x[j] + delta <= 1 else x[j] - delta
+				design[r, k+1] = x
+		return design
+
+
+	def morris(s, num_trajectories=20, num_levels=4, seed=None):
+		"""
+		Morris' elementary effects (in units of the parameters' ranges).
+		Returns, per target, the per-parameter arrays 'mu', 'mu_star' and 'sigma'.
+		"""
+
+		k = len(s.names)
+		design = s.morris_design(k, num_trajectories, num_levels, np.random.default_rng(seed))
+		totals = s.evaluate(design.reshape(-1, k))
+
+		steps = np.diff(design, axis=1) # [trajectories x params x params], one non-zero per step
+		moved = np.argmax(steps != 0, axis=-1)
+		step_sizes = np.take_along_axis(steps, moved[..., None], axis=-1)[..., 0]
+
+		indices = {}
+		for t in s.targets:
+			y = totals[t].reshape(num_trajectories, k + 1)
+			effects = np.empty((num_trajectories, k))
+			np.put_along_axis(effects, moved, np.diff(y, axis=1) / step_sizes, axis=1)
+			indices[t] = {
+				'mu': effects.mean(axis=0),
+				'mu_star': np.abs(effects).mean(axis=0),
+				'sigma': effects.std(axis=0, ddof=1) if num_trajectories > 1 else np.zeros(k),
+			}
+		return indices
+
+
+	def sobol(s, num_samples=1024, seed=None):
+		"""
+		First-order ('S1') and total ('ST') Sobol' indices, per target,
+		by Saltelli's design of <num_samples> x (parameters+2) evaluations
+		(with the estimators of Saltelli et al. 2010 and Jansen).
+		"""
+
+		k = len(s.names)
+		rng = np.random.default_rng(seed)
+		a, b = rng.random((num_samples, k)), rng.random((num_samples, k))
+		ab = np.repeat(a[None], k, axis=0)
+		for j in range(k):
+			ab[j, :, j] = b[:, j]
+		totals = s.evaluate(np.concatenate([a, b, ab.reshape(-1, k)]))
+
+		indices = {}
+		for t in s.targets:
+			y_a, y_b = totals[t][:num_samples], totals[t][num_samples:2*num_samples]
+			y_ab = totals[t][2*num_samples:].reshape(k, num_samples)
+			variance = np.var(np.concatenate([y_a, y_b]))
+			indices[t] = {
+				'S1': np.mean(y_b * (y_ab - y_a), axis=-1) / variance,
+				'ST': 0.5 * np.mean((y_a - y_ab)**2, axis=-1) / variance,
+			}
+		return indices
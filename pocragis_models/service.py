@@ -0,0 +1,290 @@
+"""
+This module provides a local asyncio HTTP service answering on-demand
+simulation requests, e.g. for individual farms from a web dashboard.
+
+Requests arriving concurrently are collected over a short window
+(<batch_window> seconds) and simulated together as one <BatchSimulation>.
+The number of requests waiting or being simulated is limited to
+<max_pending>; beyond it requests are refused (HTTP 503) rather than queued.
+Results of recent requests are kept in an in-memory LRU cache
+keyed by their normalised inputs.
+
+Usage:
+$ python -m pocragis_models.service --port 8080
+$ curl -X POST localhost:8080/simulate -d '{
+	"soil_texture": "clayey", "soil_depth_category": "deep to very deep (> 50 cm)",
+	"lulc_type": "kharif", "slope": 3, "crop": "soyabean",
+	"weathers": {"rain": [...], "et0": [...]}, "components": ["aet", "gw_rech"]
+}'
+
+A request holds the keyword-arguments of <PocraSMModelSimulation>
+(with <weathers> given as a <dict> of <list>s) and optionally the list of
+<components> to answer with (by default all of <Water.components>).
+The answer maps each component to its <list> over the time-steps.
+"""
+
+import json
+import asyncio
+import hashlib
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+from . import lookups
+from .models import Water
+from .batch import BatchSimulation
+
+
+
+class ServiceOverloaded(Exception):
+	"""Raised when a request arrives while <max_pending> requests are already pending"""
+
+
+
+class SimulationService:
+	"""Micro-batching simulation service"""
+
+	def __init__(s, batch_window=0.02, max_batch_size=512, max_pending=2048, cache_size=1024):
+		s.batch_window = batch_window
+		s.max_batch_size = max_batch_size
+		s.max_pending = max_pending
+		s.cache_size = cache_size
+
+		s.queue = asyncio.Queue()
+		s.pending = 0
+		s.cache = OrderedDict()
+
+
+	@staticmethod
+	def normalise(request):
+		"""Validated copy of a request, with defaults filled in and values in canonical types"""
+
+		def optional(value, kind):
+			return None if value is None else kind(value)
+
+		weathers = {p: [float(v) for v in values] for p, values in request['weathers'].items()}
+		if 'rain' not in weathers or len(set(len(v) for v in weathers.values())) != 1:
+			raise ValueError('weathers should have rain, and all weather-parameters should be of the same length')
+		components = list(request.get('components') or Water.components)
+		if any(c not in Water.components for c in components):
+			raise ValueError(f'components should be among {Water.components}')
+		model_state_at_start = request.get('model_state_at_start')
+		if model_state_at_start is not None:
+			# (the time of the first step defaults as in <PocraSMModelSimulation>: 12am to 1am on June 1st)
+			model_state_at_start = {
+				'sm1_frac': float(model_state_at_start['sm1_frac']), 'sm2_frac': float(model_state_at_start['sm2_frac']),
+				'day_of_year': int(model_state_at_start.get('day_of_year', 152)),
+				'hour_of_day': int(model_state_at_start.get('hour_of_day', 1)),
+			}
+			if not 1 <= model_state_at_start['day_of_year'] <= 366 or not 1 <= model_state_at_start['hour_of_day'] <= 24:
+				raise ValueError('model_state_at_start should have a day_of_year from 1 to 366 and an hour_of_day from 1 to 24')
+		for param, lookup in [
+			('soil_texture', lookups.dict_soil_properties), ('soil_depth_category', lookups.dict_soil_depth_category_to_value),
+			('lulc_type', lookups.dict_lulc), ('crop', lookups.dict_of_properties_for_crop_and_croplike)
+		]:
+			if (str(request[param]).lower() if param != 'crop' else str(request[param])) not in lookup:
+				raise ValueError(f'Unknown {param}: {request[param]}')
+
+		return {
+			'soil_texture': str(request['soil_texture']).lower(),
+			'soil_depth_category': str(request['soil_depth_category']).lower(),
+			'lulc_type': str(request['lulc_type']).lower(),
+			'slope': float(request['slope']),
+			'crop': str(request['crop']),
+			'step_unit': str(request.get('step_unit', 'DAY')),
+			'weathers': weathers,
+			'latitude': optional(request.get('latitude'), float),
+			'longitude': optional(request.get('longitude'), float),
+			'elevation': optional(request.get('elevation'), float),
+			'pet': optional(request.get('pet'), lambda pet: [float(v) for v in pet]),
+			'model_state_at_start': model_state_at_start,
+			'sowing_date_offset': optional(request.get('sowing_date_offset'), int),
+			'sowing_threshold': optional(request.get('sowing_threshold'), float),
+			'components': components,
+		}
+
+
+	@staticmethod
+	def batch_key(request):
+		"""
+		Requests with equal keys can be simulated in the same batch: those with the same
+		time-steps (including the time of the first step, if given) and the same optional inputs
+		"""
+		model_state_at_start = request['model_state_at_start']
+		return (
+			request['step_unit'], len(request['weathers']['rain']), tuple(sorted(request['weathers'])),
+			*[request[p] is None for p in ['latitude', 'longitude', 'elevation', 'pet', 'sowing_date_offset']],
+			model_state_at_start and (model_state_at_start['day_of_year'], model_state_at_start['hour_of_day'])
+		)
+
+
+	@staticmethod
+	def run_batch(requests):
+
+		def per_cell(param):
+			if requests[0][param] is None:
+				return None
+			return np.array([r[param] for r in requests])
+
+		model_state_at_start = None
+		if requests[0]['model_state_at_start'] is not None:
+			model_state_at_start = dict(
+				{p: np.array([r['model_state_at_start'][p] for r in requests]) for p in ['sm1_frac', 'sm2_frac']},
+				**{p: requests[0]['model_state_at_start'][p] for p in ['day_of_year', 'hour_of_day']}
+			)
+
+		bs = BatchSimulation(
+			soil_texture=[r['soil_texture'] for r in requests],
+			soil_depth_category=[r['soil_depth_category'] for r in requests],
+			lulc_type=[r['lulc_type'] for r in requests],
+			slope=per_cell('slope'),
+			step_unit=requests[0]['step_unit'],
+			weathers={p: np.array([r['weathers'][p] for r in requests]) for p in requests[0]['weathers']},
+			latitude=per_cell('latitude'), longitude=per_cell('longitude'), elevation=per_cell('elevation'),
+			crop=[r['crop'] for r in requests],
+			pet=per_cell('pet'),
+			model_state_at_start=model_state_at_start,
+			sowing_date_offset=per_cell('sowing_date_offset'),
+			sowing_threshold=np.array([
+				lookups.DEFAULT_SOWING_THRESHOLD if r['sowing_threshold'] is None else r['sowing_threshold']
+					for r in requests
+			])
+		)
+		bs.run()
+
+		return [
+			{c: bs.results[c][i].tolist() for c in r['components']}
+				for i, r in enumerate(requests)
+		]
+
+
+	async def simulate(s, request):
+
+		request = s.normalise(request)
+		key = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+		if key in s.cache:
+			s.cache.move_to_end(key)
+			return s.cache[key]
+
+		if s.pending >= s.max_pending:
+			raise ServiceOverloaded()
+		s.pending += 1
+		try:
+			future = asyncio.get_running_loop().create_future()
+			s.queue.put_nowait((request, key, future))
+			return await future
+		finally:
+			s.pending -= 1
+
+
+	async def batcher(s):
+		"""Collects queued requests over <batch_window> and simulates them batch by batch"""
+
+		loop = asyncio.get_running_loop()
+		while True:
+			items = [await s.queue.get()]
+			deadline = loop.time() + s.batch_window
+			while len(items) < s.max_batch_size:
+				try:
+					items.append(await asyncio.wait_for(s.queue.get(), deadline - loop.time()))
+				except asyncio.TimeoutError:
+					break
+
+			groups = {}
+			for item in items:
+				groups.setdefault(s.batch_key(item[0]), []).append(item)
+
+			for group in groups.values():
+				try:
+					results = await loop.run_in_executor(None, s.run_batch, [r for r, _, _ in group])
+				except Exception:
+					# isolate the failing request(s) by simulating them one by one
+					results = []
+					for r, _, _ in group:
+						try:
+							results.extend(await loop.run_in_executor(None, s.run_batch, [r]))
+						except Exception as e:
+							results.append(e)
+
+				for (_, key, future), result in zip(group, results):
+					if isinstance(result, Exception):
+						if not future.done():
+							future.set_exception(result)
+						continue
+					s.cache[key] = result
+					if len(s.cache) > s.cache_size:
+						s.cache.popitem(last=False)
+					if not future.done():
+						future.set_result(result)
+
+
+	async def handle_connection(s, reader, writer):
+		"""Minimal HTTP/1.1 handling of <POST /simulate>"""
+
+		try:
+			method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+			headers = {}
+			while True:
+				line = (await reader.readline()).decode('latin-1').strip()
+				if not line:
+					break
+				name, _, value = line.partition(':')
+				headers[name.strip().lower()] = value.strip()
+			body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+			if method != 'POST' or path != '/simulate':
+				status, response = '404 Not Found', {'error': 'only POST /simulate is served'}
+			else:
+				try:
+					status, response = '200 OK', await s.simulate(json.loads(body))
+				except ServiceOverloaded:
+					status, response = '503 Service Unavailable', {'error': 'too many pending requests'}
+				except (ValueError, KeyError, TypeError) as e:
+					status, response = '400 Bad Request', {'error': repr(e)}
+				except Exception as e:
+					status, response = '500 Internal Server Error', {'error': repr(e)}
+
+			payload = json.dumps(response).encode()
+			writer.write((
+				f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+				f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'
+			).encode() + payload)
+			await writer.drain()
+		except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+			pass
+		finally:
+			writer.close()
+
+
+	async def serve(s, host='127.0.0.1', port=8080):
+		batcher = asyncio.create_task(s.batcher())
+		server = await asyncio.start_server(s.handle_connection, host, port)
+		try:
+			async with server:
+				await server.serve_forever()
+		finally:
+			batcher.cancel()
+
+
+
+def main(argv=None):
+
+	parser = argparse.ArgumentParser(description='Serve PoCRA soil-moisture model simulations over HTTP')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8080)
+	parser.add_argument('--batch-window', type=float, default=0.02, help='seconds to collect a batch over')
+	parser.add_argument('--max-batch-size', type=int, default=512)
+	parser.add_argument('--max-pending', type=int, default=2048)
+	parser.add_argument('--cache-size', type=int, default=1024)
+	args = parser.parse_args(argv)
+
+	service = SimulationService(args.batch_window, args.max_batch_size, args.max_pending, args.cache_size)
+	try:
+		asyncio.run(service.serve(args.host, args.port))
+	except KeyboardInterrupt:
+		pass
+
+
+if __name__ == '__main__':
+	main()
@@ -1,7 +1,17 @@
 import os
 import csv
+import copy
+import math
+import itertools
+from datetime import date, timedelta
 
-from .models import *
+from . import lookups
+from .models import Field, Crop, Weather, Water, Drainage
+
+
+def _identical(a, b):
+	"""Whether two numbers are equal, not even differing in the sign of a zero"""
+	return a == b and (a != 0 or math.copysign(1, a) == math.copysign(1, b))
 
 
 class PocraSMModelSimulation:
@@ -19,12 +29,14 @@ class PocraSMModelSimulation:
 	of any of the following water-components can be obtained
 	(like aet's list was obtained above): avail_sm, pri_runoff, infil,
 	aet, pet, sec_runoff and gw_rech.
+	They are also in <results>, which aggregates them by day, month and crop-stage
+	(see <results.Results>).
 	"""
 
 	def __init__(self,
 		# field-related attributes
 		soil_texture=None, soil_depth_category=None, lulc_type=None, slope=None, field=None,
-		# simulation time-stepping; current options for step_unit are 'DAY', 'HOUR' and 'SPREAD_DAILY_ET0_USING_HOURLY'
+		# simulation time-stepping; current options for step_unit are 'DAY', 'HOUR', 'SPREAD_DAILY_ET0_USING_HOURLY' and 'ADAPTIVE'
 		step_unit='DAY',
 		# weather-related attributes
 		weathers=None,
@@ -38,7 +50,11 @@ class PocraSMModelSimulation:
 		# attribute determined by crop+weather
 		pet=None,
 		# attributes setting the starting state for the simulation
-		model_state_at_start=None, sowing_date_offset=None, sowing_threshold=None
+		model_state_at_start=None, sowing_date_offset=None, sowing_threshold=None,
+		# calendar date (<datetime.date>) of the first time-step, if the simulation should follow the calendar
+		start_date=None,
+		# daily rain (mm) above which days are stepped hourly, for step_unit 'ADAPTIVE'
+		adaptive_rain_threshold=None
 	):
 		"""
 		TODO: update this __doc__ as per the new code
@@ -49,6 +65,18 @@ class PocraSMModelSimulation:
 		1. key 'avail_sm' : available soil-moisture at the beginning of simulation
 		2. key 'sm1_frac' : soil-moisture content in layer 1 expressed as a fraction
 		3. key 'sm2_frac' : soil-moisture content in layer 2 expressed as a fraction
+
+		With step_unit 'ADAPTIVE', the weathers are hourly (as for 'HOUR') and so are
+		the outputs, but the water-balance is stepped hourly only on days whose rain
+		exceeds <adaptive_rain_threshold>; every other day is a single daily step
+		(with the daily perc_factor), whose fluxes are spread over its hours in
+		proportion to their rain (runoffs and infil) or pet (aet), or evenly (gw_rech),
+		and whose avail_sm is interpolated linearly over its hours.
+		This is an approximation of hourly stepping: on the weathers of test/*_example_output.csv,
+		with the default threshold (5 mm), yearly totals of the runoffs and of gw_rech are
+		within about 8% of those of step_unit 'HOUR', and of aet within 4%. Lower thresholds
+		step more days hourly and bring the runoffs closer (within 5% at 1 mm), but not
+		gw_rech, whose deviation comes from the daily perc_factor of the other days.
 		"""
 
 		self.field = field or Field(
@@ -56,6 +84,10 @@ class PocraSMModelSimulation:
 		)
 		
 		self.step_unit = step_unit
+		self.start_date = start_date
+		self.adaptive_rain_threshold = (
+			lookups.DEFAULT_ADAPTIVE_RAIN_THRESHOLD if adaptive_rain_threshold is None else adaptive_rain_threshold
+		)
 
 		self.model_state = model_state_at_start or {
 			'sm1_frac': self.field.wp, 'sm2_frac': self.field.wp,
@@ -72,11 +104,9 @@ class PocraSMModelSimulation:
 				for i in range(len(self.weathers)):
 					w = self.weathers[i]
 					if step_unit == 'DAY':
-						w.day_of_year = self.model_state['day_of_year'] + i
-					elif step_unit in ['HOUR', 'SPREAD_DAILY_ET0_USING_HOURLY']:
-						hour_of_year_at_start = (self.model_state['day_of_year']-1) * 24 + (self.model_state['hour_of_day']-1)
-						w.day_of_year = (((hour_of_year_at_start+i) // 24) + 1) % 365
-						w.hour_of_day = ((hour_of_year_at_start+i) % 24) + 1
+						w.day_of_year, _ = self.get_time_of_step(step_unit, self.model_state, i, start_date)
+					elif step_unit in ['HOUR', 'SPREAD_DAILY_ET0_USING_HOURLY', 'ADAPTIVE']:
+						w.day_of_year, w.hour_of_day = self.get_time_of_step(step_unit, self.model_state, i, start_date)
 					w.latitude = latitude
 					w.longitude = longitude
 					w.elevation = elevation
@@ -128,12 +158,65 @@ class PocraSMModelSimulation:
 		self._direct_param_access = {}
 
 
+	@staticmethod
+	def get_time_of_step(step_unit, model_state_at_start, i, start_date=None):
+		"""
+		day_of_year and hour_of_day (None for daily time-steps) of the i-th time-step.
+		Without a <start_date>, the simulation starts at the day_of_year and
+		hour_of_day of <model_state_at_start>, hours wrap around a 365-day year
+		and days simply keep counting; with it, the simulation starts
+		at 12am of <start_date> and follows the calendar.
+		"""
+
+		if start_date is not None:
+			d = PocraSMModelSimulation.get_date_of_step(step_unit, start_date, i)
+			return d.timetuple().tm_yday, (None if step_unit == 'DAY' else (i % 24) + 1)
+
+		if step_unit == 'DAY':
+			return model_state_at_start['day_of_year'] + i, None
+		else:
+			hour_of_year_at_start = (model_state_at_start['day_of_year']-1) * 24 + (model_state_at_start['hour_of_day']-1)
+			return (((hour_of_year_at_start+i) // 24) % 365) + 1, ((hour_of_year_at_start+i) % 24) + 1
+
+
+	@staticmethod
+	def get_day_of_rain_year_idx(day_of_year):
+		"""Index of the day in the (365-day) rain-year starting on June 1st (day_of_year 152)"""
+		return (day_of_year-152) if (day_of_year >= 152) else (213+day_of_year)
+
+
+	@staticmethod
+	def get_date_of_step(step_unit, start_date, i):
+		return start_date + timedelta(days=(i if step_unit == 'DAY' else i // 24))
+
+
+	@staticmethod
+	def get_day_of_rain_year_idx_of_date(d):
+		"""Index of the date <d> in the rain-year (starting on June 1st) in which it falls"""
+		return (d - date(d.year if (d.month, d.day) >= (6, 1) else d.year-1, 6, 1)).days
+
+
+	@staticmethod
+	def get_rain_year_length(year):
+		"""Number of days in the rain-year starting on June 1st of <year>"""
+		return (date(year+1, 6, 1) - date(year, 6, 1)).days
+
+
+	def get_day_of_rain_year_idx_of_step(self, i):
+
+		if self.start_date is None:
+			return self.get_day_of_rain_year_idx(self.weathers[i].day_of_year)
+		return self.get_day_of_rain_year_idx_of_date(self.get_date_of_step(self.step_unit, self.start_date, i))
+
+
 	def __getattr__(self, name):
 
 		if name in self._direct_param_access:
 			return self._direct_param_access[name]
 		else:
-			if name in [
+			if name == 'results':
+				value = self.get_results()
+			elif name in [
 				'pri_runoff', 'infil', 'aet', 'sec_runoff', 'gw_rech', 'avail_sm', 'pet'
 			]:
 				value = [getattr(w, name) for w in self.waters]
@@ -145,9 +228,27 @@ class PocraSMModelSimulation:
 				value = [getattr(w, name) for w in self.weathers]
 			self._direct_param_access[name] = value
 			return value
+
+
+	def get_results(self):
+		"""The water-components as a <results.Results> (of [steps] arrays), to be aggregated by day, month and crop-stage"""
+
+		from .results import Results, get_crop_stage_labels
+
+		def get_crop_stages():
+			day_of_crop_idx = [
+				self.get_day_of_rain_year_idx_of_step(i) - self.sowing_date_offset for i in range(self.simulation_length)
+			]
+			return get_crop_stage_labels([self.crop.kc], [len(self.crop.kc)], 0, day_of_crop_idx)
+
+		times = {p: [getattr(w, p, None) for w in self.weathers] for p in ['day_of_year', 'hour_of_day']}
+		return Results(
+			{c: [getattr(w, c) for w in self.waters] for c in Water.components}, self.step_unit,
+			*[None if None in v else v for v in times.values()], self.start_date, crop_stages=get_crop_stages
+		)
 	
 
-	def computation_before_iteration(self):
+	def set_layer_thicknesses(self):
 		
 		# determine layer_1_thickness, layer_2_thickness
 		if (self.field.soil_depth <= self.crop.root_depth): # thin soil layer
@@ -157,33 +258,66 @@ class PocraSMModelSimulation:
 			self.layer_1_thickness = self.crop.root_depth
 			self.layer_2_thickness = self.field.soil_depth - self.crop.root_depth
 
+
+	def detect_sowing_date_offset(self):
+		"""sowing_date_offset from the (given) pet, or by the sowing_threshold of rain"""
+
+		if self.pet is not None:
+			i = 0
+			while(self.pet[i] == 0):
+				i += 1
+			return i
+		if self.crop.is_pseudo_crop:
+			return 0
+		# determine sowing_date_offset based on sowing_threshold logic;
+		# if the threshold is never reached, the crop is never sown
+		num_days = self.simulation_length if self.step_unit == 'DAY' else self.simulation_length // 24
+		accumulated_rain = 0
+		for i in range(min(365, num_days)):
+			accumulated_rain += (self.weathers[i].rain if self.step_unit == 'DAY' else sum(self.weathers[24*i+j].rain for j in range(24)))
+			# print(self.step_unit, self.weathers[i].rain, accumulated_rain)
+			if accumulated_rain >= self.sowing_threshold:
+				return i
+		return num_days
+
+
+	def get_kc_of_step(self, i):
+
+		day_of_rain_year_idx = self.get_day_of_rain_year_idx_of_step(i)
+		if self.sowing_date_offset <= day_of_rain_year_idx < (self.sowing_date_offset + len(self.crop.kc)):
+			return self.crop.kc[day_of_rain_year_idx - self.sowing_date_offset]
+		return 0
+
+
+	def get_pet_of_step(self, i):
+		"""pet of the i-th time-step, computing (and setting) its weather's r_a and et0 if not already set"""
+
+		kc = self.get_kc_of_step(i)
+		# TODO : check that there is a way to compute pet from available inputs
+		# params_for_pet_for_time_step = {
+		# 	p: getattr(weather, p, None) for p in [
+		# 		'et0', 'temp_daily_min', 'temp_daily_avg', 'temp_daily_max', 'r_a', 'latitude', 'day_of_year',
+		# 		'temp_hourly_avg', 'rh_hourly_avg', 'wind_hourly_avg', 'elevation', 'longitude', 'hour_of_day'
+		# 	]
+		# }
+		# params_for_pet_for_day['day_of_year'] = ((i+1)+151) if (i+1) <= 214 else (215-i) # leap-years may be tackled if year can be provided by user
+		R_a_for_time_step, et0_for_time_step, pet = Water.get_pocra_pet_for_time_step(kc, **self.weathers[i].__dict__)#**params_for_pet_for_day)
+		self.weathers[i].r_a = R_a_for_time_step
+		self.weathers[i].et0 = et0_for_time_step
+		return pet
+
+
+	def computation_before_iteration(self):
+
+		self.set_layer_thicknesses()
+
 		if self.sowing_date_offset is None:
-			if self.pet is not None:
-				i = 0
-				while(self.pet[i] == 0):
-					i += 1
-				self.sowing_date_offset = i
-			else:
-				if self.crop.is_pseudo_crop:
-					self.sowing_date_offset = 0
-				else:
-					# determine sowing_date_offset based on sowing_threshold logic
-					accumulated_rain = 0
-					for i in range(365):
-						accumulated_rain += (self.weathers[i].rain if self.step_unit == 'DAY' else sum(self.weathers[24*i+j].rain for j in range(24)))
-						# print(self.step_unit, self.weathers[i].rain, accumulated_rain)
-						if accumulated_rain >= self.sowing_threshold:
-							self.sowing_date_offset = i
-							break
+			self.sowing_date_offset = self.detect_sowing_date_offset()
 
 		if self.step_unit == 'SPREAD_DAILY_ET0_USING_HOURLY':
 			et0_for_day = []; et0_weights = []; et0 = []; pet = []
 			for i in range(len(self.weathers)):
-				day_of_rain_year_idx = (self.weathers[i].day_of_year-152) if (self.weathers[i].day_of_year >= 152) else (213+self.weathers[i].day_of_year)
-				if self.sowing_date_offset <= day_of_rain_year_idx < (self.sowing_date_offset + len(self.crop.kc)):
-					kc = self.crop.kc[day_of_rain_year_idx - self.sowing_date_offset]
-				else:
-					kc = 0
+				kc = self.get_kc_of_step(i)
 				
 				et0_for_day.append(Water.get_pocra_pet_for_time_step(kc, **self.weathers[i].__dict__)[1])
 
@@ -210,42 +344,109 @@ class PocraSMModelSimulation:
 
 
 	def iterate(s):
-		f = s.field
 		
-		for i in range(len(s.weathers)):
-			if s.pet is None:
-				day_of_rain_year_idx = (s.weathers[i].day_of_year-152) if (s.weathers[i].day_of_year >= 152) else (213+s.weathers[i].day_of_year)
-				if s.sowing_date_offset <= day_of_rain_year_idx < (s.sowing_date_offset + len(s.crop.kc)):
-					kc = s.crop.kc[day_of_rain_year_idx - s.sowing_date_offset]
-				else:
-					kc = 0
-				# TODO : check that there is a way to compute pet from available inputs
-				try:
-					# params_for_pet_for_time_step = {
-					# 	p: getattr(weather, p, None) for p in [
-					# 		'et0', 'temp_daily_min', 'temp_daily_avg', 'temp_daily_max', 'r_a', 'latitude', 'day_of_year',
-					# 		'temp_hourly_avg', 'rh_hourly_avg', 'wind_hourly_avg', 'elevation', 'longitude', 'hour_of_day'
-					# 	]
-					# }
-					# params_for_pet_for_day['day_of_year'] = ((i+1)+151) if (i+1) <= 214 else (215-i) # leap-years may be tackled if year can be provided by user
-					R_a_for_time_step, et0_for_time_step, pet_for_time_step = Water.get_pocra_pet_for_time_step(kc, **s.weathers[i].__dict__)#**params_for_pet_for_day)
-					s.weathers[i].r_a = R_a_for_time_step
-					s.weathers[i].et0 = et0_for_time_step
-				except Exception as e:
-					print(i, s.weathers[i].__dict__)
-					raise e
-			else:
-				pet_for_time_step = s.pet[i]
+		if s.pet is None:
+			pet = [s.get_pet_of_step(i) for i in range(len(s.weathers))]
+		else:
+			pet = s.pet
 
+		rain = [w.rain for w in s.weathers]
+		if s.step_unit == 'ADAPTIVE':
+			s.iterate_adaptively(rain, pet)
+		else:
+			s.iterate_water_balance(rain, pet)
+		s.pet = [w.pet for w in s.waters]
+
+
+	def iterate_water_balance(s, rain, pet, start=0, checkpoints=None, checkpoint_interval=None):
+		"""
+		Steps the water-balance from the <start>-th time-step (and the current <model_state>)
+		to the end; if <checkpoints> (a <dict>) is given, the state before every
+		<checkpoint_interval>-th time-step is recorded in it, by time-step.
+		"""
+		f = s.field
+
+		i = start
+		while i < len(s.weathers):
+			if checkpoints is not None and i % checkpoint_interval == 0:
+				checkpoints[i] = s.model_state
+			sm1_frac, sm2_frac = s.model_state['sm1_frac'], s.model_state['sm2_frac']
 			s.waters[i], s.model_state = Water.run_pocra_sm_model_for_time_step(
 				s.layer_1_thickness, s.layer_2_thickness,
-				s.model_state['sm1_frac'], s.model_state['sm2_frac'],
+				sm1_frac, sm2_frac,
 				f.wp, f.fc, f.sat, f.smax, f.w1, f.w2, f.perc_factor,
 				s.crop.depletion_factor,
-				s.weathers[i].rain, pet_for_time_step
+				rain[i], pet[i]
 			)
-
-		s.pet = [w.pet for w in s.waters]
+			i += 1
+
+			# Fast-forward: if the state came out of this time-step unchanged,
+			# every following time-step with the same rain and pet would
+			# compute exactly the same water-components and leave the state
+			# unchanged too; so such a run of time-steps is filled in one go
+			# (with copies, so that every time-step keeps its own <Water>).
+			if (_identical(s.model_state['sm1_frac'], sm1_frac)
+				and _identical(s.model_state['sm2_frac'], sm2_frac)
+			):
+				j = i
+				while j < len(s.weathers) and _identical(rain[j], rain[i-1]) and _identical(pet[j], pet[i-1]):
+					j += 1
+				s.waters[i:j] = [copy.copy(s.waters[i-1]) for _ in range(i, j)]
+				if checkpoints is not None:
+					for k in range(-(-i // checkpoint_interval) * checkpoint_interval, j, checkpoint_interval):
+						checkpoints[k] = s.model_state
+				i = j
+
+
+	def iterate_adaptively(s, rain, pet):
+		"""
+		Steps the water-balance over hourly <rain> and <pet> (from 12am), day by day:
+		hourly on days whose rain exceeds <adaptive_rain_threshold> (and on a last partial day),
+		and otherwise in a single daily step, spread over the day's hours
+		(see the step_unit 'ADAPTIVE' of <__init__>); counts the hourly stepped days
+		in <num_hourly_stepped_days>.
+		"""
+		f = s.field
+		l1, l2 = s.layer_1_thickness, s.layer_2_thickness
+		daily_perc_factor = Field.pocra_sm_model_field_setup(
+			f.wp, f.fc, f.sat, f.soil_depth, f.cn_val, f.slope, f.ksat, 1
+		)['perc_factor']
+
+		s.num_hourly_stepped_days = 0
+		for start in range(0, len(rain), 24):
+			hours = range(start, min(start+24, len(rain)))
+			rain_of_day = sum(rain[i] for i in hours)
+
+			if rain_of_day > s.adaptive_rain_threshold or len(hours) < 24:
+				s.num_hourly_stepped_days += 1
+				for i in hours:
+					s.waters[i], s.model_state = Water.run_pocra_sm_model_for_time_step(
+						l1, l2, s.model_state['sm1_frac'], s.model_state['sm2_frac'],
+						f.wp, f.fc, f.sat, f.smax, f.w1, f.w2, f.perc_factor,
+						s.crop.depletion_factor,
+						rain[i], pet[i]
+					)
+				continue
+
+			prev_avail_sm = (
+				s.model_state['sm1_frac'] * l1 + s.model_state['sm2_frac'] * l2 - f.wp * (l1+l2)
+			) * 1000
+			pet_of_day = sum(pet[i] for i in hours)
+			w, s.model_state = Water.run_pocra_sm_model_for_time_step(
+				l1, l2, s.model_state['sm1_frac'], s.model_state['sm2_frac'],
+				f.wp, f.fc, f.sat, f.smax, f.w1, f.w2, daily_perc_factor,
+				s.crop.depletion_factor,
+				rain_of_day, pet_of_day
+			)
+			for k, i in enumerate(hours):
+				rain_share = rain[i] / rain_of_day if rain_of_day > 0 else 1/24
+				pet_share = pet[i] / pet_of_day if pet_of_day > 0 else 1/24
+				s.waters[i] = Water(
+					w.pri_runoff * rain_share, w.infil * rain_share, w.aet * pet_share,
+					w.sec_runoff * rain_share, w.gw_rech / 24,
+					prev_avail_sm + (w.avail_sm - prev_avail_sm) * (k+1) / 24,
+					pet[i]
+				)
 	
 	
 	def computation_after_iteration(self):
@@ -261,6 +462,73 @@ class PocraSMModelSimulation:
 
 
 
+class MultiYearPocraSMModelSimulation:
+	"""
+	Continuous simulation of PoCRA's soil-moisture model over many rain-years
+	(each from June 1st to May 31st), following the calendar (with leap-years).
+
+	Every rain-year is simulated as a <PocraSMModelSimulation> of its own,
+	with sowing detected afresh for its season, and with the soil-moisture
+	state carried over from the end of the previous rain-year.
+	The weathers are taken from <yearly_weathers> (an iterable, e.g. a generator,
+	of the weathers of one rain-year after another, in any form accepted by
+	<PocraSMModelSimulation>) one rain-year at a time, and <run> yields each
+	rain-year's simulation as soon as it is done. Thus, if its results are
+	written out before the next one is asked for, memory stays that of a year.
+
+	<crop> can be a single crop or a <list> of crops, one for each rain-year.
+
+	Usage:
+	>>> mypsmm = MultiYearPocraSMModelSimulation(
+	>>> 	SimulationIO.read_yearly_weathers_from_csv('weathers.csv', 1990), 1990,
+	>>> 	<field-related input-parameters>, crop='soyabean', latitude=20
+	>>> )
+	>>> for psmm in mypsmm.run():
+	>>> 	SimulationIO.output_water_components_to_csv(psmm, ['aet'], 'results.csv', append=True)
+	"""
+
+	def __init__(self,
+		yearly_weathers, first_year,
+		soil_texture=None, soil_depth_category=None, lulc_type=None, slope=None, field=None,
+		step_unit='DAY',
+		latitude=None, elevation=None, longitude=None,
+		crop=None,
+		model_state_at_start=None, sowing_threshold=None
+	):
+
+		self.field = field or Field(
+			soil_texture, soil_depth_category, lulc_type, slope, 1 if step_unit=='DAY' else 24
+		)
+		self.yearly_weathers = yearly_weathers
+		self.first_year = first_year
+		self.step_unit = step_unit
+		self.latitude = latitude
+		self.elevation = elevation
+		self.longitude = longitude
+		self.crop = crop
+		self.model_state = model_state_at_start
+		self.sowing_threshold = sowing_threshold
+
+
+	def run(self):
+
+		for k, weathers in enumerate(self.yearly_weathers):
+			psmm = PocraSMModelSimulation(
+				field=self.field, step_unit=self.step_unit,
+				weathers=weathers, latitude=self.latitude, elevation=self.elevation, longitude=self.longitude,
+				crop=self.crop[k] if isinstance(self.crop, list) else self.crop,
+				model_state_at_start=self.model_state and {
+					'sm1_frac': self.model_state['sm1_frac'], 'sm2_frac': self.model_state['sm2_frac']
+				},
+				sowing_threshold=self.sowing_threshold,
+				start_date=date(self.first_year + k, 6, 1)
+			)
+			psmm.run()
+			self.model_state = psmm.model_state
+			yield psmm
+
+
+
 class SimulationIO:
 	"""
 	This class provides input-output facilities
@@ -278,7 +546,32 @@ class SimulationIO:
 	
 
 	@staticmethod
-	def output_water_components_to_csv(psmm, components=[], filepath='results.csv'):
+	def read_yearly_weathers_from_csv(filepath, first_year, step_unit='DAY'):
+		"""
+		Lazily reads a weather csv-file, having a column per weather-parameter
+		and a row per time-step starting on June 1st of <first_year>, and
+		yields the weathers of one rain-year at a time, as a <dict> of <list>s
+		(leap-years having a day more); columns other than weather-parameters
+		(like a date column) are ignored.
+		"""
+
+		weather_params = Weather.__init__.__code__.co_varnames[1:Weather.__init__.__code__.co_argcount]
+		with open(filepath, newline='') as f:
+			reader = csv.DictReader(f)
+			params = [p for p in reader.fieldnames if p in weather_params]
+			year = first_year
+			while True:
+				rows = list(itertools.islice(
+					reader, PocraSMModelSimulation.get_rain_year_length(year) * (1 if step_unit == 'DAY' else 24)
+				))
+				if len(rows) == 0:
+					return
+				yield {p: [float(row[p]) for row in rows] for p in params}
+				year += 1
+
+
+	@staticmethod
+	def output_water_components_to_csv(psmm, components=[], filepath='results.csv', append=False):
 
 		if (isinstance(psmm, PocraSMModelSimulation)
 			and len(psmm.waters) > 0 and all(isinstance(w, Water) for w in psmm.waters)
@@ -290,7 +583,9 @@ class SimulationIO:
 				for c in components
 			} for i in range(len(psmm.weathers))]
 			
-			with open(filepath, 'w', newline='') as f:
+			write_header = not (append and os.path.exists(filepath) and os.path.getsize(filepath) > 0)
+			with open(filepath, 'a' if append else 'w', newline='') as f:
 				writer = csv.DictWriter(f, fieldnames=components)
-				writer.writeheader()
+				if write_header:
+					writer.writeheader()
 				writer.writerows(rows)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+This module provides spun-up starting states for simulations,
+cached on disk so that they are computed only once.
+
+Rather than starting every simulation at wilting-point (the default
+<model_state_at_start> of <PocraSMModelSimulation>) or spinning every
+simulation up by simulating an extra year before it, the starting state
+is taken to be the equilibrium state of a class of simulations: the state
+at the start of the rain-year (June 1st) that a simulation returns to,
+year after year, when run repeatedly over a climate normal.
+
+A class is identified by the field's parameters, the crop and the climate
+normal (plus the step_unit, the location and the sowing_threshold), so that
+all cells of a batch-run falling in the same class share a single spin-up.
+Every class' state is stored as a small json-file of its own in the cache's
+directory, written atomically, so that processes running in parallel can
+share a cache.
+
+Usage:
+>>> cache = SpinUpCache('spinup_cache', latitude=20)
+>>> state = cache.model_state_for(field, 'soyabean', normal_weathers, normal_name='kada-1991-2020')
+>>> psmm = PocraSMModelSimulation(..., field=field, crop='soyabean', model_state_at_start=state)
+"""
+
+import os
+import json
+import hashlib
+
+from .models import Field
+from .simulate import PocraSMModelSimulation
+
+
+
+class SpinUpCache:
+	"""
+	On-disk cache of equilibrium starting states.
+
+	A normal's weathers (for a whole rain-year, starting on June 1st) can be
+	given in any form accepted by <PocraSMModelSimulation>; unless a
+	<normal_name> identifying it is given, it is identified by a hash of its
+	weathers (which then have to be a <dict> of <list>s).
+	Spin-up stops when the state at the start of a year differs from that at
+	the start of the previous year by less than <tolerance>, or after <max_years>.
+	"""
+
+	field_params = ['wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth', 'slope']
+	# the time of the states: the start of the rain-year (12am to 1am on June 1st)
+	start_time = {'day_of_year': 152, 'hour_of_day': 1}
+
+	def __init__(s, directory, step_unit='DAY', latitude=None, elevation=None, longitude=None,
+		sowing_threshold=None, tolerance=1e-6, max_years=50
+	):
+		s.directory = directory
+		os.makedirs(directory, exist_ok=True)
+		s.step_unit = step_unit
+		s.latitude = latitude
+		s.elevation = elevation
+		s.longitude = longitude
+		s.sowing_threshold = sowing_threshold
+		s.tolerance = tolerance
+		s.max_years = max_years
+		s.memo = {}
+
+
+	@staticmethod
+	def get_normal_name(normal_weathers, normal_name=None):
+		if normal_name is not None:
+			return normal_name
+		return hashlib.sha256(json.dumps(normal_weathers, sort_keys=True).encode()).hexdigest()
+
+
+	def get_key(s, field, crop, normal_weathers, normal_name=None):
+		return {
+			'field': {p: float(getattr(field, p)) for p in s.field_params},
+			'crop': crop if isinstance(crop, str) else crop.name,
+			'normal': s.get_normal_name(normal_weathers, normal_name),
+			'step_unit': s.step_unit,
+			'latitude': s.latitude, 'longitude': s.longitude, 'elevation': s.elevation,
+			'sowing_threshold': s.sowing_threshold,
+		}
+
+
+	def compute_equilibrium_state(s, field, crop, normal_weathers):
+		"""Returns the equilibrium state and the number of years it took to reach it"""
+
+		state = {'sm1_frac': field.wp, 'sm2_frac': field.wp}
+		pet = sowing_date_offset = None
+		for year in range(1, s.max_years+1):
+			psmm = PocraSMModelSimulation(
+				field=field, step_unit=s.step_unit, weathers=normal_weathers,
+				latitude=s.latitude, elevation=s.elevation, longitude=s.longitude,
+				crop=crop, pet=pet,
+				model_state_at_start=dict(state, **s.start_time),
+				sowing_date_offset=sowing_date_offset, sowing_threshold=s.sowing_threshold
+			)
+			psmm.run()
+			# pet and sowing do not depend on the state; so they are reused for the following years
+			pet, sowing_date_offset = psmm.pet, psmm.sowing_date_offset
+
+			new_state = {p: psmm.model_state[p] for p in ['sm1_frac', 'sm2_frac']}
+			converged = all(abs(new_state[p] - state[p]) < s.tolerance for p in state)
+			state = new_state
+			if converged:
+				break
+
+		return state, year
+
+
+	def model_state_for(s, field, crop, normal_weathers, normal_name=None):
+		"""
+		Cached equilibrium state of the class, as a <model_state_at_start>: a <dict> with
+		'sm1_frac' and 'sm2_frac', and 'day_of_year' and 'hour_of_day' of June 1st, 12am
+		"""
+
+		key = s.get_key(field, crop, normal_weathers, normal_name)
+		key_hash = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+		if key_hash in s.memo:
+			return dict(s.memo[key_hash], **s.start_time)
+
+		path = os.path.join(s.directory, f'{key_hash}.json')
+		if os.path.exists(path):
+			with open(path) as f:
+				entry = json.load(f)
+		else:
+			state, years = s.compute_equilibrium_state(field, crop, normal_weathers)
+			entry = dict(key=key, years=years, **state)
+			temporary_path = f'{path}.{os.getpid()}.tmp'
+			with open(temporary_path, 'w') as f:
+				json.dump(entry, f)
+			os.replace(temporary_path, path)
+
+		s.memo[key_hash] = {p: entry[p] for p in ['sm1_frac', 'sm2_frac']}
+		return dict(s.memo[key_hash], **s.start_time)
+
+
+	def model_states_for_cells(s, cell_arrays, crop, normal_weathers, normal_name=None):
+		"""
+		Starting states of a batch of cells, given per-cell values of <field_params>
+		(as for <ParallelPocraSMModelSimulation>) and a crop or a per-cell list of crops.
+		Returns a <dict> with per-cell <list>s of 'sm1_frac' and 'sm2_frac',
+		and the common 'day_of_year' and 'hour_of_day' (as for <BatchSimulation>).
+		"""
+
+		normal_name = s.get_normal_name(normal_weathers, normal_name)
+		num_cells = len(cell_arrays['wp'])
+		states = dict({'sm1_frac': [None]*num_cells, 'sm2_frac': [None]*num_cells}, **s.start_time)
+		for i in range(num_cells):
+			record = {p: float(cell_arrays[p][i]) for p in s.field_params}
+			state = s.model_state_for(
+				Field(num_daily_phases=1 if s.step_unit == 'DAY' else 24, **record),
+				crop if isinstance(crop, str) else crop[i],
+				normal_weathers, normal_name
+			)
+			states['sm1_frac'][i] = state['sm1_frac']
+			states['sm2_frac'][i] = state['sm2_frac']
+		return states
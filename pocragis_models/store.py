@@ -0,0 +1,148 @@
+"""
+This module stores the results of regional runs on disk, for random access:
+one cell's full series, or one time-step across all the cells, is read
+from memory-mapped files without loading them.
+
+A store is a directory holding:
+1. metadata.json: the components, number of time-steps, step_unit, start_date,
+	crop, dtype and tile-shape
+2. cell_ids.npy: the sorted ids of the cells (the index), so that a cell's row
+	is found by binary search
+3. <component>.npy per component: its [cells x steps] values, in tiles of
+	(tile_cells x tile_steps), stored as a [cell-tiles x step-tiles x tile_cells x tile_steps]
+	array. A cell's series is then read in (steps / tile_steps) contiguous pieces,
+	and a time-step's values in (cells / tile_cells) tiles, a few cells per page.
+4. written.npy: whether each cell's results have been written (never for cells
+	whose simulation failed, whose results are nan)
+
+Writes go through shared memory-maps of the files, so that several processes
+can write into a store at once, as long as they write disjoint cells.
+
+Usage:
+>>> store = ResultStore.create('results', cell_ids, num_steps=365, step_unit='DAY', start_date=date(2023, 6, 1), crop='soyabean')
+>>> store.write_cells(cell_ids[:1000], {'aet': ..., 'gw_rech': ...}) # [cells x steps] arrays
+>>> store = ResultStore('results')
+>>> store.read_cell(cell_id)['gw_rech'] # [steps] array
+>>> store.read_time_slice(100)['aet'] # [cells] array, of the cells in the order of store.cell_ids
+"""
+
+import os
+import json
+from datetime import date
+
+import numpy as np
+
+from .models import Water
+from .simulate import PocraSMModelSimulation
+
+
+
+class ResultStore:
+	"""
+	An on-disk store of per-cell time series of components, opened from its <directory>
+	(read-only, or for writing with <mode> 'r+'); see <create> to create one.
+	"""
+
+	def __init__(s, directory, mode='r'):
+		s.directory = directory
+		with open(os.path.join(directory, 'metadata.json')) as f:
+			s.metadata = json.load(f)
+		s.components = s.metadata['components']
+		s.num_steps = s.metadata['num_steps']
+		s.step_unit = s.metadata['step_unit']
+		s.start_date = s.metadata['start_date'] and date.fromisoformat(s.metadata['start_date'])
+		s.crop = s.metadata['crop']
+		s.tile_cells, s.tile_steps = s.metadata['tile_shape']
+
+		s.cell_ids = np.load(os.path.join(directory, 'cell_ids.npy'))
+		s.num_cells = len(s.cell_ids)
+		s.arrays = {c: np.load(os.path.join(directory, c + '.npy'), mmap_mode=mode) for c in s.components}
+		s.written = np.load(os.path.join(directory, 'written.npy'), mmap_mode=mode)
+
+
+	@staticmethod
+	def create(directory, cell_ids, num_steps, components=Water.components,
+		step_unit='DAY', start_date=None, crop=None, tile_shape=(1024, 64), dtype=float
+	):
+		"""Creates a store (with nan values) for the cells of <cell_ids> (unique integers), and opens it for writing"""
+
+		cell_ids = np.sort(np.asarray(cell_ids, dtype=np.int64))
+		if np.any(cell_ids[1:] == cell_ids[:-1]):
+			raise ValueError('cell_ids should be unique')
+		tile_cells, tile_steps = tile_shape
+
+		os.makedirs(directory, exist_ok=True)
+		np.save(os.path.join(directory, 'cell_ids.npy'), cell_ids)
+		shape = (-(-len(cell_ids) // tile_cells), -(-num_steps // tile_steps), tile_cells, tile_steps)
+		for c in components:
+			a = np.lib.format.open_memmap(os.path.join(directory, c + '.npy'), mode='w+', dtype=dtype, shape=shape)
+			a[...] = np.nan
+			a.flush()
+			del a
+		np.save(os.path.join(directory, 'written.npy'), np.zeros(len(cell_ids), dtype=bool))
+
+		# (the metadata last, so that a store with metadata is complete)
+		with open(os.path.join(directory, 'metadata.json'), 'w') as f:
+			json.dump({
+				'components': list(components), 'num_steps': num_steps, 'step_unit': step_unit,
+				'start_date': start_date and start_date.isoformat(), 'crop': crop,
+				'tile_shape': [tile_cells, tile_steps], 'dtype': np.dtype(dtype).str,
+			}, f, indent=1)
+		return ResultStore(directory, mode='r+')
+
+
+	def get_rows(s, cell_ids):
+		"""Rows of the cells of <cell_ids> in the store"""
+
+		cell_ids = np.asarray(cell_ids, dtype=np.int64)
+		rows = np.searchsorted(s.cell_ids, cell_ids)
+		rows = np.minimum(rows, s.num_cells - 1)
+		if np.any(s.cell_ids[rows] != cell_ids):
+			raise KeyError(f'cells not in the store: {cell_ids[s.cell_ids[rows] != cell_ids][:10].tolist()}')
+		return rows
+
+
+	def write_cells(s, cell_ids, results, written=True):
+		"""
+		Writes the [cells x steps] series of components in <results> of the cells of <cell_ids>,
+		marking them as written (or as per <written>, per cell, e.g. not the cells that failed)
+		"""
+
+		rows = s.get_rows(cell_ids)
+		cell_tiles, rows_in_tile = np.divmod(rows, s.tile_cells)
+		padding = s.arrays[s.components[0]].shape[1] * s.tile_steps - s.num_steps
+		for c, values in results.items():
+			values = np.asarray(values).reshape(len(rows), s.num_steps)
+			values = np.pad(values, ((0, 0), (0, padding)), constant_values=np.nan)
+			s.arrays[c][cell_tiles, :, rows_in_tile, :] = values.reshape(len(rows), -1, s.tile_steps)
+		s.written[rows] = written
+
+
+	def flush(s):
+		for a in list(s.arrays.values()) + [s.written]:
+			if isinstance(a, np.memmap):
+				a.flush()
+
+
+	def read_cell(s, cell_id, components=None):
+		"""Series of the <components> (all by default) of a cell, as <dict> of [steps] arrays"""
+
+		cell_tile, row_in_tile = divmod(int(s.get_rows([cell_id])[0]), s.tile_cells)
+		return {
+			c: np.array(s.arrays[c][cell_tile, :, row_in_tile, :]).reshape(-1)[:s.num_steps]
+				for c in (components or s.components)
+		}
+
+
+	def read_time_slice(s, step, components=None):
+		"""Values of the <components> (all by default) at a time-step, as <dict> of [cells] arrays (in the order of <cell_ids>)"""
+
+		step_tile, step_in_tile = divmod(step, s.tile_steps)
+		return {
+			c: np.array(s.arrays[c][:, step_tile, :, step_in_tile]).reshape(-1)[:s.num_cells]
+				for c in (components or s.components)
+		}
+
+
+	def get_date_of_step(s, i):
+		return PocraSMModelSimulation.get_date_of_step(s.step_unit, s.start_date, i)
@@ -0,0 +1,103 @@
+"""
+This module emits structured telemetry of long runs (see <BatchSimulation>'s and
+<ParallelPocraSMModelSimulation>'s <telemetry>): their progress, throughput,
+memory high-water mark, estimated time to completion, and the cells that failed.
+
+Every record is a <dict> with the 'time' (seconds since the epoch), the 'job'
+and the 'event', one of:
+1. 'start': with the job's 'num_cells' and 'num_steps'
+2. 'progress' (at most every <interval> seconds): with the 'fraction_done',
+	'elapsed' and 'eta' (seconds), 'max_rss_mb' (of the process and its
+	finished children), and the runner's throughput (e.g. 'cells_per_second',
+	'step_throughput' in cell-steps per second, 'queue_depth')
+3. 'failed': with the failed 'cell', its 'inputs' and the 'error'
+4. 'end': with the 'elapsed' seconds and the 'failed_cells'
+Records are appended to a JSON-lines file at <path>, and/or passed to a <callback>.
+
+Usage:
+>>> telemetry = Telemetry('run.jsonl', interval=30)
+>>> ParallelPocraSMModelSimulation(..., telemetry=telemetry).run()
+>>> telemetry.failed_cells # [(cell, inputs, error)]
+$ tail -f run.jsonl
+"""
+
+import os
+import json
+import time
+
+try:
+	import resource
+except ImportError: # (not on windows)
+	resource = None
+
+
+
+class Telemetry:
+	"""Emitter of a job's telemetry records, to a JSON-lines file at <path> and/or a <callback>"""
+
+	def __init__(s, path=None, callback=None, interval=10, job=None):
+		s.path = path
+		s.callback = callback
+		s.interval = interval
+		s.job = job or f'{os.getpid()}-{int(time.time())}'
+		s.start_time = None
+		s.last_progress_time = None
+		s.failed_cells = []
+
+
+	@staticmethod
+	def get_max_rss_mb():
+		"""Memory high-water mark of the process and of its (finished) children"""
+
+		if resource is None:
+			return None
+		return sum(
+			resource.getrusage(who).ru_maxrss for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]
+		) / 1024 # (kilobytes on linux)
+
+
+	def emit(s, event, **fields):
+
+		record = dict(time=time.time(), job=s.job, event=event, **fields)
+		if s.path is not None:
+			with open(s.path, 'a') as f:
+				f.write(json.dumps(record, default=str) + '\n')
+		if s.callback is not None:
+			s.callback(record)
+		return record
+
+
+	def start(s, num_cells, num_steps, **fields):
+
+		s.start_time = s.last_progress_time = time.time()
+		s.failed_cells = []
+		s.emit('start', num_cells=num_cells, num_steps=num_steps, **fields)
+
+
+	def is_due(s):
+		"""Whether <interval> seconds have passed since the last progress"""
+		return time.time() - s.last_progress_time >= s.interval
+
+
+	def progress(s, fraction_done, force=False, **fields):
+		"""Emits the progress, if it is due (or if <force>)"""
+
+		if not (force or s.is_due()):
+			return
+		now = s.last_progress_time = time.time()
+		elapsed = now - s.start_time
+		s.emit('progress',
+			fraction_done=fraction_done, elapsed=elapsed,
+			eta=elapsed * (1 - fraction_done) / fraction_done if fraction_done > 0 else None,
+			max_rss_mb=s.get_max_rss_mb(), **fields
+		)
+
+
+	def failed(s, cell, inputs, error):
+
+		s.failed_cells.append((cell, inputs, error))
+		s.emit('failed', cell=cell, inputs=inputs, error=error)
+
+
+	def end(s, **fields):
+		s.emit('end', elapsed=time.time() - s.start_time, failed_cells=[c for c, _, _ in s.failed_cells], **fields)
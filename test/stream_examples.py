@@ -29,16 +29,12 @@ for row in drainage_data:
 	connected_streams[row['stream_id']].sources.extend([
 		connected_streams[v.strip()] for v in row['sources'].split(',') if v.strip() != ''
 	])
-	connected_streams[row['stream_id']].runoffs = [float(row[str(i+1)]) for i in range(total_time_steps)]
 
 drainage = Drainage(list(connected_streams.values()))
 
-for i in range(total_time_steps):
-	
-	for cs in drainage.connected_streams:
-		cs.next_runoff_per_area_in_watershed = cs.runoffs[i]
-
-	drainage.compute_drainage_model_transients_for_latest_time_step()
+# [streams x steps] runoffs; for large inputs, see <pocragis_models.drainage_io>
+runoffs = [[float(row[str(i+1)]) for i in range(total_time_steps)] for row in drainage_data]
+drainage.run(runoffs)
 
 
 with open('example_drainage_output.csv', 'w', newline='') as f:
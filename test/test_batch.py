@@ -0,0 +1,129 @@
+import os
+from datetime import date
+
+import numpy as np
+
+from pocragis_models import lookups
+from pocragis_models.models import Field, Crop, Water
+from pocragis_models.batch import BatchSimulation, PocraSMModelStepper
+from pocragis_models.ensemble import EnsembleSimulation
+from pocragis_models.precision import compare_precision, REFERENCE_FIELDS_AND_CROPS
+
+
+# (a deep field, and a field shallower than the crop's roots)
+fields = [Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 2), Field('loamy', 'shallow (10 to 25 cm)', 'kharif', 8)]
+
+
+def new_batch_simulation(num_days=365, **kwargs):
+	rng = np.random.default_rng(0)
+	return BatchSimulation(
+		soil_texture=np.array(['clayey', 'loamy']), soil_depth_category=np.array(['deep to very deep (> 50 cm)'] * 2),
+		lulc_type=np.array(['kharif'] * 2), slope=np.array([2.0, 5.0]),
+		weathers={'rain': rng.gamma(0.3, 10, (2, num_days)), 'et0': np.full(num_days, 4.0)},
+		**kwargs
+	)
+
+
+def test_stepper_matches_water_balance():
+	crop = Crop('cotton')
+	steppers = [PocraSMModelStepper.for_field_and_crop(f, crop) for f in fields]
+	rng = np.random.default_rng(0)
+	rain, pet = rng.gamma(0.3, 10, 200), rng.uniform(0, 6, 200)
+
+	for f, stepper in zip(fields, steppers):
+		state, out = stepper.new_state(), stepper.new_output()
+		l1, l2 = stepper.l1, stepper.l2
+		sm = {'sm1_frac': f.wp, 'sm2_frac': f.wp}
+		for i in range(len(rain)):
+			stepper.step(state, rain[i], pet[i], out)
+			w, sm = Water.run_pocra_sm_model_for_time_step(
+				l1, l2, sm['sm1_frac'], sm['sm2_frac'],
+				f.wp, f.fc, f.sat, f.smax, f.w1, f.w2, f.perc_factor, crop.depletion_factor, rain[i], pet[i]
+			)
+			assert np.allclose(out, [getattr(w, c) for c in Water.components], rtol=1e-9, atol=1e-9)
+			assert np.allclose(state, [sm['sm1_frac'], sm['sm2_frac']], rtol=1e-12)
+
+
+def test_stepper_steps_points_at_once():
+	crop = Crop('cotton')
+	points = PocraSMModelStepper(*[
+		np.array([getattr(PocraSMModelStepper.for_field_and_crop(f, crop), a) for f in fields])
+			for a in ['l1', 'l2', 'wp', 'fc', 'sat', 'smax', 'w1', 'w2', 'perc_factor', 'depletion_factor']
+	])
+	lone = [PocraSMModelStepper.for_field_and_crop(f, crop) for f in fields]
+	state, out = points.new_state(), points.new_output()
+	lone_states, lone_out = [p.new_state() for p in lone], [p.new_output() for p in lone]
+	rng = np.random.default_rng(1)
+	for rain, pet in zip(rng.gamma(0.3, 10, (100, 2)), rng.uniform(0, 6, (100, 2))):
+		points.step(state, rain, pet, out)
+		for k, p in enumerate(lone):
+			p.step(lone_states[k], rain[k], pet[k], lone_out[k])
+			assert out[:, k].tolist() == lone_out[k].tolist()
+
+
+def test_rabi_phase_cut_short_keeps_daily_rate():
+	# soyabean (105 days) sown on day 250 leaves 10 days of the rain-year for the rabi phase
+	bs = new_batch_simulation(crop='soyabean', rabi_crop='gram', sowing_date_offset=250)
+	bs.run()
+	daily_rabi_pet = lookups.dict_rabi_crop['gram'] / bs.rabi_season_length
+	assert np.all(bs.rabi_length == 10)
+	assert np.allclose(bs.rabi_pet.sum(axis=0), 10 * daily_rabi_pet)
+	assert np.allclose(bs.rabi_pet.max(), daily_rabi_pet)
+
+
+def test_rabi_phase_follows_leap_rain_years():
+	# (the rain-year from June 1st, 2023 has 366 days)
+	bs = new_batch_simulation(num_days=366, crop='soyabean', rabi_crop='gram', sowing_date_offset=250, start_date=date(2023, 6, 1))
+	bs.run()
+	assert np.all(bs.rabi_length == 11)
+
+
+def test_ensemble_percentiles_match_the_members():
+	rng = np.random.default_rng(2)
+	weathers = {'rain': rng.gamma(0.3, 10, 200), 'et0': np.full(200, 4.0)}
+	es = EnsembleSimulation(
+		fields[0], 'soyabean', weathers, perturbations={'wp': 0.1, 'fc': 0.1, 'cn_val': 0.05, 'kc': 0.15},
+		num_members=20, components=['gw_rech', 'deficit'], seed=0
+	)
+	es.run()
+	members = es.members
+	assert np.all((members['wp'] < members['fc']) & (members['fc'] < members['sat']))
+
+	bs = BatchSimulation(
+		field={p: members[p] for p in EnsembleSimulation.field_params}, weathers=weathers, crop='soyabean',
+		crop_properties={'root_depth': members['root_depth'], 'kc_factor': members['kc_factor']}
+	)
+	bs.run()
+	for c, values in [('gw_rech', bs.results['gw_rech']), ('deficit', bs.results['pet'] - bs.results['aet'])]:
+		assert np.allclose(es.step_percentiles[c], np.percentile(values, es.percentiles, axis=0))
+		assert np.allclose(es.total_percentiles[c], np.percentile(values.sum(axis=1), es.percentiles))
+
+
+def test_scenarios_match_batches_of_each_scenario():
+	rng = np.random.default_rng(3)
+	rain = rng.gamma(0.3, 10, (3, 2, 200))
+	temps = {'temp_daily_min': np.full(200, 22.0), 'temp_daily_avg': np.full(200, 27.0), 'temp_daily_max': np.full(200, 32.0)}
+	cells = dict(
+		soil_texture=np.array(['clayey', 'loamy']), soil_depth_category=np.array(['deep to very deep (> 50 cm)'] * 2),
+		lulc_type=np.array(['kharif'] * 2), slope=np.array([2.0, 5.0]), crop='soyabean', latitude=np.array([20.0, 21.0])
+	)
+	bs = BatchSimulation(weathers=dict(rain=rain, **{p: np.tile(v, (3, 1)) for p, v in temps.items()}), scenarios=True, **cells)
+	bs.run()
+	for k in range(3):
+		lone = BatchSimulation(weathers=dict(rain=rain[k], **temps), **cells)
+		lone.run()
+		for c in ['aet', 'gw_rech', 'avail_sm']:
+			assert np.allclose(bs.results[c][k], lone.results[c], rtol=1e-12, atol=1e-12)
+
+
+def test_float32_mode_stays_close_to_float64():
+	results = {}
+	for dtype in [np.float64, np.float32]:
+		bs = new_batch_simulation(crop='soyabean', dtype=dtype)
+		results[dtype] = bs.run()
+	for c in ['aet', 'gw_rech', 'avail_sm']:
+		assert results[np.float32][c].dtype == np.float32
+		assert np.allclose(results[np.float32][c], results[np.float64][c], rtol=1e-4, atol=1e-3)
+
+	report = compare_precision(os.path.join(os.path.dirname(__file__), 'Kada_example_output.csv'), REFERENCE_FIELDS_AND_CROPS[:1])
+	assert all(d['max_seasonal_total_relative_deviation'] < 1e-3 for d in report.values())
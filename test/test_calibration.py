@@ -0,0 +1,24 @@
+import numpy as np
+
+from pocragis_models.models import Field
+from pocragis_models.simulate import PocraSMModelSimulation
+from pocragis_models.calibration import Calibration
+
+
+def test_evaluate_with_a_given_sowing_date_offset():
+	rng = np.random.default_rng(0)
+	rain = rng.gamma(0.3, 10, 365).tolist()
+	et0 = [4.0] * 365
+	field = Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3)
+	psmm = PocraSMModelSimulation(
+		field=field, weathers={'rain': rain, 'et0': et0}, crop='soyabean', sowing_date_offset=30
+	)
+	psmm.run()
+
+	calibration = Calibration(
+		field, 'soyabean', {'rain': np.array(rain), 'et0': np.array(et0)},
+		observations={'aet': psmm.aet}, parameters={'cn_val': (60, 95)}, loss='rmse', sowing_date_offset=30
+	)
+	losses = calibration.evaluate({'cn_val': [field.cn_val, 60]})
+	assert calibration.sowing_date_offset == 30
+	assert losses[0] < 1e-9 < losses[1]
@@ -0,0 +1,73 @@
+import os
+import sys
+import csv
+import subprocess
+
+import numpy as np
+
+from pocragis_models.cli import main
+from pocragis_models.simulate import PocraSMModelSimulation
+from pocragis_models.batch import BatchSimulation
+from pocragis_models.store import ResultStore
+
+
+rng = np.random.default_rng(0)
+rain, et0 = rng.gamma(0.3, 10, 120), np.full(120, 4.0)
+
+
+def test_simulate_writes_the_simulation_results(tmp_path):
+	with open(tmp_path / 'weathers.csv', 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['date', 'rain', 'et0'])
+		writer.writerows([['-', r, e] for r, e in zip(rain, et0)])
+	main([
+		'simulate', '--weathers', str(tmp_path / 'weathers.csv'), '--soil-texture', 'clayey',
+		'--soil-depth-category', 'deep to very deep (> 50 cm)', '--lulc-type', 'kharif', '--slope', '3',
+		'--crop', 'soyabean', '--components', 'aet', 'gw_rech', '--output', str(tmp_path / 'results.csv')
+	])
+
+	psmm = PocraSMModelSimulation(
+		soil_texture='clayey', soil_depth_category='deep to very deep (> 50 cm)', lulc_type='kharif', slope=3,
+		weathers={'rain': rain.tolist(), 'et0': et0.tolist()}, crop='soyabean'
+	)
+	psmm.run()
+	with open(tmp_path / 'results.csv', newline='') as f:
+		rows = list(csv.DictReader(f))
+	assert [float(r['aet']) for r in rows] == psmm.aet
+	assert [float(r['gw_rech']) for r in rows] == psmm.gw_rech
+
+
+def test_batch_writes_the_batch_results(tmp_path):
+	field = {'soil_depth_category': 'deep to very deep (> 50 cm)', 'lulc_type': 'kharif'}
+	cells = [
+		dict(cell_id=7, soil_texture='clayey', slope=2, crop='soyabean', **field),
+		dict(cell_id=3, soil_texture='loamy', slope=5, crop='cotton', **field),
+	]
+	with open(tmp_path / 'cells.csv', 'w', newline='') as f:
+		writer = csv.DictWriter(f, fieldnames=list(cells[0]))
+		writer.writeheader()
+		writer.writerows(cells)
+	weathers = {'rain': np.stack([rain, rain[::-1]]), 'et0': et0}
+	np.savez(tmp_path / 'weathers.npz', **weathers)
+	main([
+		'batch', '--cells', str(tmp_path / 'cells.csv'), '--weathers', str(tmp_path / 'weathers.npz'),
+		'--components', 'aet', 'gw_rech', '--output', str(tmp_path / 'results.npz'), '--store', str(tmp_path / 'store')
+	])
+
+	bs = BatchSimulation(
+		**{p: np.array([c[p] for c in cells]) for p in ['soil_texture', 'soil_depth_category', 'lulc_type', 'crop']},
+		slope=np.array([2.0, 5.0]), weathers=weathers
+	)
+	bs.run()
+	with np.load(tmp_path / 'results.npz') as results:
+		assert sorted(results.files) == ['aet', 'gw_rech']
+		assert results['aet'].tolist() == bs.results['aet'].tolist()
+	assert ResultStore(tmp_path / 'store').read_cell(3)['gw_rech'].tolist() == bs.results['gw_rech'][1].tolist()
+
+
+def test_starts_without_numpy():
+	loaded = subprocess.run(
+		[sys.executable, '-c', "import sys; import pocragis_models.cli; print('numpy' in sys.modules)"],
+		capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	)
+	assert loaded.stdout.strip() == 'False'
@@ -0,0 +1,178 @@
+import os
+import csv
+import random
+
+import numpy as np
+
+from pocragis_models.models import Drainage
+from pocragis_models.routing import DrainageNetwork
+from pocragis_models.drainage_io import (
+	read_runoffs, convert_runoffs_csv_to_npy, iterate_chunks, NpyTransientSink, CsvTransientSink
+)
+
+
+def new_drainage(num_streams=30, seed=0):
+	"""A random tree of streams, each draining into an earlier one (stream 0 is the outlet)"""
+
+	rng = random.Random(seed)
+	connected_streams = [
+		Drainage.ConnectedStream(
+			Drainage.Stream.Channel(
+				rng.uniform(50, 500), rng.uniform(50, 500), rng.uniform(2, 20), rng.uniform(1e-4, 1e-2),
+				0.5, 1, 5, 0.1, 0.05, 0.3, 1
+			),
+			[Drainage.Stream.Transient(volume_out=0, volume_stored_end_timestep=0)]
+		)
+		for _ in range(num_streams)
+	]
+	for i in range(1, num_streams):
+		connected_streams[rng.randrange(i)].sources.append(connected_streams[i])
+	return Drainage(connected_streams)
+
+
+def new_runoffs(num_streams=30, num_steps=40, seed=1):
+	"""[streams x steps] runoffs, with a few wet spells between dry ones"""
+
+	rng = np.random.default_rng(seed)
+	wet = (np.arange(num_steps) % 20) < 3
+	return np.where(wet & (rng.random((num_streams, num_steps)) < 0.5), rng.uniform(0, 5, (num_streams, num_steps)), 0.0)
+
+
+def test_inactive_streams_match_the_stream_model():
+	runoffs = new_runoffs()
+	drainage = new_drainage()
+	streams = drainage.connected_streams
+	# (some headwater streams without runoff, which stay inactive)
+	dry = [k for k, cs in enumerate(streams) if not cs.sources][:3]
+	runoffs[dry] = 0
+	drainage.run(runoffs)
+
+	latest = [cs.transients[0] for cs in streams]
+	for i in range(runoffs.shape[1]):
+		expected = []
+		for k, cs in enumerate(streams):
+			ch = cs.channel
+			expected.append(Drainage.Stream.run_stream_model_for_time_step(
+				runoffs[k, i], ch.watershed_area,
+				latest[k].volume_stored_end_timestep, sum(latest[streams.index(css)].volume_out for css in cs.sources),
+				ch.length, ch.width_bottom, ch.channel_slope, ch.fraction_deep_aquifer,
+				ch.zch, ch.hydraulic_conductivity, ch.evaporation_coefficient,
+				ch.mannigs, ch.bank_flow_recession, ch.potential_evaporation,
+				Drainage.Time_step_duration
+			))
+		for cs, transient in zip(streams, expected):
+			assert vars(cs.transients[i+1]) == vars(transient)
+		latest = expected
+	# (whose transients, after the first one from the integer zeros of the initial transients, are shared)
+	for k in dry:
+		assert all(t is streams[k].transients[2] for t in streams[k].transients[2:])
+
+
+def test_channel_changes_are_honoured():
+	drainage = new_drainage(num_streams=1)
+	cs = drainage.connected_streams[0]
+	drainage.run(np.array([[0.0, 2.0]]))
+	cs.channel.width_bottom = 40.0
+	drainage.run(np.array([[0.0, 2.0]]))
+
+	ch = cs.channel
+	storage = cs.transients[-3].volume_stored_end_timestep
+	for i, runoff in enumerate([0.0, 2.0]):
+		expected = Drainage.Stream.run_stream_model_for_time_step(
+			runoff, ch.watershed_area, storage, 0,
+			ch.length, ch.width_bottom, ch.channel_slope, ch.fraction_deep_aquifer,
+			ch.zch, ch.hydraulic_conductivity, ch.evaporation_coefficient,
+			ch.mannigs, ch.bank_flow_recession, ch.potential_evaporation,
+			Drainage.Time_step_duration
+		)
+		assert vars(cs.transients[-2 + i]) == vars(expected)
+		storage = expected.volume_stored_end_timestep
+
+
+def test_network_matches_drainage():
+	runoffs = new_runoffs()
+	drainage = new_drainage()
+	network = DrainageNetwork.from_drainage(drainage)
+	drainage.run(runoffs)
+	routed = network.run(runoffs, fields=('volume_out', 'volume_stored_end_timestep', 'travel_time'))
+
+	for f in routed:
+		expected = [[getattr(t, f) for t in cs.transients[1:]] for cs in drainage.connected_streams]
+		np.testing.assert_allclose(routed[f], expected, rtol=1e-12, atol=1e-12)
+
+
+def test_substeps_converge():
+	runoffs = new_runoffs()
+	drainage = new_drainage()
+	routed = {}
+	for n in [8, 16, 32]:
+		network = DrainageNetwork.from_drainage(drainage)
+		network.max_substeps = n
+		routed[n] = network.run(runoffs, fields=('volume_out', 'volume_stored_end_timestep', 'transmission_loss'))
+		assert max(network.num_substeps) == n
+
+	outflow = {n: r['volume_out'][0].sum() for n, r in routed.items()}
+	transmission_loss = {n: r['transmission_loss'].sum() for n, r in routed.items()}
+	assert abs(outflow[16] - outflow[8]) < 1e-3 * outflow[8]
+	assert abs(outflow[32] - outflow[16]) < 1e-3 * outflow[16]
+	assert abs(transmission_loss[32] - transmission_loss[8]) < 0.1 * transmission_loss[8]
+	# (nor does any storage go negative)
+	for r in routed.values():
+		assert np.all(r['volume_stored_end_timestep'] >= 0)
+
+
+def test_partitioned_routing_matches_whole_network():
+	runoffs = new_runoffs(num_streams=60)
+	drainage = new_drainage(num_streams=60)
+	whole = DrainageNetwork.from_drainage(drainage)
+	routed = whole.run(runoffs)
+
+	network = DrainageNetwork.from_drainage(drainage)
+	partitions = network.partition(8)
+	assert sorted(i for streams in partitions for i in streams) == list(range(60))
+	assert len(partitions) > 3
+	partitioned = network.run_partitioned(runoffs, partition_size=8, num_workers=2)
+	for f in routed:
+		np.testing.assert_allclose(partitioned[f], routed[f], rtol=1e-12, atol=1e-9)
+	np.testing.assert_allclose(network.storage, whole.storage, rtol=1e-12, atol=1e-9)
+
+
+def test_runoffs_are_streams_by_steps_throughout(tmp_path):
+	input_path = os.path.join(os.path.dirname(__file__), 'example_drainage_input.csv')
+	stream_ids, runoffs = read_runoffs(input_path)
+	convert_runoffs_csv_to_npy(input_path, tmp_path / 'example.npy')
+	assert np.load(tmp_path / 'example.npy').tolist() == runoffs.tolist()
+	assert runoffs.shape == (len(stream_ids), 9)
+
+	np.save(tmp_path / 'runoffs.npy', new_runoffs())
+	runoffs = np.load(tmp_path / 'runoffs.npy', mmap_mode='r')
+	drainage = new_drainage()
+	network = DrainageNetwork.from_drainage(drainage)
+	with NpyTransientSink(tmp_path / 'npy', 30, fields=['volume_out']) as npy_sink, \
+		CsvTransientSink(tmp_path / 'csv', range(30), fields=['volume_out']) as csv_sink:
+		for sink, chunks in [(npy_sink, iterate_chunks(runoffs, 7)), (csv_sink, iterate_chunks(runoffs, 40))]:
+			drainage = new_drainage()
+			drainage.run(chunks, sink=sink, keep_transients=False)
+			assert all(len(cs.transients) == 1 for cs in drainage.connected_streams)
+	routed = network.run(iterate_chunks(runoffs, 7), fields=['volume_out'])
+
+	assert routed['volume_out'].shape == runoffs.shape
+	volume_out = np.load(tmp_path / 'npy' / 'volume_out.npy')
+	np.testing.assert_allclose(volume_out.T, routed['volume_out'], rtol=1e-12, atol=1e-12)
+	with open(tmp_path / 'csv' / 'volume_out.csv', newline='') as f:
+		rows = list(csv.reader(f))[1:]
+	assert [[float(v) for v in row[1:]] for row in rows] == volume_out.tolist()
+
+
+def test_scenarios_match_lone_runs():
+	drainage = new_drainage()
+	scenario_runoffs = np.stack([new_runoffs(seed=seed) for seed in range(3)])
+	# (and the runoffs shared by all the scenarios, broadcast)
+	for runoffs in [scenario_runoffs, scenario_runoffs[0]]:
+		scenarios = DrainageNetwork.from_drainage(drainage, num_scenarios=3)
+		routed = scenarios.run(runoffs, fields=['volume_out', 'volume_stored_end_timestep'])
+		assert routed['volume_out'].shape == (3, 30, 40)
+		for k in range(3):
+			lone = DrainageNetwork.from_drainage(drainage).run(np.broadcast_to(runoffs, scenario_runoffs.shape)[k])
+			for f in lone:
+				np.testing.assert_array_equal(routed[f][k], lone[f])
@@ -0,0 +1,63 @@
+import numpy as np
+
+from pocragis_models.models import Field
+from pocragis_models.simulate import PocraSMModelSimulation
+from pocragis_models.incremental import IncrementalPocraSMModelSimulation
+
+
+rng = np.random.default_rng(0)
+weathers = {
+	'rain': rng.gamma(0.3, 10, 365).tolist(), 'temp_daily_min': rng.uniform(18, 24, 365).tolist(),
+	'temp_daily_avg': rng.uniform(25, 29, 365).tolist(), 'temp_daily_max': rng.uniform(30, 36, 365).tolist()
+}
+field_kwargs = dict(soil_texture='clayey', soil_depth_category='deep to very deep (> 50 cm)', lulc_type='kharif', slope=3)
+
+
+def assert_same_results(ipsmm, **changed_kwargs):
+	kwargs = dict(field_kwargs, weathers={p: list(v) for p, v in weathers.items()}, crop='soyabean', latitude=20)
+	kwargs.update(changed_kwargs)
+	psmm = PocraSMModelSimulation(**kwargs)
+	psmm.run()
+	for c in ['aet', 'gw_rech', 'avail_sm', 'pet']:
+		assert getattr(ipsmm, c) == getattr(psmm, c)
+	assert ipsmm.sowing_date_offset == psmm.sowing_date_offset
+
+
+def test_reruns_match_fresh_runs():
+	ipsmm = IncrementalPocraSMModelSimulation(
+		checkpoint_interval=30, **field_kwargs,
+		weathers={p: list(v) for p, v in weathers.items()}, crop='soyabean', latitude=20
+	)
+	assert ipsmm.run() == 0
+	assert_same_results(ipsmm)
+
+	# (a day's rain, late in the year, resumes from the checkpoint before it)
+	ipsmm.set_weather(310, rain=25.0)
+	weathers['rain'][310] = 25.0
+	assert ipsmm.run() == 300
+	assert_same_results(ipsmm)
+
+	# (a day's temperature changes its pet, and so resumes, only while the crop stands)
+	ipsmm.set_weather(70, temp_daily_max=40.0)
+	weathers['temp_daily_max'][70] = 40.0
+	assert ipsmm.run() == 60
+	assert_same_results(ipsmm)
+	ipsmm.set_weather(250, temp_daily_max=40.0)
+	weathers['temp_daily_max'][250] = 40.0
+	assert ipsmm.run() == 365
+	assert_same_results(ipsmm)
+
+	ipsmm.set_crop('cotton')
+	ipsmm.run()
+	assert_same_results(ipsmm, crop='cotton')
+
+	ipsmm.set_sowing_date_offset(40)
+	ipsmm.run()
+	assert_same_results(ipsmm, crop='cotton', sowing_date_offset=40)
+
+	ipsmm.set_field(field=Field('loamy', 'deep to very deep (> 50 cm)', 'kharif', 3))
+	assert ipsmm.run() == 0
+	assert_same_results(ipsmm, crop='cotton', sowing_date_offset=40, soil_texture='loamy')
+
+	# (nothing changed)
+	assert ipsmm.run() == 365
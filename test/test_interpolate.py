@@ -0,0 +1,34 @@
+import numpy as np
+
+from pocragis_models.interpolate import StationIndex
+
+
+def brute_force_distances(index, latitudes, longitudes, k):
+	x, y = index.project(latitudes, longitudes)
+	d = np.hypot(x[:, None] - index.x[None, :], y[:, None] - index.y[None, :])
+	return np.sort(d, axis=1)[:, :k]
+
+
+def test_query_matches_brute_force():
+	rng = np.random.default_rng(0)
+	# (perfect squares among them, for which the farthest station lies on a bucket edge)
+	for num_stations in [1, 2, 9, 25, 36, 50, 100]:
+		latitudes = rng.uniform(18, 21, num_stations)
+		longitudes = rng.uniform(74, 78, num_stations)
+		index = StationIndex(latitudes, longitudes)
+		point_latitudes = rng.uniform(17.5, 21.5, 500)
+		point_longitudes = rng.uniform(73.5, 78.5, 500)
+		for k in [1, 4, 5]:
+			distances, indices = index.query(point_latitudes, point_longitudes, k)
+			expected = brute_force_distances(index, point_latitudes, point_longitudes, min(k, num_stations))
+			assert np.allclose(distances, expected)
+			x, y = index.project(point_latitudes, point_longitudes)
+			assert np.allclose(np.hypot(x[:, None] - index.x[indices], y[:, None] - index.y[indices]), distances)
+
+
+def test_query_of_colocated_stations():
+	index = StationIndex([20.0, 20.0, 20.0], [76.0, 76.0, 76.0])
+	distances, indices = index.query([19.0, 20.0, 23.0], [75.0, 76.0, 80.0], k=5)
+	assert distances.shape == (3, 3)
+	assert np.allclose(distances, brute_force_distances(index, np.array([19.0, 20.0, 23.0]), np.array([75.0, 76.0, 80.0]), 3))
+	assert sorted(indices[0].tolist()) == [0, 1, 2]
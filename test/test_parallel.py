@@ -0,0 +1,66 @@
+import numpy as np
+
+from pocragis_models.models import Field
+from pocragis_models.simulate import PocraSMModelSimulation
+from pocragis_models.telemetry import Telemetry
+from pocragis_models.store import ResultStore
+from pocragis_models.parallel import ParallelPocraSMModelSimulation, SharedArrays
+
+
+def new_cells(num_cells=12, num_steps=365):
+	rng = np.random.default_rng(0)
+	cell_arrays = {
+		'wp': np.full(num_cells, 0.2), 'fc': np.full(num_cells, 0.35), 'sat': np.full(num_cells, 0.45),
+		'ksat': np.full(num_cells, 10.0), 'cn_val': rng.uniform(60, 90, num_cells),
+		'soil_depth': np.full(num_cells, 1.0), 'slope': np.full(num_cells, 3.0),
+		'cell_id': np.arange(num_cells) * 7 + 3,
+	}
+	weathers = {'rain': rng.gamma(0.3, 10, (num_cells, num_steps)), 'et0': np.full(num_steps, 5.0)}
+	return cell_arrays, weathers
+
+
+def test_results_match_lone_simulations():
+	cell_arrays, weathers = new_cells()
+	ppsmm = ParallelPocraSMModelSimulation(cell_arrays, weathers, 'soyabean', num_workers=2, cells_per_task=5)
+	ppsmm.run()
+
+	for cell in [0, 7, 11]:
+		psmm = PocraSMModelSimulation(
+			field=Field(**{p: float(cell_arrays[p][cell]) for p in ['wp', 'fc', 'sat', 'ksat', 'cn_val', 'soil_depth', 'slope']}),
+			weathers={'rain': weathers['rain'][cell].tolist(), 'et0': weathers['et0'].tolist()}, crop='soyabean'
+		)
+		psmm.run()
+		for c in ['aet', 'gw_rech', 'avail_sm', 'pet']:
+			assert ppsmm.results[c][cell].tolist() == getattr(psmm, c)
+
+
+def test_shared_arrays_are_attached_without_copies(tmp_path):
+	arrays = SharedArrays.create({'rain': np.arange(6.0).reshape(2, 3), 'out': ((2, 3), float)}, directory=tmp_path)
+	try:
+		attached = SharedArrays.attach(arrays.spec)
+		attached['out'][1] = attached['rain'][1]
+		assert arrays['out'].tolist() == [[0, 0, 0], [3, 4, 5]]
+		attached.close()
+	finally:
+		arrays.unlink()
+
+
+def test_failed_cells_are_recorded_and_not_marked_written(tmp_path):
+	cell_arrays, weathers = new_cells()
+	# (cell 5's crop does not exist)
+	cell_arrays['crop_index'] = np.zeros(12, dtype=int)
+	cell_arrays['crop_index'][5] = 1
+	records = []
+	store = ResultStore.create(tmp_path / 'store', cell_arrays['cell_id'], 365, components=['aet', 'gw_rech'])
+	ppsmm = ParallelPocraSMModelSimulation(
+		cell_arrays, weathers, ['soyabean', 'nonexistent crop'], num_workers=2, cells_per_task=4,
+		store=store, telemetry=Telemetry(callback=records.append, interval=0)
+	)
+	ppsmm.run()
+
+	assert [c for c, _, _ in ppsmm.failed_cells] == [38]
+	assert [r['cell'] for r in records if r['event'] == 'failed'] == [38]
+	store = ResultStore(tmp_path / 'store')
+	assert store.written.tolist() == [k != 5 for k in range(12)]
+	assert np.isnan(store.read_cell(38)['aet']).all()
+	assert not np.isnan(store.read_cell(3)['aet']).any()
@@ -0,0 +1,59 @@
+from datetime import date
+
+import numpy as np
+
+from pocragis_models.batch import BatchSimulation
+from pocragis_models.simulate import PocraSMModelSimulation
+
+
+rng = np.random.default_rng(0)
+cells = dict(
+	soil_texture=np.array(['clayey', 'loamy']), soil_depth_category=np.array(['deep to very deep (> 50 cm)'] * 2),
+	lulc_type=np.array(['kharif'] * 2), slope=np.array([2.0, 5.0]), crop=np.array(['soyabean', 'cotton'])
+)
+
+
+def test_daily_and_monthly_totals_match_plain_sums():
+	num_days = 61
+	bs = BatchSimulation(
+		**cells, step_unit='HOUR', weathers={'rain': rng.gamma(0.05, 10, (2, num_days*24)), 'et0': np.full(num_days*24, 0.2)},
+		start_date=date(2023, 7, 15)
+	)
+	bs.run()
+	aet = bs.results['aet']
+	assert np.shares_memory(bs.results.hourly_by_day('aet'), aet)
+	daily_aet = bs.results.daily('aet')
+	assert np.allclose(daily_aet, [[aet[k, 24*d:24*(d+1)].sum() for d in range(num_days)] for k in range(2)])
+	assert np.allclose(bs.results.daily('avail_sm'), bs.results['avail_sm'].reshape(2, num_days, 24).mean(axis=-1))
+
+	# (July 15th to September 13th)
+	months, monthly_aet = bs.results.monthly('aet')
+	assert months.tolist() == [7, 8, 9]
+	assert np.allclose(monthly_aet, np.add.reduceat(daily_aet, [0, 17, 48], axis=-1))
+
+
+def test_crop_stage_totals_match_plain_sums():
+	bs = BatchSimulation(**cells, weathers={'rain': rng.gamma(0.3, 10, (2, 365)), 'et0': np.full(365, 4.0)}, sowing_date_offset=20)
+	bs.run()
+	labels = bs.results.crop_stages
+	names = bs.results.crop_stage_names
+	assert names[0] == 'before sowing' and names[-1] == 'after harvest'
+	totals = bs.results.by_crop_stage('aet')
+	for k in range(2):
+		for stage in range(len(names)):
+			in_stage = (labels[k] if labels.ndim == 2 else labels) == stage
+			expected = bs.results['aet'][k][in_stage].sum() if in_stage.any() else np.nan
+			assert np.isclose(totals[k, stage], expected, equal_nan=True)
+	# (the time-steps before sowing are the first 20 days)
+	assert np.allclose(totals[:, 0], bs.results['aet'][:, :20].sum(axis=-1))
+
+
+def test_simulation_results_are_aggregated_too():
+	psmm = PocraSMModelSimulation(
+		**{p: v[0] for p, v in cells.items()}, weathers={'rain': rng.gamma(0.3, 10, 365).tolist(), 'et0': [4.0] * 365}
+	)
+	psmm.run()
+	months, monthly_gw_rech = psmm.results.monthly('gw_rech')
+	assert months.tolist() == [6, 7, 8, 9, 10, 11, 12, 1, 2, 3, 4, 5]
+	assert np.isclose(monthly_gw_rech.sum(), sum(psmm.gw_rech))
+	assert np.allclose(monthly_gw_rech[:2], [sum(psmm.gw_rech[:30]), sum(psmm.gw_rech[30:61])])
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from pocragis_models.models import Field
+from pocragis_models.simulate import PocraSMModelSimulation
+from pocragis_models.sensitivity import SensitivityAnalysis
+
+
+rng = np.random.default_rng(0)
+rain = rng.gamma(0.3, 10, 365)
+pet = np.r_[np.zeros(20), np.full(345, 3.0)]
+field = Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3)
+
+
+def test_targets_match_simulations_with_a_given_pet():
+	sa = SensitivityAnalysis(field, 'soyabean', {'rain': rain}, {'cn_val': (60, 95)}, targets=['gw_rech', 'deficit'], pet=pet)
+	totals = sa.evaluate(np.array([[0.0], [1.0]]))
+	for k, cn_val in enumerate([60, 95]):
+		psmm = PocraSMModelSimulation(
+			field=Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3, cn_val=cn_val),
+			weathers={'rain': rain.tolist()}, crop='soyabean', pet=pet.tolist()
+		)
+		psmm.run()
+		assert np.isclose(totals['gw_rech'][k], sum(psmm.gw_rech))
+		assert np.isclose(totals['deficit'][k], sum(psmm.pet) - sum(psmm.aet))
+
+
+def test_kc_factor_is_rejected_with_a_given_pet():
+	with pytest.raises(ValueError):
+		SensitivityAnalysis(field, 'soyabean', {'rain': rain}, {'kc_factor': (0.8, 1.2)}, pet=pet)
@@ -0,0 +1,66 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from pocragis_models.simulate import PocraSMModelSimulation
+from pocragis_models.service import SimulationService
+
+
+rng = np.random.default_rng(0)
+
+
+def new_request(**kwargs):
+	return dict({
+		'soil_texture': 'clayey', 'soil_depth_category': 'deep to very deep (> 50 cm)', 'lulc_type': 'kharif',
+		'slope': float(rng.uniform(1, 8)), 'crop': 'soyabean', 'latitude': 20.0,
+		'weathers': {
+			'rain': rng.gamma(0.3, 10, 120).tolist(), 'temp_daily_min': [22.0] * 120,
+			'temp_daily_avg': [27.0] * 120, 'temp_daily_max': [32.0] * 120
+		},
+		'components': ['aet', 'gw_rech', 'avail_sm'],
+	}, **kwargs)
+
+
+async def simulate_all(requests):
+	service = SimulationService(batch_window=0.05)
+	batcher = asyncio.create_task(service.batcher())
+	try:
+		return await asyncio.gather(*[service.simulate(r) for r in requests])
+	finally:
+		batcher.cancel()
+
+
+def test_results_match_lone_simulations():
+	requests = [
+		new_request(),
+		new_request(model_state_at_start={'sm1_frac': 0.3, 'sm2_frac': 0.3}),
+		new_request(model_state_at_start={'sm1_frac': 0.3, 'sm2_frac': 0.35, 'day_of_year': 200}),
+		new_request(crop='cotton'),
+	]
+	results = asyncio.run(simulate_all(requests))
+
+	for request, result in zip(requests, results):
+		# (with the time of the first step filled in, as by the service)
+		kwargs = {k: v for k, v in SimulationService.normalise(request).items() if k != 'components'}
+		psmm = PocraSMModelSimulation(**kwargs)
+		psmm.run()
+		for c in request['components']:
+			assert np.allclose(result[c], getattr(psmm, c), rtol=1e-9, atol=1e-9)
+
+
+def test_requests_starting_at_other_times_are_batched_apart():
+	keys = [
+		SimulationService.batch_key(SimulationService.normalise(new_request(model_state_at_start=state)))
+			for state in [
+				None, {'sm1_frac': 0.3, 'sm2_frac': 0.3},
+				{'sm1_frac': 0.2, 'sm2_frac': 0.3, 'day_of_year': 152}, {'sm1_frac': 0.3, 'sm2_frac': 0.3, 'day_of_year': 200}
+			]
+	]
+	assert keys[1] == keys[2]
+	assert len({keys[0], keys[1], keys[3]}) == 3
+
+
+def test_start_times_are_validated():
+	with pytest.raises(ValueError):
+		SimulationService.normalise(new_request(model_state_at_start={'sm1_frac': 0.3, 'sm2_frac': 0.3, 'hour_of_day': 25}))
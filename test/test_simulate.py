@@ -0,0 +1,98 @@
+import csv
+import os
+from datetime import date
+
+import numpy as np
+
+from pocragis_models.models import Field, Water
+from pocragis_models.simulate import PocraSMModelSimulation, MultiYearPocraSMModelSimulation, SimulationIO
+
+
+rng = np.random.default_rng(0)
+# (a dry spell with no pet, then rain after day 60: the state rests at the wilting point for 60 days)
+rain = np.r_[np.zeros(60), rng.gamma(0.3, 10, 305)]
+pet = np.r_[np.zeros(60), np.full(305, 3.0)]
+field = Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3)
+
+
+def new_simulation():
+	psmm = PocraSMModelSimulation(field=field, weathers={'rain': rain.tolist()}, crop='soyabean', pet=pet.tolist())
+	psmm.run()
+	return psmm
+
+
+def test_fast_forward_matches_stepping():
+	psmm = new_simulation()
+	state = {'sm1_frac': field.wp, 'sm2_frac': field.wp}
+	for i in range(len(rain)):
+		w, state = Water.run_pocra_sm_model_for_time_step(
+			psmm.layer_1_thickness, psmm.layer_2_thickness, state['sm1_frac'], state['sm2_frac'],
+			field.wp, field.fc, field.sat, field.smax, field.w1, field.w2, field.perc_factor,
+			psmm.crop.depletion_factor, rain[i], pet[i]
+		)
+		assert vars(psmm.waters[i]) == vars(w)
+
+
+def test_fast_forwarded_steps_have_their_own_waters():
+	psmm = new_simulation()
+	assert len({id(w) for w in psmm.waters}) == len(psmm.waters)
+	psmm.waters[10].aet = 1.0
+	assert psmm.waters[11].aet == 0
+
+
+def test_multi_year_runs_carry_the_state_over_calendar_years(tmp_path):
+	# (the rain-year from June 1st, 2023 has 366 days, the next one 365)
+	yearly_rain = [rng.gamma(0.3, 10, 366), rng.gamma(0.3, 10, 365)]
+	with open(tmp_path / 'weathers.csv', 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['date', 'rain', 'et0'])
+		writer.writerows([['-', r, 4.0] for r in np.concatenate(yearly_rain)])
+
+	mypsmm = MultiYearPocraSMModelSimulation(
+		SimulationIO.read_yearly_weathers_from_csv(tmp_path / 'weathers.csv', 2023), 2023, field=field, crop='soyabean'
+	)
+	state = None
+	years = []
+	for k, psmm in enumerate(mypsmm.run()):
+		years.append(psmm)
+		assert len(psmm.waters) == len(yearly_rain[k])
+		lone = PocraSMModelSimulation(
+			field=field, weathers={'rain': yearly_rain[k].tolist(), 'et0': [4.0] * len(yearly_rain[k])}, crop='soyabean',
+			model_state_at_start=state, start_date=date(2023 + k, 6, 1)
+		)
+		lone.run()
+		assert psmm.aet == lone.aet and psmm.gw_rech == lone.gw_rech
+		state = lone.model_state
+		SimulationIO.output_water_components_to_csv(psmm, ['aet'], tmp_path / 'results.csv', append=True)
+
+	# (February 29th, 2024 is the 274th day of the first rain-year, and June 1st, 2024 the 153rd of its year)
+	assert [years[0].weathers[i].day_of_year for i in [0, 273, 365]] == [152, 60, 152]
+	assert years[1].weathers[0].day_of_year == 153
+	with open(tmp_path / 'results.csv', newline='') as f:
+		assert len(list(csv.DictReader(f))) == 366 + 365
+
+
+def read_reference_run(name='Kada'):
+	with open(os.path.join(os.path.dirname(__file__), f'{name}_example_output.csv'), newline='') as f:
+		rows = list(csv.DictReader(f))
+	return {p: [float(r[p]) for r in rows] for p in ['rain', 'et0']}
+
+
+def test_adaptive_stepping_approximates_hourly_stepping():
+	weathers = read_reference_run()
+	field_kwargs = dict(soil_texture='clayey', soil_depth_category='deep to very deep (> 50 cm)', lulc_type='kharif', slope=3)
+	hourly = PocraSMModelSimulation(**field_kwargs, step_unit='HOUR', weathers=weathers, crop='soyabean')
+	hourly.run()
+
+	# (below any day's rain, every day is stepped hourly)
+	psmm = PocraSMModelSimulation(**field_kwargs, step_unit='ADAPTIVE', weathers=weathers, crop='soyabean', adaptive_rain_threshold=-1)
+	psmm.run()
+	assert psmm.num_hourly_stepped_days == len(weathers['rain']) // 24
+	assert psmm.aet == hourly.aet and psmm.gw_rech == hourly.gw_rech
+
+	psmm = PocraSMModelSimulation(**field_kwargs, step_unit='ADAPTIVE', weathers=weathers, crop='soyabean')
+	psmm.run()
+	assert psmm.num_hourly_stepped_days < 60
+	for c in ['pri_runoff', 'sec_runoff', 'gw_rech', 'aet']:
+		assert abs(sum(getattr(psmm, c)) - sum(getattr(hourly, c))) <= 0.08 * max(sum(getattr(hourly, c)), 1)
+	assert np.allclose(np.add(psmm.pri_runoff, psmm.infil), weathers['rain'])
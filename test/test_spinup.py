@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+
+from pocragis_models.models import Field
+from pocragis_models.simulate import PocraSMModelSimulation
+from pocragis_models.spinup import SpinUpCache
+
+
+rng = np.random.default_rng(0)
+normal_weathers = {'rain': rng.gamma(0.3, 10, 365).tolist(), 'et0': [4.0] * 365}
+field = Field('clayey', 'deep to very deep (> 50 cm)', 'kharif', 3)
+
+
+def test_state_is_the_equilibrium_of_its_class(tmp_path):
+	state = SpinUpCache(tmp_path, tolerance=1e-9).model_state_for(field, 'soyabean', normal_weathers)
+	psmm = PocraSMModelSimulation(field=field, weathers=normal_weathers, crop='soyabean', model_state_at_start=state)
+	psmm.run()
+	assert np.isclose(psmm.model_state['sm1_frac'], state['sm1_frac'], atol=1e-8)
+	assert np.isclose(psmm.model_state['sm2_frac'], state['sm2_frac'], atol=1e-8)
+
+
+def test_states_are_cached_by_class(tmp_path):
+	state = SpinUpCache(tmp_path).model_state_for(field, 'soyabean', normal_weathers, normal_name='normal')
+	# (read back from the cache's file by another cache)
+	assert SpinUpCache(tmp_path).model_state_for(field, 'soyabean', normal_weathers, normal_name='normal') == state
+	assert len(os.listdir(tmp_path)) == 1
+
+	for cache in [SpinUpCache(tmp_path, latitude=20), SpinUpCache(tmp_path, sowing_threshold=150)]:
+		cache.model_state_for(field, 'soyabean', normal_weathers, normal_name='normal')
+	cells = {p: [getattr(field, p)] * 2 for p in SpinUpCache.field_params}
+	states = SpinUpCache(tmp_path).model_states_for_cells(cells, ['soyabean', 'cotton'], normal_weathers, normal_name='normal')
+	assert len(os.listdir(tmp_path)) == 4
+	assert states['sm1_frac'][0] == state['sm1_frac'] and states['day_of_year'] == 152
@@ -0,0 +1,39 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from pocragis_models.store import ResultStore
+
+
+def test_cells_and_time_slices_round_trip(tmp_path):
+	rng = np.random.default_rng(0)
+	cell_ids = rng.permutation(np.arange(10) * 11 + 5)
+	results = {c: rng.random((10, 50)) for c in ['aet', 'gw_rech']}
+	# (tiles that neither the cells nor the steps fill)
+	store = ResultStore.create(
+		tmp_path, cell_ids, 50, components=['aet', 'gw_rech'], start_date=date(2023, 6, 1), tile_shape=(4, 16)
+	)
+	store.write_cells(cell_ids[6:], {c: v[6:] for c, v in results.items()})
+	store.write_cells(cell_ids[:6], {c: v[:6] for c, v in results.items()})
+	store.flush()
+
+	store = ResultStore(tmp_path)
+	assert store.written.all()
+	for k, cell_id in enumerate(cell_ids):
+		for c, values in store.read_cell(cell_id).items():
+			assert values.tolist() == results[c][k].tolist()
+	order = np.argsort(cell_ids)
+	for step in [0, 15, 16, 49]:
+		for c, values in store.read_time_slice(step).items():
+			assert values.tolist() == results[c][order, step].tolist()
+	assert store.get_date_of_step(30) == date(2023, 7, 1)
+
+
+def test_cells_are_checked(tmp_path):
+	with pytest.raises(ValueError):
+		ResultStore.create(tmp_path / 'duplicates', [1, 2, 2], 10)
+	store = ResultStore.create(tmp_path / 'store', [1, 2, 3], 10)
+	with pytest.raises(KeyError):
+		store.read_cell(4)
+	assert np.isnan(store.read_cell(2)['aet']).all()